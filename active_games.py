@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+
+class ActiveGame:
+    """進行中ゲーム1件分の情報（表示・ポーリング・保存に使う項目だけを保持）
+
+    既存コードとの互換のため game['gameId'] / game.get('gameLength') の形でも参照できる。
+    参加者・BAN・ルーンなどの元データは games テーブルに保存され、必要な時だけ読み込む。
+    """
+
+    __slots__ = ('game_id', 'game_start_time', 'platform_id', 'queue_id',
+                 'participant_count', 'observed_length', 'observed_at')
+
+    # スペクテイター API のキー名 → 属性名
+    KEYS = {
+        'gameId': 'game_id',
+        'gameStartTime': 'game_start_time',
+        'platformId': 'platform_id',
+        'gameQueueConfigId': 'queue_id',
+    }
+
+    def __init__(self, game_id, game_start_time: int = 0, platform_id: str = None, queue_id: int = None,
+                 participant_count: int = 0, observed_length: int = 0, observed_at: float = None):
+        self.game_id = game_id
+        self.game_start_time = game_start_time
+        self.platform_id = platform_id
+        self.queue_id = queue_id
+        self.participant_count = participant_count
+        self.observed_length = observed_length
+        self.observed_at = observed_at or time.time()
+
+    @classmethod
+    def from_payload(cls, game_data: dict) -> 'ActiveGame':
+        """スペクテイター API のゲーム情報から必要な項目だけを取り出す"""
+        if isinstance(game_data, ActiveGame):
+            return game_data
+        return cls(
+            game_data.get('gameId'),
+            game_data.get('gameStartTime', 0),
+            game_data.get('platformId'),
+            game_data.get('gameQueueConfigId'),
+            game_data.get('participantCount', len(game_data.get('participants', []))),
+            game_data.get('gameLength', 0) or 0
+        )
+
+    @property
+    def game_length(self) -> int:
+        """現在の経過秒数（取得時の gameLength に取得からの経過時間を足した推定値）"""
+        return int(max(0, self.observed_length) + time.time() - self.observed_at)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default=None):
+        if key == 'gameLength':
+            return self.game_length
+        if key == 'participantCount':
+            return self.participant_count
+        return getattr(self, self.KEYS.get(key, key), default)
+
+    def to_dict(self) -> dict:
+        """プロセス間・イベントログで受け渡す形式（from_payload で復元できる）"""
+        return {
+            'gameId': self.game_id,
+            'gameStartTime': self.game_start_time,
+            'platformId': self.platform_id,
+            'gameQueueConfigId': self.queue_id,
+            'participantCount': self.participant_count,
+            'gameLength': self.game_length
+        }
+
+    def __repr__(self):
+        return f"ActiveGame({self.game_id}, {self.participant_count} participants)"
+
+
+class ActiveGameTable:
+    """監視対象プレイヤーの進行中ゲーム（puuid → gameId の索引と gameId ごとの ActiveGame）
+
+    同じゲームに監視対象が複数いてもゲーム情報は1件だけ保持する。
+    current_games[puuid] = game_data の形で元データの dict を渡すと必要な項目だけに変換する。
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self._game_by_puuid: Dict[str, object] = {}
+        self._games: Dict[object, ActiveGame] = {}
+        self._members: Dict[object, Set[str]] = {}
+        self.lock = threading.Lock()
+
+    def __setitem__(self, puuid: str, game_data):
+        game = ActiveGame.from_payload(game_data)
+        with self.lock:
+            self._discard(puuid)
+            # 同じゲームの2人目以降は既存の情報を共有する
+            self._games.setdefault(game.game_id, game)
+            self._game_by_puuid[puuid] = game.game_id
+            self._members.setdefault(game.game_id, set()).add(puuid)
+
+    def _discard(self, puuid: str) -> Optional[ActiveGame]:
+        game_id = self._game_by_puuid.pop(puuid, None)
+        if game_id is None:
+            return None
+        game = self._games[game_id]
+        members = self._members[game_id]
+        members.discard(puuid)
+        if not members:
+            del self._members[game_id]
+            del self._games[game_id]
+        return game
+
+    def get(self, puuid: str, default=None) -> Optional[ActiveGame]:
+        with self.lock:
+            game_id = self._game_by_puuid.get(puuid)
+            return self._games[game_id] if game_id is not None else default
+
+    def __getitem__(self, puuid: str) -> ActiveGame:
+        game = self.get(puuid)
+        if game is None:
+            raise KeyError(puuid)
+        return game
+
+    def pop(self, puuid: str, *default) -> Optional[ActiveGame]:
+        with self.lock:
+            game = self._discard(puuid)
+        if game is None:
+            if default:
+                return default[0]
+            raise KeyError(puuid)
+        return game
+
+    def game_id_of(self, puuid: str):
+        return self._game_by_puuid.get(puuid)
+
+    def players_in(self, game_id) -> Tuple[str, ...]:
+        """同じゲームに参加中の監視対象プレイヤー"""
+        with self.lock:
+            return tuple(self._members.get(game_id, ()))
+
+    def payload(self, puuid: str) -> Optional[dict]:
+        """参加者などを含む元のゲーム情報（games テーブルから読み込み）"""
+        game_id = self.game_id_of(puuid)
+        if game_id is None or self.storage is None:
+            return None
+        # 書き込みキューに残っている分も読めるように先に反映
+        self.storage.flush()
+        rows = self.storage.query('SELECT payload FROM games WHERE game_id = ?', (str(game_id),))
+        if not rows or not rows[0][0]:
+            return None
+        return json.loads(rows[0][0])
+
+    def items(self) -> Iterator[Tuple[str, ActiveGame]]:
+        with self.lock:
+            return iter([(puuid, self._games[game_id]) for puuid, game_id in self._game_by_puuid.items()])
+
+    def clear(self):
+        with self.lock:
+            self._game_by_puuid.clear()
+            self._games.clear()
+            self._members.clear()
+
+    def game_count(self) -> int:
+        return len(self._games)
+
+    def __contains__(self, puuid: str) -> bool:
+        return puuid in self._game_by_puuid
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            return iter(list(self._game_by_puuid))
+
+    def __len__(self) -> int:
+        return len(self._game_by_puuid)
@@ -0,0 +1,380 @@
+"""NumPy による履歴分析（試合時間の分布・曜日×時間帯の活動量・チャンピオン頻度・同じゲームの監視対象）
+
+終了したゲームを game_data（とアーカイブ済みの行）から列ごとの配列に一度だけ読み込み、
+以降は終了時刻が新しい行だけを追記する。試合後の取り込みで終了時刻・試合時間・勝敗が
+補正されるため、直近 OVERLAP_MS の行は読み直して上書きする。
+集計はすべて配列演算で行い、結果はデータが変わるまでキャッシュする。
+
+numpy が必要（pip install numpy）。
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np  # 分析使用時のみ必要 (pip install numpy)
+except ImportError:
+    np = None
+
+# 列と型（row_id はアーカイブから読んだ行では -1）
+COLUMNS = (
+    ('row_id', 'int64'), ('player', 'int32'), ('game_id', 'int64'), ('start_ms', 'int64'),
+    ('end_ms', 'int64'), ('duration_ms', 'int64'), ('win', 'int8'), ('champion_id', 'int16'),
+    ('team_id', 'int16'),
+)
+
+# 補正を反映するために読み直す期間（試合後の取り込みの再試行が終わるまで）
+OVERLAP_MS = 6 * 3600 * 1000
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+HISTOGRAM_BIN_MINUTES = 5
+HOURS_PER_WEEK = 7 * 24
+# 同じゲームに入りうる監視対象の最大人数
+MAX_LOBBY = 10
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("分析には numpy が必要です (pip install numpy)")
+
+
+def _distinct_players(pairs: 'np.ndarray', n: int) -> int:
+    """組（小さい方のコード * n + 大きい方のコード）に現れるプレイヤー数"""
+    return len(np.unique(np.concatenate([pairs // n, pairs % n]))) if len(pairs) else 0
+
+
+class AnalyticsEngine:
+    """ゲーム履歴の列指向キャッシュとバッチ集計"""
+
+    def __init__(self, storage, archive_dir: str = None, refresh_interval: float = 5.0):
+        _require_numpy()
+        self.storage = storage
+        self.archive_dir = archive_dir
+        self.refresh_interval = refresh_interval
+        self.lock = threading.RLock()
+
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+        self.size = 0
+        self.players: List[str] = []
+        self.player_codes: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}
+
+        self.loaded = False
+        self.max_end_ms = 0
+        # 読み直し対象の行: game_data.id → (位置, 終了時刻)
+        self.recent: Dict[int, tuple] = {}
+        self.refreshed_at = 0.0
+        self.version = 0
+        self.cache = {}
+
+        # 統計
+        self.load_seconds = None
+        self.refreshes = 0
+
+    # --- 読み込み ---
+
+    def player_code(self, puuid: str) -> int:
+        code = self.player_codes.get(puuid)
+        if code is None:
+            code = self.player_codes[puuid] = len(self.players)
+            self.players.append(puuid)
+        return code
+
+    def _reserve(self, extra: int):
+        """追記用に配列の容量を確保（倍々に拡張）"""
+        capacity = len(self.columns['row_id'])
+        needed = self.size + extra
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name, dtype in COLUMNS:
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self.size] = self.columns[name][:self.size]
+            self.columns[name] = grown
+
+    def _append(self, values: Dict[str, 'np.ndarray']):
+        count = len(values['row_id'])
+        self._reserve(count)
+        for name, _ in COLUMNS:
+            self.columns[name][self.size:self.size + count] = values[name]
+        self.size += count
+
+    def refresh(self, force: bool = False) -> int:
+        """終了したゲームを読み込み（初回は全件、以降は新しい行と補正された行のみ）"""
+        with self.lock:
+            if not force and self.loaded and time.time() - self.refreshed_at < self.refresh_interval:
+                return 0
+            start = time.time()
+            changed = 0
+            if not self.loaded:
+                changed += self._load_archive()
+            changed += self._load_rows(self.max_end_ms - OVERLAP_MS if self.loaded else 0)
+            if not self.loaded:
+                self.loaded = True
+                self.load_seconds = round(time.time() - start, 3)
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            if changed:
+                self.version += 1
+                self.cache.clear()
+            return changed
+
+    def _load_archive(self) -> int:
+        """SQLite から削除済み（prune 済み）の行をアーカイブから読み込む"""
+        if not self.archive_dir or not os.path.isdir(self.archive_dir):
+            return 0
+        from archive import GameArchive
+        archive = GameArchive(self.archive_dir)
+        checkpoint = archive.checkpoint()
+        if not checkpoint:
+            return 0
+
+        # prune は「id <= checkpoint かつ開始が基準より前」の行を消すので、
+        # アーカイブ範囲で SQLite に残っている行の最小開始時刻より前が削除済みの行
+        remaining = self.storage.query('SELECT MIN(game_start_time) FROM game_data WHERE id <= ?',
+                                       (checkpoint,))[0][0]
+        games = archive.load('player_games')
+        mask = games['start_ms'] < remaining if remaining is not None else slice(None)
+        if not len(games['start_ms'][mask]):
+            return 0
+
+        remap = np.array([self.player_code(puuid) for puuid in archive.players] or [0], dtype='int32')
+        values = {name: np.asarray(games[name][mask]) for name in
+                  ('game_id', 'start_ms', 'end_ms', 'duration_ms', 'win', 'champion_id', 'team_id')}
+        values['player'] = remap[np.asarray(games['player'][mask])]
+        values['row_id'] = np.full(len(values['player']), -1, dtype='int64')
+        self._append(values)
+        return len(values['row_id'])
+
+    def _load_rows(self, since_end_ms: int) -> int:
+        # 初回（全件）は終了時刻のインデックスを使わず表を順に読む方が速い
+        condition = 'gd.game_end_time > ?' if since_end_ms > 0 else '+gd.game_end_time > ?'
+        rows = self.storage.query(f'''
+            SELECT gd.id, gd.puuid, gd.game_name, gd.tag_line, gd.game_id, gd.game_start_time,
+                   gd.game_end_time, gd.game_duration, gd.win, gp.champion_id, gp.team_id
+            FROM game_data AS gd
+            LEFT JOIN game_participants AS gp ON gp.game_id = gd.game_id AND gp.puuid = gd.puuid
+            WHERE {condition}
+        ''', (since_end_ms,))
+        if not rows:
+            return 0
+
+        columns = self.columns
+        self.max_end_ms = max(self.max_end_ms, max(row[6] for row in rows))
+        horizon = self.max_end_ms - OVERLAP_MS
+        for row in rows:
+            code = self.player_code(row[1])
+            if code not in self.names and row[2]:
+                self.names[code] = f"{row[2]}#{row[3]}"
+
+        # 読み直し期間内の既存行は補正を反映し、それ以外は追記
+        updated = 0
+        fresh = []
+        for row in rows:
+            known = self.recent.get(row[0])
+            if known is None:
+                fresh.append(row)
+                continue
+            position = known[0]
+            for (name, _), value in zip(COLUMNS, self._values(row)):
+                if columns[name][position] != value:
+                    columns[name][position] = value
+                    updated += 1
+            self.recent[row[0]] = (position, row[6])
+
+        if fresh:
+            values = list(zip(*(self._values(row) for row in fresh)))
+            self._append({name: np.array(column, dtype=dtype)
+                          for (name, dtype), column in zip(COLUMNS, values)})
+            first = self.size - len(fresh)
+            for offset, row in enumerate(fresh):
+                if row[6] > horizon:
+                    self.recent[row[0]] = (first + offset, row[6])
+
+        # 読み直し期間を過ぎた行は追跡しない
+        self.recent = {row_id: entry for row_id, entry in self.recent.items() if entry[1] > horizon}
+        return len(fresh) + updated
+
+    def _values(self, row) -> tuple:
+        """game_data の行を COLUMNS の順の値に変換（欠損は -1）"""
+        row_id, puuid, _, _, game_id, start_ms, end_ms, duration_ms, win, champion_id, team_id = row
+        return (row_id, self.player_codes[puuid], int(game_id) if str(game_id).isdigit() else -1,
+                start_ms or 0, end_ms, duration_ms or 0, -1 if win is None else win,
+                -1 if champion_id is None else champion_id, -1 if team_id is None else team_id)
+
+    # --- 集計 ---
+
+    def _view(self, days: Optional[float] = None, puuid: str = None) -> Optional[Dict[str, 'np.ndarray']]:
+        """条件に合う行の列（puuid が未知の場合は None）"""
+        self.refresh()
+        columns = {name: self.columns[name][:self.size] for name, _ in COLUMNS}
+        mask = None
+        if days:
+            mask = columns['start_ms'] >= (time.time() - days * 86400) * 1000
+        if puuid is not None:
+            code = self.player_codes.get(puuid)
+            if code is None:
+                return None
+            player_mask = columns['player'] == code
+            mask = player_mask if mask is None else mask & player_mask
+        if mask is not None:
+            columns = {name: values[mask] for name, values in columns.items()}
+        return columns
+
+    def _cached(self, key, compute):
+        with self.lock:
+            self.refresh()
+            if key not in self.cache:
+                self.cache[key] = compute()
+            return self.cache[key]
+
+    def _player_label(self, code: int) -> dict:
+        puuid = self.players[code]
+        return {'puuid': puuid, 'name': self.names.get(code, puuid[:8])}
+
+    def duration_stats(self, puuid: str = None, days: float = None) -> dict:
+        """試合時間のパーセンタイルとヒストグラム（分）"""
+        def compute():
+            columns = self._view(days, puuid)
+            durations = columns['duration_ms'] if columns else np.empty(0, dtype='int64')
+            durations = durations[durations > 0] / 60000.0
+            if not len(durations):
+                return {'games': 0, 'mean': None, 'percentiles': {}, 'histogram': []}
+            edges = np.arange(0, max(60, float(durations.max())) + HISTOGRAM_BIN_MINUTES,
+                              HISTOGRAM_BIN_MINUTES)
+            counts, _ = np.histogram(durations, bins=edges)
+            values = np.percentile(durations, PERCENTILES)
+            return {
+                'games': int(len(durations)),
+                'mean': round(float(durations.mean()), 1),
+                'percentiles': {f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, values)},
+                'histogram': [{'from_minutes': int(edge), 'games': int(count)}
+                              for edge, count in zip(edges[:-1], counts) if count]
+            }
+        return self._cached(('durations', puuid, days), compute)
+
+    def _heatmaps(self, days: float, tz_offset: float) -> 'np.ndarray':
+        """全プレイヤー分の曜日×時間帯のゲーム数（プレイヤー数 × 168、月曜0時が先頭）"""
+        def compute():
+            columns = self._view(days)
+            hours = (columns['start_ms'] // 1000 + int(tz_offset * 3600)) // 3600
+            # 1970-01-01 は木曜日
+            slots = ((hours // 24 + 3) % 7) * 24 + hours % 24
+            counts = np.bincount(columns['player'].astype('int64') * HOURS_PER_WEEK + slots,
+                                 minlength=len(self.players) * HOURS_PER_WEEK)
+            return counts.reshape(len(self.players), HOURS_PER_WEEK)
+        return self._cached(('heatmaps', days, tz_offset), compute)
+
+    def activity_heatmap(self, puuid: str = None, days: float = None, tz_offset: float = 0) -> dict:
+        """曜日×時間帯（7 × 24）のゲーム開始数（puuid 省略時は全体）"""
+        heatmaps = self._heatmaps(days, tz_offset)
+        if puuid is None:
+            matrix = heatmaps.sum(axis=0)
+        else:
+            code = self.player_codes.get(puuid)
+            matrix = heatmaps[code] if code is not None and code < len(heatmaps) \
+                else np.zeros(HOURS_PER_WEEK, dtype='int64')
+        return {
+            'tz_offset': tz_offset,
+            'weekdays': ['月', '火', '水', '木', '金', '土', '日'],
+            'matrix': matrix.reshape(7, 24).tolist(),
+            'games': int(matrix.sum())
+        }
+
+    def champion_frequency(self, puuid: str = None, days: float = None, limit: int = 20) -> list:
+        """チャンピオン使用頻度（監視対象プレイヤーのゲームのみ）"""
+        def compute():
+            columns = self._view(days, puuid)
+            if not columns:
+                return []
+            champions = columns['champion_id'][columns['champion_id'] > 0].astype('int64')
+            if not len(champions):
+                return []
+            counts = np.bincount(champions)
+            wins = np.bincount(champions, weights=(columns['win'][columns['champion_id'] > 0] == 1),
+                               minlength=len(counts))
+            top = np.argsort(counts)[::-1][:limit]
+            return [{'champion_id': int(champion), 'games': int(counts[champion]),
+                     'wins': int(wins[champion])}
+                    for champion in top if counts[champion]]
+        return self._cached(('champions', puuid, days, limit), compute)
+
+    def coplay(self, puuid: str = None, days: float = None, limit: int = 50) -> dict:
+        """同じゲームに参加した監視対象プレイヤーの組（同じチーム/敵チームの回数）
+
+        チームが不明な行（team_id < 0、参加者情報が無いゲーム）は games にだけ数え、
+        same_team / opposing_team には含めない。
+        """
+        def compute():
+            columns = self._view(days)
+            order = np.lexsort((columns['player'], columns['game_id']))
+            games = columns['game_id'][order]
+            players = columns['player'][order].astype('int64')
+            teams = columns['team_id'][order]
+
+            # game_id で並べた同じゲームの行は隣り合うので、距離 d の行同士を組にする
+            firsts, seconds, same_team, known_team = [], [], [], []
+            for distance in range(1, MAX_LOBBY):
+                match = (games[distance:] == games[:-distance]) & (games[distance:] >= 0)
+                if not match.any():
+                    break
+                firsts.append(players[:-distance][match])
+                seconds.append(players[distance:][match])
+                # 埋め値の -1 同士を同じチームと数えないよう、両方のチームが分かる組だけを比べる
+                first_teams, second_teams = teams[:-distance][match], teams[distance:][match]
+                known = (first_teams >= 0) & (second_teams >= 0)
+                known_team.append(known)
+                same_team.append(known & (first_teams == second_teams))
+            n = len(self.players)
+            if not firsts:
+                empty = np.empty(0)
+                return n, np.empty(0, dtype='int64'), np.empty(0, dtype='int64'), empty, empty, 0
+
+            first, second = np.concatenate(firsts), np.concatenate(seconds)
+            same, known = np.concatenate(same_team), np.concatenate(known_team)
+            distinct = first != second
+            first, second, same, known = first[distinct], second[distinct], same[distinct], known[distinct]
+            keys = np.minimum(first, second) * n + np.maximum(first, second)
+            pairs, inverse = np.unique(keys, return_inverse=True)
+            counts, same = np.bincount(inverse), np.bincount(inverse, weights=same)
+            opposing = np.bincount(inverse, weights=known) - same
+            # 回数の多い順に並べておく
+            order = np.argsort(counts, kind='stable')[::-1]
+            return n, pairs[order], counts[order], same[order], opposing[order], _distinct_players(pairs, n)
+
+        n, pairs, counts, same, opposing, players = self._cached(('coplay', days), compute)
+        if puuid is not None:
+            code = self.player_codes.get(puuid)
+            if code is None:
+                return {'pairs': [], 'players': 0}
+            involved = (pairs // n == code) | (pairs % n == code)
+            pairs, counts, same, opposing = pairs[involved], counts[involved], same[involved], opposing[involved]
+            players = _distinct_players(pairs, n)
+
+        top = range(min(limit, len(pairs)))
+        return {
+            'players': players,
+            'pairs': [
+                {
+                    'a': self._player_label(int(pairs[i] // n)),
+                    'b': self._player_label(int(pairs[i] % n)),
+                    'games': int(counts[i]),
+                    'same_team': int(same[i]),
+                    'opposing_team': int(opposing[i])
+                }
+                for i in top
+            ]
+        }
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'loaded': self.loaded,
+                'rows': self.size,
+                'players': len(self.players),
+                'load_seconds': self.load_seconds,
+                'refreshes': self.refreshes,
+                'version': self.version,
+                'cached_results': len(self.cache),
+                'memory_mb': round(sum(self.columns[name].nbytes for name, _ in COLUMNS) / 2 ** 20, 1)
+            }
@@ -1,12 +1,23 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import json
 import os
 from datetime import datetime, timedelta
-from riot_api_tool import RiotAPISpectatorTool
+from riot_api_tool import MonitorStateView, RiotAPISpectatorTool, RIOT_API_KEY
+from event_bus import EventLog, EventSubscriber
+from player_registry import PlayerRecord
+from player_state import PlayerStateLog
+from response_cache import ResponseCache
+import metrics
 import threading
 import time
+import uuid
+
+try:
+    import numpy  # 履歴分析 (/api/analytics/*) で使用 (pip install numpy)
+except ImportError:
+    numpy = None
 
 try:
     from config import HOST, PORT, DEBUG, SECRET_KEY
@@ -16,6 +27,19 @@ except ImportError:
     DEBUG = True
     SECRET_KEY = "your-secret-key-here"
 
+try:
+    from config import MONITOR_MODE
+except ImportError:
+    MONITOR_MODE = "embedded"  # "daemon": 監視は monitor_daemon.py で行い、ここでは表示のみ
+
+try:
+    from config import RESPONSE_CACHE_TTL
+except ImportError:
+    RESPONSE_CACHE_TTL = 60  # 監視の状態以外で変わるデータ（試合後の取り込み・Riot API の履歴）の再作成間隔 (秒)
+
+# 監視の状態が変わらなくても /api/get_players を作り直す間隔（進行中ゲームの gameLength を進めるため、秒）
+PLAYERS_CACHE_TTL = 30
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 CORS(app)  # CORS対応
@@ -23,7 +47,12 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # グローバル変数でツールインスタンスを管理
 tool_instance = None
+event_log = None
+event_subscriber = None
 connected_clients = set()
+state_log = PlayerStateLog()
+response_cache = ResponseCache()
+metrics.REGISTRY.gauge('socketio_connected_clients', 'Connected Socket.IO clients', lambda: len(connected_clients))
 
 @app.route('/')
 def index():
@@ -41,12 +70,22 @@ def handle_connect():
     connected_clients.add(request.sid)
     print(f"クライアント接続: {request.sid}")
     
-    # 現在の状態を送信
-    if tool_instance:
-        emit('players_updated', {
-            'players': get_monitored_players_data(),
-            'monitoring': tool_instance.monitoring
-        })
+    # 現在の状態を送信（以降は差分のみ）
+    emit('players_state', get_players_state())
+    metrics.SOCKETIO_EMITS.inc('players_state')
+
+@socketio.on('resync')
+def handle_resync(data):
+    """クライアントが取りこぼした差分を再送（古すぎる場合は全体を送信）"""
+    version = (data or {}).get('version', 0)
+    deltas = state_log.since(version)
+    if deltas is None:
+        emit('players_state', get_players_state())
+        metrics.SOCKETIO_EMITS.inc('players_state')
+    else:
+        for delta in deltas:
+            emit('player_delta', delta)
+        metrics.SOCKETIO_EMITS.inc('player_delta', amount=len(deltas))
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -58,12 +97,39 @@ def broadcast_update(event, data):
     """全クライアントに更新を送信"""
     if connected_clients:
         socketio.emit(event, data)
+        metrics.SOCKETIO_EMITS.inc(event)
+
+def publish_player(player, event=None):
+    """プレイヤー1人分の状態を差分として配信"""
+    response_cache.bump()
+    delta = state_log.upsert(get_player_data(player), event)
+    broadcast_update('player_delta', delta)
+    return delta
+
+def publish_player_removed(puuid):
+    """プレイヤー削除を差分として配信"""
+    response_cache.bump()
+    broadcast_update('player_delta', state_log.remove(puuid))
+
+def publish_monitoring_started():
+    """監視開始を差分として配信（停止時は進行中のゲームが消えるので publish_full_state）"""
+    response_cache.bump()
+    broadcast_update('player_delta', state_log.monitoring(True))
+
+def publish_full_state():
+    """全体の状態を配信（API Key 変更や監視停止など一括で変わる場合のみ）"""
+    response_cache.bump()
+    broadcast_update('players_state', get_players_state())
 
 @app.route('/api/set_api_key', methods=['POST'])
 def set_api_key():
     """API Keyを設定"""
     global tool_instance
     
+    if event_log:
+        # API 呼び出しは監視デーモン側で行うので、ここでは受け付けない
+        return jsonify({'success': True, 'message': 'API Key は監視デーモンの設定 (config.py) を使用します'})
+    
     try:
         data = request.get_json()
         api_key = data.get('api_key', '').strip()
@@ -74,9 +140,9 @@ def set_api_key():
         if len(api_key) < 30:
             return jsonify({'success': False, 'error': 'API Keyの形式が正しくありません'})
         
-        # 既存のツールがある場合は監視を停止
+        # 既存のツールがある場合は監視を停止（新しいツールで再開する）
         if tool_instance:
-            tool_instance.stop_monitoring()
+            tool_instance.stop_monitoring(persist=False)
         
         tool_instance = RiotAPISpectatorTool(api_key)
         
@@ -87,6 +153,11 @@ def set_api_key():
             return jsonify({'success': False, 'error': 'API Keyが無効です。Riot Developer Portalで確認してください。'})
         
         broadcast_update('api_key_set', {'success': True})
+        
+        # データベースから復元した監視対象を反映
+        publish_full_state()
+        resume_monitoring()
+        
         return jsonify({'success': True, 'message': 'API Keyが正常に設定されました'})
         
     except Exception as e:
@@ -107,20 +178,22 @@ def add_player():
         if not all([game_name, tag_line, region]):
             return jsonify({'success': False, 'error': 'すべてのフィールドを入力してください'})
         
+        if event_log:
+            return submit_daemon_command('add_player', {
+                'game_name': game_name, 'tag_line': tag_line, 'region': region
+            }, f'プレイヤー {game_name}#{tag_line} の追加を監視デーモンに依頼しました')
+        
         cluster = tool_instance.region_to_cluster.get(region, 'asia')
         success = tool_instance.add_player_to_monitor(game_name, tag_line, region, cluster)
         
         if success:
-            players_data = get_monitored_players_data()
-            broadcast_update('players_updated', {
-                'players': players_data,
-                'monitoring': tool_instance.monitoring
-            })
+            delta = publish_player(tool_instance.monitored_players.find(game_name, tag_line))
             
             return jsonify({
                 'success': True, 
                 'message': f'プレイヤー {game_name}#{tag_line} を追加しました',
-                'players': players_data
+                'player': delta['player'],
+                'version': delta['version']
             })
         else:
             return jsonify({'success': False, 'error': 'プレイヤーの追加に失敗しました。名前やタグライン、地域を確認してください。'})
@@ -139,19 +212,20 @@ def remove_player():
         game_name = data.get('game_name', '').strip()
         tag_line = data.get('tag_line', '').strip()
         
+        if event_log:
+            return submit_daemon_command('remove_player', {'game_name': game_name, 'tag_line': tag_line},
+                                         f'プレイヤー {game_name}#{tag_line} の削除を監視デーモンに依頼しました')
+        
+        player = tool_instance.monitored_players.find(game_name, tag_line)
         success = tool_instance.remove_player_from_monitor(game_name, tag_line)
         
         if success:
-            players_data = get_monitored_players_data()
-            broadcast_update('players_updated', {
-                'players': players_data,
-                'monitoring': tool_instance.monitoring
-            })
+            publish_player_removed(player['puuid'])
             
             return jsonify({
                 'success': True,
                 'message': f'プレイヤー {game_name}#{tag_line} を削除しました',
-                'players': players_data
+                'puuid': player['puuid']
             })
         else:
             return jsonify({'success': False, 'error': 'プレイヤーが見つかりません'})
@@ -168,19 +242,11 @@ def start_monitoring():
     if not tool_instance.monitored_players:
         return jsonify({'success': False, 'error': '監視対象プレイヤーがいません'})
     
+    if event_log:
+        return submit_daemon_command('start_monitoring', None, '監視の開始を監視デーモンに依頼しました')
+    
     try:
-        # カスタムコールバックを設定
-        tool_instance.set_game_callbacks(
-            on_game_start=on_player_game_start,
-            on_game_end=on_player_game_end
-        )
-        
-        tool_instance.start_monitoring()
-        
-        broadcast_update('monitoring_started', {
-            'monitoring': True,
-            'players': get_monitored_players_data()
-        })
+        start_embedded_monitoring()
         
         return jsonify({
             'success': True,
@@ -195,13 +261,14 @@ def stop_monitoring():
     if not tool_instance:
         return jsonify({'success': False, 'error': 'API Keyを先に設定してください'})
     
+    if event_log:
+        return submit_daemon_command('stop_monitoring', None, '監視の停止を監視デーモンに依頼しました')
+    
     try:
         tool_instance.stop_monitoring()
         
-        broadcast_update('monitoring_stopped', {
-            'monitoring': False,
-            'players': get_monitored_players_data()
-        })
+        # 進行中のゲーム情報がすべて消えるので全体を配信
+        publish_full_state()
         
         return jsonify({'success': True, 'message': '監視を停止しました'})
     except Exception as e:
@@ -209,40 +276,103 @@ def stop_monitoring():
 
 @app.route('/api/get_players')
 def get_players():
-    """監視対象プレイヤーリストを取得"""
-    if not tool_instance:
-        return jsonify({'players': [], 'monitoring': False})
+    """監視対象プレイヤーリストを取得（WebSocket が使えない場合の初期表示用）"""
+    # gameLength は作成時点の経過時間なので、状態が変わらなくても PLAYERS_CACHE_TTL ごとに作り直す
+    # （ETag は内容のハッシュなので経過時間が進めば別の ETag になる）
+    return response_cache.respond('players', get_players_state, ttl=PLAYERS_CACHE_TTL)
+
+def parse_roster_file(file_storage) -> list:
+    """アップロードされた名簿ファイルを (game_name, tag_line, region) のリストに変換
     
-    return jsonify({
-        'players': get_monitored_players_data(),
-        'monitoring': tool_instance.monitoring
-    })
+    JSON 配列 ([{"game_name", "tag_line", "region"}, ...]) または
+    1行1人の CSV ("ゲーム名,タグライン,地域" / "ゲーム名#タグライン,地域") に対応
+    """
+    text = file_storage.read().decode('utf-8-sig')
+    
+    if text.lstrip().startswith('['):
+        return [
+            (entry.get('game_name', ''), entry.get('tag_line', ''), entry.get('region', ''))
+            for entry in json.loads(text)
+        ]
+    
+    entries = []
+    for line in text.splitlines():
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) == 2 and '#' in fields[0]:
+            game_name, tag_line = fields[0].split('#', 1)
+            entries.append((game_name, tag_line, fields[1]))
+        elif len(fields) >= 3:
+            entries.append((fields[0], fields[1], fields[2]))
+    return entries
+
+def run_bulk_import(job_id, entries):
+    """一括追加をバックグラウンドで実行し、進捗を WebSocket で配信"""
+    def on_progress(progress):
+        progress['job_id'] = job_id
+        broadcast_update('bulk_import_progress', progress)
+        if progress['status'] == 'added':
+            publish_player(tool_instance.monitored_players.find(progress['game_name'],
+                                                                progress['tag_line']))
+    
+    try:
+        summary = tool_instance.bulk_add_players(entries, on_progress)
+    except Exception as e:
+        broadcast_update('bulk_import_done', {'job_id': job_id, 'success': False, 'error': str(e)})
+        return
+    
+    broadcast_update('bulk_import_done', {'job_id': job_id, 'success': True, 'summary': summary})
 
 @app.route('/api/add_pro_players', methods=['POST'])
 def add_pro_players():
-    """プロプレイヤーを一括追加"""
+    """プロプレイヤー・名簿を一括追加（バックグラウンド実行、進捗は WebSocket で通知）
+    
+    - JSON {"region": "LCK"}: 登録済みのプロプレイヤー
+    - JSON {"players": [{"game_name", "tag_line", "region"}, ...]}: 任意の名簿
+    - multipart の file: JSON / CSV の名簿ファイル
+    """
     if not tool_instance:
         return jsonify({'success': False, 'error': 'API Keyを先に設定してください'})
     
     try:
-        data = request.get_json()
-        region = data.get('region', '').strip()
+        if 'file' in request.files:
+            entries = parse_roster_file(request.files['file'])
+            source = request.files['file'].filename
+        else:
+            data = request.get_json() or {}
+            if data.get('players'):
+                entries = [
+                    (entry.get('game_name', ''), entry.get('tag_line', ''), entry.get('region', ''))
+                    for entry in data['players']
+                ]
+                source = '名簿'
+            else:
+                region = data.get('region', '').strip()
+                if not region:
+                    return jsonify({'success': False, 'error': 'リージョンを選択してください'})
+                if region not in tool_instance.pro_players:
+                    return jsonify({'success': False, 'error': f'地域 {region} のプロプレイヤーデータがありません'})
+                entries = tool_instance.pro_players[region]
+                source = region
         
-        if not region:
-            return jsonify({'success': False, 'error': 'リージョンを選択してください'})
+        if not entries:
+            return jsonify({'success': False, 'error': '追加するプレイヤーがいません'})
         
-        added_count = tool_instance.add_pro_players_by_region(region)
+        job_id = uuid.uuid4().hex[:8]
+        message = f'{source} から {len(entries)} 人の追加を開始しました'
+        if event_log:
+            # 進捗は監視デーモンからイベントログ経由で配信される
+            return submit_daemon_command('bulk_add_players', {'job_id': job_id, 'entries': entries}, message,
+                                         job_id=job_id, total=len(entries))
         
-        players_data = get_monitored_players_data()
-        broadcast_update('players_updated', {
-            'players': players_data,
-            'monitoring': tool_instance.monitoring
-        })
+        # eventlet のハブ上で動かすと API 待ちの間サーバー全体が止まるため、監視ループと同じく実スレッドで実行
+        threading.Thread(target=run_bulk_import, args=(job_id, entries), daemon=True,
+                         name=f"bulk-import-{job_id}").start()
         
         return jsonify({
             'success': True,
-            'message': f'{region} から {added_count} 人のプロプレイヤーを追加しました',
-            'players': players_data
+            'job_id': job_id,
+            'total': len(entries),
+            'message': message
         })
     except Exception as e:
         return jsonify({'success': False, 'error': f'プロプレイヤー追加エラー: {str(e)}'})
@@ -254,11 +384,105 @@ def get_analytics_data():
         return jsonify({'error': 'API Keyを先に設定してください'})
     
     try:
-        analytics_data = tool_instance.get_analytics_data()
-        return jsonify(analytics_data)
+        # ロールアップは試合後の取り込みでも更新されるため TTL でも作り直す
+        return response_cache.respond('analytics', tool_instance.get_analytics_data, ttl=RESPONSE_CACHE_TTL)
+    except Exception as e:
+        return jsonify({'error': f'分析データ取得エラー: {str(e)}'})
+
+def analytics_query(compute):
+    """分析エンジンの集計を実行して JSON で返す（共通のパラメータ: puuid, days）"""
+    if not tool_instance:
+        return jsonify({'error': 'API Keyを先に設定してください'})
+    
+    if numpy is None:
+        return jsonify({'error': '分析には numpy が必要です (pip install numpy)'}), 501
+    
+    try:
+        engine = tool_instance.get_analytics_engine()
+        puuid = request.args.get('puuid') or None
+        days = request.args.get('days', type=float)
+        return jsonify(compute(engine, puuid, days))
     except Exception as e:
         return jsonify({'error': f'分析データ取得エラー: {str(e)}'})
 
+@app.route('/api/analytics/durations')
+def analytics_durations():
+    """試合時間のパーセンタイルとヒストグラム"""
+    return analytics_query(lambda engine, puuid, days: engine.duration_stats(puuid, days))
+
+@app.route('/api/analytics/heatmap')
+def analytics_heatmap():
+    """曜日×時間帯のゲーム開始数（tz: UTC からの時差）"""
+    tz_offset = request.args.get('tz', default=0, type=float)
+    return analytics_query(lambda engine, puuid, days: engine.activity_heatmap(puuid, days, tz_offset))
+
+@app.route('/api/analytics/champions')
+def analytics_champions():
+    """チャンピオン使用頻度"""
+    limit = request.args.get('limit', default=20, type=int)
+    return analytics_query(lambda engine, puuid, days: {
+        'champions': engine.champion_frequency(puuid, days, limit)
+    })
+
+@app.route('/api/analytics/coplay')
+def analytics_coplay():
+    """同じゲームに参加した監視対象プレイヤーの組"""
+    limit = request.args.get('limit', default=50, type=int)
+    return analytics_query(lambda engine, puuid, days: engine.coplay(puuid, days, limit))
+
+@app.route('/api/get_monitor_stats')
+def get_monitor_stats():
+    """監視スイープの所要時間統計を取得"""
+    if not tool_instance:
+        return jsonify({'error': 'API Keyを先に設定してください'})
+    
+    if event_log:
+        # 監視ループ・API 呼び出しの統計は監視デーモン側にある
+        return jsonify({
+            'daemon': event_log.daemon_status(),
+            'storage': tool_instance.storage.get_stats(),
+            'match_store': tool_instance.match_store.get_stats(),
+            'analytics': tool_instance.analytics.get_stats() if tool_instance.analytics else None,
+            'response_cache': response_cache.get_stats()
+        })
+    
+    stats = tool_instance.get_sweep_stats()
+    stats['rate_limit'] = tool_instance.rate_limiter.get_stats()
+    stats['single_flight'] = tool_instance.single_flight.get_stats()
+    stats['http_pool'] = tool_instance.http_pool.get_stats()
+    stats['scheduler'] = tool_instance.poll_scheduler.get_stats()
+    stats['storage'] = tool_instance.storage.get_stats()
+    stats['identity_cache'] = tool_instance.identity_cache.get_stats()
+    stats['match_store'] = tool_instance.match_store.get_stats()
+    stats['match_ingest'] = tool_instance.match_ingest.get_stats()
+    stats['shared_games'] = tool_instance.shared_games.get_stats()
+    stats['featured_games'] = tool_instance.featured_games.get_stats()
+    if tool_instance.analytics:
+        stats['analytics'] = tool_instance.analytics.get_stats()
+    if tool_instance.shard_manager:
+        stats['shards'] = tool_instance.shard_manager.get_stats()
+    stats['response_cache'] = response_cache.get_stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 形式のメトリクス"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/get_current_game/<puuid>')
+def get_current_game(puuid):
+    """進行中ゲームの詳細（参加者・BAN など、保存済みの元データを読み込み）"""
+    if not tool_instance:
+        return jsonify({'error': 'API Keyを先に設定してください'})
+    
+    if puuid not in tool_instance.current_games:
+        return jsonify({'error': 'ゲーム中ではありません'})
+    
+    game = tool_instance.current_games.payload(puuid)
+    if game is None:
+        return jsonify({'error': 'ゲーム情報が見つかりません'})
+    return jsonify({'game': game})
+
 @app.route('/api/get_recent_games/<puuid>')
 def get_recent_games(puuid):
     """特定プレイヤーの最近のゲーム履歴を取得"""
@@ -267,76 +491,195 @@ def get_recent_games(puuid):
     
     try:
         # プレイヤー情報を取得
-        player = None
-        for p in tool_instance.monitored_players:
-            if p['puuid'] == puuid:
-                player = p
-                break
+        player = tool_instance.monitored_players.get(puuid)
         
         if not player:
             return jsonify({'error': 'プレイヤーが見つかりません'})
         
-        recent_games = tool_instance.get_recent_match_history(puuid, player['cluster'])
-        return jsonify({'games': recent_games})
+        # 新しいマッチはゲーム終了から遅れて match-v5 に載るため TTL でも作り直す
+        # （監視デーモンモードでは API を呼ばず、デーモンが取り込んだ保存済みのマッチを返す）
+        return response_cache.respond(
+            f'recent_games:{puuid}',
+            lambda: {'games': tool_instance.get_recent_match_history(puuid, player['cluster'])},
+            ttl=RESPONSE_CACHE_TTL)
         
     except Exception as e:
         return jsonify({'error': f'ゲーム履歴取得エラー: {str(e)}'})
 
+@app.route('/api/get_champion_frequency')
+def get_champion_frequency():
+    """チャンピオン使用頻度（puuid 指定時はそのプレイヤーのみ、参加者全員のピックが対象）"""
+    if not tool_instance:
+        return jsonify({'error': 'API Keyを先に設定してください'})
+    
+    try:
+        puuid = request.args.get('puuid') or None
+        limit = request.args.get('limit', default=20, type=int)
+        return jsonify({'champions': tool_instance.get_champion_frequency(puuid, limit)})
+    except Exception as e:
+        return jsonify({'error': f'チャンピオン頻度取得エラー: {str(e)}'})
+
+@app.route('/api/get_coplayers/<puuid>')
+def get_coplayers(puuid):
+    """指定プレイヤーと同じゲームに参加したプレイヤー（監視対象以外も含む）"""
+    if not tool_instance:
+        return jsonify({'error': 'API Keyを先に設定してください'})
+    
+    try:
+        limit = request.args.get('limit', default=20, type=int)
+        return jsonify({'coplayers': tool_instance.get_coplayers(puuid, limit)})
+    except Exception as e:
+        return jsonify({'error': f'同じゲームのプレイヤー取得エラー: {str(e)}'})
+
+def run_match_backfill(puuid, cluster, start_time):
+    """マッチ履歴のバックフィルをバックグラウンドで実行し、完了を WebSocket で通知"""
+    try:
+        summary = tool_instance.backfill_match_history(puuid, cluster, start_time)
+    except Exception as e:
+        broadcast_update('match_backfill_done', {'puuid': puuid, 'success': False, 'error': str(e)})
+        return
+    
+    broadcast_update('match_backfill_done', {'puuid': puuid, 'success': True, 'summary': summary})
+
+@app.route('/api/backfill_matches/<puuid>', methods=['POST'])
+def backfill_matches(puuid):
+    """指定時刻以降の全マッチ履歴を取得（JSON {"start_time": UNIX秒}、省略時は全期間）"""
+    if not tool_instance:
+        return jsonify({'success': False, 'error': 'API Keyを先に設定してください'})
+    
+    if event_log:
+        return jsonify({'success': False, 'error': '監視デーモンモードではマッチ履歴の取得は利用できません'})
+    
+    player = tool_instance.monitored_players.get(puuid)
+    if not player:
+        return jsonify({'success': False, 'error': 'プレイヤーが見つかりません'})
+    
+    data = request.get_json(silent=True) or {}
+    # レート制限待ちの HTTP 呼び出しが続くため実スレッドで実行（eventlet のハブを止めない）
+    threading.Thread(target=run_match_backfill, args=(puuid, player['cluster'], data.get('start_time')),
+                     daemon=True, name=f"match-backfill-{puuid[:8]}").start()
+    return jsonify({'success': True, 'message': 'マッチ履歴の取得を開始しました'})
+
+def start_embedded_monitoring():
+    """このプロセスで監視を開始し、開始/終了を WebSocket で配信"""
+    tool_instance.set_game_callbacks(
+        on_game_start=on_player_game_start,
+        on_game_end=on_player_game_end
+    )
+    tool_instance.start_monitoring()
+    publish_monitoring_started()
+
+def resume_monitoring():
+    """前回監視中のまま終了していた場合は監視を再開（停止中に終わったゲームも最初のスイープで閉じる）"""
+    if tool_instance.monitored_players and tool_instance.monitoring_enabled():
+        print(f"前回の監視を再開します ({len(tool_instance.monitored_players)} 人)")
+        start_embedded_monitoring()
+
 def on_player_game_start(player, game_data):
     """プレイヤーのゲーム開始時コールバック"""
-    broadcast_update('game_started', {
-        'player': {
-            'game_name': player['game_name'],
-            'tag_line': player['tag_line'],
-            'puuid': player['puuid']
-        },
-        'game_info': {
-            'gameId': game_data.get('gameId'),
-            'gameStartTime': game_data.get('gameStartTime'),
-            'participants': len(game_data.get('participants', []))
-        },
-        'players': get_monitored_players_data()
-    })
+    publish_player(player, 'game_started')
 
 def on_player_game_end(player):
     """プレイヤーのゲーム終了時コールバック"""
-    broadcast_update('game_ended', {
-        'player': {
-            'game_name': player['game_name'],
-            'tag_line': player['tag_line'],
-            'puuid': player['puuid']
-        },
-        'players': get_monitored_players_data()
-    })
+    publish_player(player, 'game_ended')
+
+def get_player_data(player):
+    """プレイヤー1人分の表示用データ"""
+    game = tool_instance.current_games.get(player['puuid'])
+    game_info = None
+    
+    if game:
+        game_info = {
+            'gameId': game.game_id,
+            'gameStartTime': game.game_start_time,  # クライアントで経過時間を計算する場合用
+            'gameLength': game.game_length,
+            'participants': game.participant_count
+        }
+    
+    return {
+        'game_name': player['game_name'],
+        'tag_line': player['tag_line'],
+        'region': player['region'],
+        'status': 'playing' if game else 'waiting',
+        'puuid': player['puuid'],
+        'game_info': game_info
+    }
 
 def get_monitored_players_data():
     """監視対象プレイヤーのデータを取得"""
     if not tool_instance:
         return []
     
-    players_data = []
-    for player in tool_instance.monitored_players:
-        is_playing = player['puuid'] in tool_instance.current_games
-        game_info = None
-        
-        if is_playing:
-            game_data = tool_instance.current_games[player['puuid']]
-            game_info = {
-                'gameId': game_data.get('gameId'),
-                'gameLength': game_data.get('gameLength', 0),
-                'participants': len(game_data.get('participants', []))
-            }
-        
-        players_data.append({
-            'game_name': player['game_name'],
-            'tag_line': player['tag_line'],
-            'region': player['region'],
-            'status': 'playing' if is_playing else 'waiting',
-            'puuid': player['puuid'],
-            'game_info': game_info
-        })
+    return [get_player_data(player) for player in tool_instance.monitored_players]
+
+def get_players_state():
+    """全体の状態（バージョン付き）"""
+    # バージョンを先に読むことで、取得中の変更は後から差分として再適用される
+    version = state_log.version
+    return {
+        'version': version,
+        'players': get_monitored_players_data(),
+        'monitoring': tool_instance.monitoring if tool_instance else False
+    }
+
+def submit_daemon_command(command, payload, message, **extra):
+    """変更要求を監視デーモンに送る（結果は WebSocket の command_result と差分で届く）"""
+    status = event_log.daemon_status()
+    if not status or not status['alive']:
+        return jsonify({'success': False, 'error': '監視デーモンが起動していません (python monitor_daemon.py)'})
+    
+    command_id = event_log.submit_command(command, payload)
+    return jsonify(dict(extra, success=True, queued=True, command_id=command_id, message=message))
+
+def handle_daemon_event(event):
+    """監視デーモンのイベントを表示用の状態に反映して配信"""
+    event_type, puuid, payload = event['type'], event['puuid'], event['payload'] or {}
     
-    return players_data
+    if event_type == 'game_started':
+        player = tool_instance.monitored_players.get(puuid)
+        if player:
+            tool_instance.current_games[puuid] = payload['game']
+            publish_player(player, 'game_started')
+    elif event_type == 'game_ended':
+        player = tool_instance.monitored_players.get(puuid)
+        if player and tool_instance.current_games.pop(puuid, None) is not None:
+            publish_player(player, 'game_ended')
+    elif event_type == 'player_added':
+        player = PlayerRecord(**payload['player'])
+        if tool_instance.monitored_players.add(player):
+            publish_player(player)
+    elif event_type == 'player_removed':
+        tool_instance.current_games.pop(puuid, None)
+        if tool_instance.monitored_players.remove(puuid):
+            publish_player_removed(puuid)
+    elif event_type == 'monitoring':
+        tool_instance.monitoring = payload['monitoring']
+        if tool_instance.monitoring:
+            publish_monitoring_started()
+        else:
+            tool_instance.current_games.clear()
+            publish_full_state()
+    else:
+        # bulk_import_progress / bulk_import_done / command_result はそのまま中継
+        broadcast_update(event_type, payload)
+
+def attach_to_daemon():
+    """監視デーモンのイベントを購読する表示専用のビューを作成（API Key は不要）"""
+    global tool_instance, event_log, event_subscriber
+    
+    started = time.time()
+    tool_instance = MonitorStateView()
+    tool_instance.restore_monitored_players()
+    event_log = EventLog(tool_instance.storage)
+    
+    status = event_log.daemon_status()
+    tool_instance.monitoring = bool(status and status['alive'] and status['monitoring'])
+    
+    # 復元中に書かれたイベントも取りこぼさないよう、作成前の位置から再生する（適用は冪等）
+    event_subscriber = EventSubscriber(event_log, handle_daemon_event,
+                                       start_after=event_log.id_before(started))
+    event_subscriber.start()
+    print(f"監視デーモンのイベントを購読します ({len(tool_instance.monitored_players)} 人)")
 
 @app.errorhandler(404)
 def not_found(error):
@@ -361,4 +704,11 @@ if __name__ == '__main__':
     print("  4. リアルタイムでゲーム状況を確認")
     print("\n⚠️  注意: config.py でAPI Keyを設定してください")
     
+    if MONITOR_MODE == "daemon":
+        attach_to_daemon()
+    elif RIOT_API_KEY:
+        # config.py に API Key があれば入力を待たずに復元し、前回の監視を再開
+        tool_instance = RiotAPISpectatorTool()
+        resume_monitoring()
+    
     socketio.run(app, host=HOST, port=PORT, debug=DEBUG)
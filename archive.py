@@ -0,0 +1,386 @@
+"""ゲーム履歴の列指向アーカイブ（オフライン分析用）
+
+game_data と参加者を月・リージョンごとのパーティションに分けて、列ごとの
+NumPy 配列（.npy）として書き出す。読み込み時は np.load(mmap_mode='r') で
+メモリマップするため、1年分の履歴でも行ごとの JSON 解析なしにベクトル演算できる。
+
+<root>/<YYYY-MM>/<region>/<テーブル>/<最初のid>-<最後のid>/<列>.npy
+
+- player_games: game_data 1行（プレイヤー1人のゲーム1件）ごと
+- participants: ゲームの参加者ごと（同じゲームは1回だけ）
+
+プレイヤーは puuid ではなく整数コード（<root>/players.json の位置）で保持する。
+書き出し済みの位置（チェックポイント）はバッチの全チャンクを書き終えてから
+<root>/watermark.json に記録するので、途中で止まっても次回はそのバッチから書き直される。
+prune はこの位置以下で、書き出し対象になった（終了済みの）行だけを削除する。試合後の取り込みで終了時刻が補正されるため、
+開始から settle 秒以上経った行だけを書き出す。
+
+numpy が必要（pip install numpy）。
+
+使い方: python archive.py export | info | prune --older-than-days 180 [--vacuum]
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+try:
+    import numpy as np  # アーカイブ使用時のみ必要 (pip install numpy)
+except ImportError:
+    np = None
+
+# テーブルごとの列と型
+TABLES = {
+    'player_games': (
+        ('game_id', 'int64'), ('player', 'int32'), ('start_ms', 'int64'), ('end_ms', 'int64'),
+        ('duration_ms', 'int64'), ('win', 'int8'), ('champion_id', 'int16'), ('team_id', 'int16'),
+    ),
+    'participants': (
+        ('game_id', 'int64'), ('player', 'int32'), ('champion_id', 'int16'), ('team_id', 'int16'),
+        ('spell1_id', 'int16'), ('spell2_id', 'int16'),
+    ),
+}
+
+EXPORT_BATCH_SIZE = 50000
+DEFAULT_SETTLE_SECONDS = 2 * 24 * 3600
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("アーカイブには numpy が必要です (pip install numpy)")
+
+
+def _int(value, default: int = -1) -> int:
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def partition_of(start_ms: int, region: str) -> tuple:
+    """(YYYY-MM, region) のパーティションキー（月は UTC）"""
+    month = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).strftime('%Y-%m')
+    return month, region or 'unknown'
+
+
+class GameArchive:
+    """game_data の列指向アーカイブへの追記・読み込み・SQLite からの削除"""
+
+    def __init__(self, root_dir: str, storage=None, settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        _require_numpy()
+        self.root_dir = root_dir
+        self.storage = storage
+        self.settle_seconds = settle_seconds
+        self.lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+        self.players: List[str] = self._load_players()
+        self.player_codes: Dict[str, int] = {puuid: code for code, puuid in enumerate(self.players)}
+
+    # --- プレイヤーコード ---
+
+    def _players_path(self) -> str:
+        return os.path.join(self.root_dir, 'players.json')
+
+    def _load_players(self) -> List[str]:
+        try:
+            with open(self._players_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save_players(self):
+        """コード表を保存（追記のみなので、チャンクより先に書けば参照切れにならない）"""
+        tmp_path = f"{self._players_path()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.players, f)
+        os.replace(tmp_path, self._players_path())
+
+    def player_code(self, puuid: str, create: bool = True) -> int:
+        code = self.player_codes.get(puuid)
+        if code is None and create:
+            code = self.player_codes[puuid] = len(self.players)
+            self.players.append(puuid)
+        return -1 if code is None else code
+
+    # --- チャンク ---
+
+    def _chunks(self, table: str, months: Iterable[str] = None, regions: Iterable[str] = None) -> List[str]:
+        months = set(months) if months else None
+        regions = set(regions) if regions else None
+        chunks = []
+        for month in sorted(os.listdir(self.root_dir)):
+            month_dir = os.path.join(self.root_dir, month)
+            if not os.path.isdir(month_dir) or (months and month not in months):
+                continue
+            for region in sorted(os.listdir(month_dir)):
+                if regions and region not in regions:
+                    continue
+                table_dir = os.path.join(month_dir, region, table)
+                if not os.path.isdir(table_dir):
+                    continue
+                for name in sorted(os.listdir(table_dir), key=lambda name: _int(name.split('-')[0])):
+                    if not name.endswith('.tmp'):
+                        chunks.append(os.path.join(table_dir, name))
+        return chunks
+
+    def _watermark_path(self) -> str:
+        return os.path.join(self.root_dir, 'watermark.json')
+
+    def checkpoint(self) -> int:
+        """書き出し済みの最後の game_data.id（バッチ全体を書き終えた位置）"""
+        try:
+            with open(self._watermark_path(), encoding='utf-8') as f:
+                return _int(json.load(f).get('last_id'), 0)
+        except FileNotFoundError:
+            # watermark.json より前のアーカイブはチャンク名から求める
+            return max((_int(os.path.basename(chunk).split('-')[-1], 0)
+                        for chunk in self._chunks('player_games')), default=0)
+
+    def _save_checkpoint(self, last_id: int):
+        tmp_path = f"{self._watermark_path()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_id': last_id, 'updated_at': int(time.time())}, f)
+        os.replace(tmp_path, self._watermark_path())
+
+    def _write_chunk(self, table: str, partition: tuple, first_id: int, last_id: int, columns: dict):
+        month, region = partition
+        chunk_dir = os.path.join(self.root_dir, month, region, table, f"{first_id}-{last_id}")
+        tmp_dir = f"{chunk_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, dtype in TABLES[table]:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(columns[name], dtype=dtype))
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        os.replace(tmp_dir, chunk_dir)
+
+    # --- 書き出し ---
+
+    def export(self, now: float = None) -> dict:
+        """チェックポイント以降の確定した行をパーティションごとに追記"""
+        now = now or time.time()
+        cutoff_ms = int((now - self.settle_seconds) * 1000)
+        summary = {'rows': 0, 'participants': 0, 'skipped': 0, 'chunks': 0}
+
+        with self.lock:
+            checkpoint = self.checkpoint()
+            while True:
+                rows = self._settled_rows(checkpoint, cutoff_ms)
+                if not rows:
+                    break
+                self._export_batch(rows, checkpoint, summary)
+                checkpoint = rows[-1][0]
+                if len(rows) < EXPORT_BATCH_SIZE:
+                    break
+        return summary
+
+    def _settled_rows(self, checkpoint: int, cutoff_ms: int) -> list:
+        """チェックポイントの次から、開始が cutoff より前の行が連続する範囲だけを返す"""
+        rows = self.storage.query('''
+            SELECT gd.id, gd.puuid, gd.game_id, gd.game_start_time, gd.game_end_time, gd.game_duration,
+                   gd.win, gd.match_id, mp.region, gp.champion_id, gp.team_id
+            FROM game_data AS gd
+            LEFT JOIN monitored_players AS mp ON mp.puuid = gd.puuid
+            LEFT JOIN game_participants AS gp ON gp.game_id = gd.game_id AND gp.puuid = gd.puuid
+            WHERE gd.id > ?
+            ORDER BY gd.id
+            LIMIT ?
+        ''', (checkpoint, EXPORT_BATCH_SIZE))
+        # id の順と開始時刻の順がずれても行を飛ばさないよう、未確定の行の手前で止める
+        for index, row in enumerate(rows):
+            if row[3] is not None and row[3] > cutoff_ms:
+                return rows[:index]
+        return rows
+
+    def _export_batch(self, rows: list, checkpoint: int, summary: dict):
+        first_id, last_id = rows[0][0], rows[-1][0]
+        games: Dict[tuple, Dict[str, list]] = {}
+        game_partitions: Dict[str, tuple] = {}
+
+        for row_id, puuid, game_id, start_ms, end_ms, duration_ms, win, match_id, region, \
+                champion_id, team_id in rows:
+            if end_ms is None or not start_ms:
+                # 終了が記録されないまま古くなった行（監視停止中に終わったゲームなど）
+                summary['skipped'] += 1
+                continue
+            if not region and match_id and '_' in match_id:
+                region = match_id.split('_', 1)[0].lower()
+            partition = partition_of(start_ms, region)
+            game_partitions.setdefault(str(game_id), partition)
+            columns = games.setdefault(partition, {name: [] for name, _ in TABLES['player_games']})
+            columns['game_id'].append(_int(game_id))
+            columns['player'].append(self.player_code(puuid))
+            columns['start_ms'].append(start_ms)
+            columns['end_ms'].append(end_ms)
+            columns['duration_ms'].append(_int(duration_ms, 0))
+            columns['win'].append(-1 if win is None else int(win))
+            columns['champion_id'].append(_int(champion_id))
+            columns['team_id'].append(_int(team_id))
+
+        participants = self._participant_columns(game_partitions, checkpoint)
+
+        self._save_players()
+        for table, partitions in (('participants', participants), ('player_games', games)):
+            for partition, columns in partitions.items():
+                self._write_chunk(table, partition, first_id, last_id, columns)
+                summary['chunks'] += 1
+        # 全チャンクを書き終えてから位置を進める（prune はこの位置までしか削除しない）
+        self._save_checkpoint(last_id)
+        summary['rows'] += sum(len(columns['game_id']) for columns in games.values())
+        summary['participants'] += sum(len(columns['game_id']) for columns in participants.values())
+
+    def _participant_columns(self, game_partitions: Dict[str, tuple], checkpoint: int) -> dict:
+        """このバッチで初めて出てきたゲームの参加者"""
+        if not game_partitions:
+            return {}
+        exported = self.storage.query('''
+            SELECT DISTINCT game_id FROM game_data WHERE id <= ? AND game_id IN (SELECT value FROM json_each(?))
+        ''', (checkpoint, json.dumps(list(game_partitions))))
+        for (game_id,) in exported:
+            game_partitions.pop(str(game_id), None)
+
+        rows = self.storage.query('''
+            SELECT game_id, puuid, champion_id, team_id, spell1_id, spell2_id FROM game_participants
+            WHERE game_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(game_partitions)),))
+        participants: Dict[tuple, Dict[str, list]] = {}
+        for game_id, puuid, champion_id, team_id, spell1_id, spell2_id in rows:
+            columns = participants.setdefault(game_partitions[str(game_id)],
+                                              {name: [] for name, _ in TABLES['participants']})
+            columns['game_id'].append(_int(game_id))
+            # 監視対象以外の参加者はコードを振らない（-1）
+            columns['player'].append(self.player_code(puuid, create=False))
+            columns['champion_id'].append(_int(champion_id))
+            columns['team_id'].append(_int(team_id))
+            columns['spell1_id'].append(_int(spell1_id))
+            columns['spell2_id'].append(_int(spell2_id))
+        return participants
+
+    # --- 読み込み ---
+
+    def load(self, table: str = 'player_games', months: Iterable[str] = None,
+             regions: Iterable[str] = None, mmap: bool = True) -> Dict[str, 'np.ndarray']:
+        """テーブルを列ごとの配列で読み込む（チャンクが1つならメモリマップのまま返す）"""
+        chunks = self._chunks(table, months, regions)
+        mode = 'r' if mmap else None
+        columns = {}
+        for name, dtype in TABLES[table]:
+            parts = [np.load(os.path.join(chunk, f"{name}.npy"), mmap_mode=mode) for chunk in chunks]
+            if not parts:
+                columns[name] = np.empty(0, dtype=dtype)
+            elif len(parts) == 1:
+                columns[name] = parts[0]
+            else:
+                columns[name] = np.concatenate(parts)
+        return columns
+
+    def compact(self, table: str = None):
+        """パーティション内のチャンクを1つにまとめる（読み込みをメモリマップだけで済ませるため）"""
+        with self.lock:
+            for table_name in ([table] if table else TABLES):
+                by_partition: Dict[str, List[str]] = {}
+                for chunk in self._chunks(table_name):
+                    by_partition.setdefault(os.path.dirname(chunk), []).append(chunk)
+                for table_dir, chunks in by_partition.items():
+                    if len(chunks) < 2:
+                        continue
+                    columns = {name: np.concatenate([np.load(os.path.join(chunk, f"{name}.npy"))
+                                                     for chunk in chunks])
+                               for name, _ in TABLES[table_name]}
+                    first_id = _int(os.path.basename(chunks[0]).split('-')[0])
+                    last_id = max(_int(os.path.basename(chunk).split('-')[-1]) for chunk in chunks)
+                    region_dir, _ = os.path.split(table_dir)
+                    month_dir, region = os.path.split(region_dir)
+                    self._write_chunk(table_name, (os.path.basename(month_dir), region),
+                                      first_id, last_id, columns)
+                    for chunk in chunks:
+                        if os.path.basename(chunk) != f"{first_id}-{last_id}":
+                            shutil.rmtree(chunk)
+
+    # --- SQLite からの削除 ---
+
+    def prune(self, older_than_ms: int, vacuum: bool = False) -> int:
+        """アーカイブ済みで開始が older_than_ms より前の行を SQLite から削除
+
+        書き出し済みの位置以下で、書き出し時に除外されない（開始・終了が記録された）行だけが対象。
+        終了が記録されないまま古くなった行はアーカイブされていないので残す。
+        集計済みテーブル（ロールアップ）は残るが、rollups.py での再構築には使えなくなる。
+        """
+        checkpoint = self.checkpoint()
+        with self.storage.write_lock:
+            writer = self.storage.writer
+            try:
+                cursor = writer.execute('''
+                    DELETE FROM game_data
+                    WHERE id <= ? AND game_start_time > 0 AND game_start_time < ? AND game_end_time IS NOT NULL
+                ''', (checkpoint, older_than_ms))
+                deleted = cursor.rowcount
+                # どの game_data からも参照されなくなったゲーム本体と参加者
+                for table in ('game_participants', 'games'):
+                    writer.execute(f'''
+                        DELETE FROM {table} WHERE game_id NOT IN
+                        (SELECT DISTINCT game_id FROM game_data WHERE game_id IS NOT NULL)
+                    ''')
+                writer.commit()
+            except Exception:
+                writer.rollback()
+                raise
+            if vacuum:
+                writer.execute('VACUUM')
+        return deleted
+
+    def get_stats(self) -> dict:
+        chunks = self._chunks('player_games')
+        size = 0
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            size += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return {
+            'checkpoint': self.checkpoint(),
+            'players': len(self.players),
+            'partitions': len({os.path.dirname(chunk) for chunk in chunks}),
+            'chunks': len(chunks),
+            'size_mb': round(size / 2 ** 20, 2)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲーム履歴の列指向アーカイブ")
+    parser.add_argument('command', choices=['export', 'compact', 'prune', 'info'])
+    parser.add_argument('--settle-days', type=float, default=None, help="開始からこの日数が経った行だけ書き出す")
+    parser.add_argument('--older-than-days', type=float, default=180, help="prune: この日数より前の行を削除")
+    parser.add_argument('--vacuum', action='store_true', help="prune: 削除後に VACUUM でファイルを縮める")
+    args = parser.parse_args()
+
+    from riot_api_tool import ARCHIVE_DIR, ARCHIVE_SETTLE_SECONDS, DATABASE_PATH
+    from storage import GameStorage
+
+    storage = GameStorage(DATABASE_PATH)
+    storage.init_schema()
+    settle = args.settle_days * 86400 if args.settle_days is not None else ARCHIVE_SETTLE_SECONDS
+    archive = GameArchive(ARCHIVE_DIR, storage, settle)
+
+    start = time.time()
+    if args.command == 'export':
+        summary = archive.export()
+        print(f"{summary['rows']} 行 / 参加者 {summary['participants']} 行を書き出しました "
+              f"({summary['chunks']} チャンク, 未終了などで除外 {summary['skipped']} 行, "
+              f"{time.time() - start:.2f}秒)")
+    elif args.command == 'compact':
+        archive.compact()
+        print(f"チャンクをまとめました ({time.time() - start:.2f}秒)")
+    elif args.command == 'prune':
+        older_than_ms = int((time.time() - args.older_than_days * 86400) * 1000)
+        deleted = archive.prune(older_than_ms, args.vacuum)
+        print(f"アーカイブ済みの {deleted} 行をデータベースから削除しました ({time.time() - start:.2f}秒)")
+    print(json.dumps(archive.get_stats(), ensure_ascii=False))
+    storage.close()
+
+
+if __name__ == "__main__":
+    main()
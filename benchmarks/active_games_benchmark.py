@@ -0,0 +1,93 @@
+"""進行中ゲームの保持方法ごとのメモリ使用量ベンチマーク
+
+全プレイヤーがゲーム中の状態を疑似サーバーと同じ形式のゲーム情報で作り、
+元の JSON をそのまま dict で保持した場合と ActiveGameTable の場合とで
+tracemalloc によるメモリ使用量と、表示用データ作成（全員分の走査）の時間を比べる。
+
+使い方: python benchmarks/active_games_benchmark.py [--players 1000,10000,100000] [--lobby-size 1]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from active_games import ActiveGameTable
+from fake_riot_api import FakeWorld, fake_puuid
+
+
+def api_responses(world: FakeWorld, players: int, now: float):
+    """プレイヤーごとのスペクテイター API の応答（毎回デコードされた別オブジェクト）"""
+    for index in range(players):
+        lobby = index // world.lobby_size
+        payload = world.game_payload(lobby, 0, 'KR', now - 600, now)
+        yield fake_puuid(index), json.loads(json.dumps(payload))
+
+
+def walk_raw(games: dict):
+    return [
+        {'gameId': game.get('gameId'), 'gameLength': game.get('gameLength', 0),
+         'participants': len(game.get('participants', []))}
+        for game in games.values()
+    ]
+
+
+def walk_compact(games: ActiveGameTable):
+    return [
+        {'gameId': game.game_id, 'gameLength': game.game_length, 'participants': game.participant_count}
+        for _, game in games.items()
+    ]
+
+
+def measure(build, walk, world: FakeWorld, players: int, now: float) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    games = build(api_responses(world, players, now))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    walk(games)
+    return {'bytes': used, 'walk_ms': (time.perf_counter() - start) * 1000}
+
+
+def build_raw(responses) -> dict:
+    return {puuid: game for puuid, game in responses}
+
+
+def build_compact(responses) -> ActiveGameTable:
+    table = ActiveGameTable()
+    for puuid, game in responses:
+        table[puuid] = game
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="進行中ゲームの保持方法ごとのメモリ使用量")
+    parser.add_argument('--players', default='1000,10000,100000', help="カンマ区切りのプレイヤー数")
+    parser.add_argument('--lobby-size', type=int, default=1, help="同じゲームにいる監視対象の人数")
+    args = parser.parse_args()
+
+    now = time.time()
+    print(f"{'人数':>7} {'dict_MB':>9} {'compact_MB':>11} {'削減率':>7} {'B/人(dict)':>11} "
+          f"{'B/人(compact)':>14} {'走査ms(dict)':>13} {'走査ms(compact)':>16}")
+    for players in [int(n) for n in args.players.split(',')]:
+        world = FakeWorld(players, lobby_size=args.lobby_size)
+        raw = measure(build_raw, walk_raw, world, players, now)
+        compact = measure(build_compact, walk_compact, world, players, now)
+        print(f"{players:>7} {raw['bytes'] / 2 ** 20:>9.1f} {compact['bytes'] / 2 ** 20:>11.1f} "
+              f"{(1 - compact['bytes'] / raw['bytes']) * 100:>6.1f}% {raw['bytes'] // players:>11} "
+              f"{compact['bytes'] // players:>14} {raw['walk_ms']:>13.1f} {compact['walk_ms']:>16.1f}",
+              flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""履歴分析のベンチマーク（SQL で毎回集計 vs AnalyticsEngine の配列集計）
+
+一時ディレクトリの SQLite に合成したゲーム履歴（game_data と game_participants）を書き込み、
+試合時間の分布・曜日×時間帯・チャンピオン頻度・同じゲームの監視対象の組について
+SQL（+ Python）で毎回集計した場合と、配列に読み込んだ AnalyticsEngine の場合の時間を比べる。
+最後に新しい行を追加して差分読み込みの時間を測る。
+
+使い方: python benchmarks/analytics_benchmark.py [--rows 1000000] [--players 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import AnalyticsEngine
+from storage import GameStorage
+
+DAY_MS = 86400 * 1000
+GAME_INSERT_SQL = '''
+    INSERT INTO game_data (puuid, game_name, tag_line, game_id, game_start_time, game_end_time,
+                           game_duration, win)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+PARTICIPANT_INSERT_SQL = '''
+    INSERT OR IGNORE INTO game_participants (game_id, puuid, champion_id, team_id)
+    VALUES (?, ?, ?, ?)
+'''
+
+
+def synthetic_games(rows: int, players: int, span_ms: int, first_game_id: int, end_before_ms: int,
+                    seed: int = 1):
+    """end_before_ms までの span_ms の間に終了したゲームの (game_data の行, game_participants の行)
+
+    1割のゲームには監視対象が複数いる。
+    """
+    rng = random.Random(seed)
+    puuids = [f"bench-player-{index:06d}" for index in range(players)]
+    game_rows, participant_rows = [], []
+    game_id = first_game_id
+    while len(game_rows) < rows:
+        game_id += 1
+        duration = int(rng.gauss(30, 6) * 60000)
+        end = end_before_ms - rng.randrange(span_ms)
+        start = end - duration
+        lobby = 1 if rng.random() < 0.9 else rng.randint(2, 5)
+        winning_team = rng.choice((100, 200))
+        for puuid in rng.sample(puuids, min(lobby, rows - len(game_rows))):
+            team = rng.choice((100, 200))
+            game_rows.append((puuid, puuid[-6:], 'BNCH', str(game_id), start, end, duration,
+                              int(team == winning_team)))
+            participant_rows.append((str(game_id), puuid, rng.randint(1, 160), team))
+    return game_rows, participant_rows, game_id
+
+
+def populate(storage: GameStorage, game_rows: list, participant_rows: list):
+    with storage.write_lock:
+        storage.writer.executemany(GAME_INSERT_SQL, game_rows)
+        storage.writer.executemany(PARTICIPANT_INSERT_SQL, participant_rows)
+        storage.writer.commit()
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+
+# --- SQL で毎回集計する場合（比較用） ---
+
+def sql_durations(storage: GameStorage):
+    durations = sorted(row[0] / 60000.0 for row in storage.query(
+        'SELECT game_duration FROM game_data WHERE game_end_time > 0 AND game_duration > 0'))
+    return {p: durations[min(len(durations) - 1, len(durations) * p // 100)] for p in (10, 50, 90, 99)}
+
+
+def sql_heatmap(storage: GameStorage):
+    return storage.query('''
+        SELECT strftime('%w', game_start_time / 1000, 'unixepoch') AS weekday,
+               strftime('%H', game_start_time / 1000, 'unixepoch') AS hour, COUNT(*)
+        FROM game_data WHERE game_end_time > 0 GROUP BY weekday, hour
+    ''')
+
+
+def sql_champions(storage: GameStorage):
+    return storage.query('''
+        SELECT gp.champion_id, COUNT(*), SUM(gd.win = 1)
+        FROM game_data AS gd
+        JOIN game_participants AS gp ON gp.game_id = gd.game_id AND gp.puuid = gd.puuid
+        WHERE gd.game_end_time > 0
+        GROUP BY gp.champion_id ORDER BY COUNT(*) DESC LIMIT 20
+    ''')
+
+
+def sql_coplay(storage: GameStorage):
+    return storage.query('''
+        SELECT a.puuid, b.puuid, COUNT(*)
+        FROM game_data AS a
+        JOIN game_data AS b ON b.game_id = a.game_id AND b.puuid > a.puuid
+        WHERE a.game_end_time > 0 AND b.game_end_time > 0
+        GROUP BY a.puuid, b.puuid ORDER BY COUNT(*) DESC LIMIT 50
+    ''')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="履歴分析の集計時間")
+    parser.add_argument('--rows', type=int, default=1000000, help="game_data の行数")
+    parser.add_argument('--players', type=int, default=2000, help="監視対象プレイヤー数")
+    parser.add_argument('--days', type=int, default=365, help="履歴の期間（日）")
+    parser.add_argument('--incremental-rows', type=int, default=1000, help="差分読み込みで追加する行数")
+    parser.add_argument('--skip-sql', action='store_true', help="SQL での集計を省略")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = GameStorage(os.path.join(directory, 'bench.db'))
+        storage.init_schema()
+
+        now_ms = int(time.time() * 1000)
+        print(f"{args.rows} 行の履歴を生成中...", flush=True)
+        game_rows, participant_rows, last_game_id = synthetic_games(
+            args.rows, args.players, args.days * DAY_MS, 0, now_ms - 3600 * 1000)
+        populate(storage, game_rows, participant_rows)
+        del game_rows, participant_rows
+
+        # 集計時間だけを測るため自動の差分読み込みは行わない
+        engine = AnalyticsEngine(storage, refresh_interval=3600)
+        load_ms, _ = timed(lambda: engine.refresh(force=True))
+        stats = engine.get_stats()
+        print(f"初回読み込み: {load_ms:.0f} ms（{stats['rows']} 行, {stats['players']} 人, "
+              f"{stats['memory_mb']} MB）")
+
+        sample = f"bench-player-{0:06d}"
+        queries = [
+            ('試合時間の分布', lambda: engine.duration_stats(), sql_durations),
+            ('試合時間の分布(1人)', lambda: engine.duration_stats(sample), None),
+            ('曜日×時間帯', lambda: engine.activity_heatmap(), sql_heatmap),
+            ('曜日×時間帯(1人)', lambda: engine.activity_heatmap(sample), None),
+            ('チャンピオン頻度', lambda: engine.champion_frequency(), sql_champions),
+            ('同じゲームの組', lambda: engine.coplay(), sql_coplay),
+            ('同じゲームの組(1人)', lambda: engine.coplay(sample), None),
+        ]
+
+        # 1回目はキャッシュを消して計算、2回目はキャッシュから
+        print(f"{'集計':<22} {'SQL_ms':>9} {'配列_ms':>9} {'キャッシュ_ms':>13}")
+        for label, compute, sql in queries:
+            engine.cache.clear()
+            cold_ms, _ = timed(compute)
+            cached_ms, _ = timed(compute)
+            sql_ms = timed(lambda: sql(storage))[0] if sql and not args.skip_sql else None
+            sql_text = f"{sql_ms:>9.0f}" if sql_ms is not None else f"{'-':>9}"
+            print(f"{label:<22} {sql_text} {cold_ms:>9.1f} {cached_ms:>13.2f}", flush=True)
+
+        # 直近1時間に終了したゲームの追加と差分読み込み
+        new_games, new_participants, _ = synthetic_games(
+            args.incremental_rows, args.players, 3600 * 1000, last_game_id, now_ms, seed=2)
+        populate(storage, new_games, new_participants)
+        refresh_ms, changed = timed(lambda: engine.refresh(force=True))
+        print(f"差分読み込み: {refresh_ms:.1f} ms（{changed} 行）")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""ベンチマーク用のローカル疑似 Riot API サーバー
+
+account-v1 / summoner-v4 / spectator-v4（featured-games を含む）/ match-v5 の応答を合成（または記録済みの
+JSON から再生）して返す。遅延・404/429 の発生率・レート制限ヘッダーを指定できる。
+
+ツール側は config.py の API_BASE_URL_OVERRIDE = "http://127.0.0.1:8900" で
+このサーバーを向く（URL は {base}/{ホスト名}{パス} の形になる）。
+
+使い方: python benchmarks/fake_riot_api.py --port 8900 --players 1000 --latency 0.05
+
+合成されるプレイヤー: Riot ID は Player{i}#BENCH、puuid は fake-{i:06d}。
+lobby_size 人ずつ同じロビーに入り、ロビーごとに「待機 → ゲーム」を周期的に繰り返す。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GAME_ID_BASE = 10_000_000
+CYCLES_PER_LOBBY = 10_000
+
+
+def fake_puuid(index: int) -> str:
+    return f"fake-{index:06d}"
+
+
+def fake_index(puuid: str):
+    match = re.fullmatch(r'fake-(\d+)', puuid)
+    return int(match.group(1)) if match else None
+
+
+class FakeWorld:
+    """合成プレイヤーとロビーのゲーム周期（時刻から決定的に求める）"""
+
+    def __init__(self, players: int, lobby_size: int = 1, game_seconds: float = 60,
+                 idle_seconds: float = 120, seed: int = 0):
+        self.players = players
+        self.lobby_size = max(1, lobby_size)
+        self.epoch = time.time()
+        self.lobbies = []
+        rnd = random.Random(seed)
+        for _ in range((players + self.lobby_size - 1) // self.lobby_size):
+            game = game_seconds * rnd.uniform(0.7, 1.3)
+            idle = idle_seconds * rnd.uniform(0.5, 1.5)
+            # 開始時点で一部のロビーはゲーム中になるよう位相をずらす
+            self.lobbies.append((game, idle, rnd.uniform(0, game + idle)))
+
+    def members(self, lobby: int) -> list:
+        first = lobby * self.lobby_size
+        return [fake_puuid(i) for i in range(first, min(first + self.lobby_size, self.players))]
+
+    def cycle_window(self, lobby: int, cycle: int):
+        """ロビーの cycle 番目のゲームの (開始, 終了) UNIX 秒"""
+        game, idle, phase = self.lobbies[lobby]
+        start = self.epoch - phase + cycle * (game + idle) + idle
+        return start, start + game
+
+    def current_cycle(self, lobby: int, now: float) -> int:
+        game, idle, phase = self.lobbies[lobby]
+        return int((now - self.epoch + phase) // (game + idle))
+
+    def active_game(self, puuid: str, platform: str, now: float):
+        index = fake_index(puuid)
+        if index is None or index >= self.players:
+            return None
+        lobby = index // self.lobby_size
+        cycle = self.current_cycle(lobby, now)
+        start, end = self.cycle_window(lobby, cycle)
+        if not start <= now < end:
+            return None
+        return self.game_payload(lobby, cycle, platform, start, now)
+
+    def game_payload(self, lobby: int, cycle: int, platform: str, start: float, now: float) -> dict:
+        game_id = GAME_ID_BASE + lobby * CYCLES_PER_LOBBY + cycle
+        puuids = self.members(lobby)
+        puuids += [f"filler-{game_id}-{k}" for k in range(10 - len(puuids))]
+        return {
+            'gameId': game_id,
+            'platformId': platform,
+            'gameMode': 'CLASSIC',
+            'gameQueueConfigId': 420,
+            'gameStartTime': int(start * 1000),
+            'gameLength': int(now - start),
+            'participants': [
+                {
+                    'puuid': puuid,
+                    'teamId': 100 if k < 5 else 200,
+                    'championId': (game_id + k * 7) % 160 + 1,
+                    'spell1Id': 4,
+                    'spell2Id': 14,
+                    'perks': {'perkIds': [8112, 8139, 8138, 8135], 'perkStyle': 8100, 'perkSubStyle': 8300}
+                }
+                for k, puuid in enumerate(puuids)
+            ],
+            'bannedChampions': []
+        }
+
+    def featured_games(self, platform: str, now: float, count: int) -> list:
+        """ゲーム中のロビーのうち先頭 count 件（注目ゲーム一覧）"""
+        games = []
+        for lobby in range(len(self.lobbies)):
+            if len(games) >= count:
+                break
+            cycle = self.current_cycle(lobby, now)
+            start, end = self.cycle_window(lobby, cycle)
+            if start <= now < end:
+                games.append(self.game_payload(lobby, cycle, platform, start, now))
+        return games
+
+    def finished_match_ids(self, puuid: str, platform: str, start: int, count: int, start_time=None) -> list:
+        index = fake_index(puuid)
+        if index is None or index >= self.players:
+            return []
+        lobby = index // self.lobby_size
+        now = time.time()
+        match_ids = []
+        cycle = self.current_cycle(lobby, now)
+        while cycle >= 0 and len(match_ids) < start + count:
+            game_start, game_end = self.cycle_window(lobby, cycle)
+            if start_time and game_start < start_time:
+                break
+            if game_end <= now:
+                match_ids.append(f"{platform}_{GAME_ID_BASE + lobby * CYCLES_PER_LOBBY + cycle}")
+            cycle -= 1
+        return match_ids[start:start + count]
+
+    def match(self, match_id: str):
+        try:
+            platform, game_id = match_id.split('_', 1)
+            game_id = int(game_id)
+        except ValueError:
+            return None
+        lobby, cycle = divmod(game_id - GAME_ID_BASE, CYCLES_PER_LOBBY)
+        if not 0 <= lobby < len(self.lobbies) or cycle < 0:
+            return None
+        start, end = self.cycle_window(lobby, cycle)
+        if end > time.time():
+            return None  # 試合終了前は未公開
+        game = self.game_payload(lobby, cycle, platform, start, end)
+        winner = 100 if game_id % 2 else 200
+        return {
+            'metadata': {'matchId': match_id, 'participants': [p['puuid'] for p in game['participants']]},
+            'info': {
+                'gameId': game_id,
+                'queueId': 420,
+                'gameVersion': '14.1.1',
+                'gameCreation': int(start * 1000),
+                'gameStartTimestamp': int(start * 1000),
+                'gameEndTimestamp': int(end * 1000),
+                'gameDuration': int(end - start),
+                'teams': [{'teamId': 100, 'win': winner == 100}, {'teamId': 200, 'win': winner == 200}],
+                'participants': [
+                    {
+                        'puuid': p['puuid'], 'teamId': p['teamId'], 'championId': p['championId'],
+                        'teamPosition': '', 'win': p['teamId'] == winner,
+                        'kills': k, 'deaths': 10 - k, 'assists': k * 2,
+                        'totalDamageDealtToChampions': 1000 * k, 'goldEarned': 8000 + 100 * k,
+                        'totalMinionsKilled': 150 + k, 'neutralMinionsKilled': 10, 'visionScore': 20
+                    }
+                    for k, p in enumerate(game['participants'])
+                ]
+            }
+        }
+
+
+class FakeRiotAPI:
+    """リクエストの振り分け、遅延・エラー注入、レート制限ヘッダー、呼び出し統計"""
+
+    def __init__(self, world: FakeWorld, latency: float = 0.0, jitter: float = 0.0,
+                 not_found_rate: float = 0.0, rate_limited_rate: float = 0.0,
+                 app_rate_limit: str = None, replay: dict = None,
+                 featured_games: int = 5, featured_refresh: int = 300):
+        self.world = world
+        self.featured_count = featured_games
+        self.featured_refresh = featured_refresh
+        self.latency = latency
+        self.jitter = jitter
+        self.not_found_rate = not_found_rate
+        self.rate_limited_rate = rate_limited_rate
+        self.app_limits = [tuple(map(int, part.split(':'))) for part in app_rate_limit.split(',')] \
+            if app_rate_limit else []
+        self.replay = replay or {}
+
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.statuses = Counter()
+        self.recent = {}  # ホストごとの呼び出し時刻（レート制限ヘッダー用）
+
+    def rate_limit_headers(self, host: str, now: float) -> dict:
+        if not self.app_limits:
+            return {}
+        longest = max(window for _, window in self.app_limits)
+        with self.lock:
+            history = self.recent.setdefault(host, deque())
+            history.append(now)
+            while history and history[0] <= now - longest:
+                history.popleft()
+            counts = [sum(1 for t in history if t > now - window) for _, window in self.app_limits]
+        return {
+            'X-App-Rate-Limit': ','.join(f"{limit}:{window}" for limit, window in self.app_limits),
+            'X-App-Rate-Limit-Count': ','.join(f"{count}:{window}"
+                                               for count, (_, window) in zip(counts, self.app_limits)),
+        }
+
+    def handle(self, path: str, query: dict):
+        """(ステータス, 本文, 追加ヘッダー) を返す"""
+        parts = path.lstrip('/').split('/', 1)
+        if len(parts) < 2:
+            return 404, {'status': {'status_code': 404}}, {}
+        host, rest = parts[0], '/' + parts[1]
+        platform = host.split('.')[0].upper()
+        endpoint = self.endpoint_name(rest)
+        now = time.time()
+
+        with self.lock:
+            self.calls[endpoint] += 1
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        headers = self.rate_limit_headers(host, now)
+        if self.rate_limited_rate and random.random() < self.rate_limited_rate:
+            headers.update({'Retry-After': '1', 'X-Rate-Limit-Type': 'application'})
+            return 429, {'status': {'status_code': 429}}, headers
+        if self.not_found_rate and random.random() < self.not_found_rate:
+            return 404, {'status': {'status_code': 404}}, headers
+
+        if rest in self.replay:
+            return 200, self.replay[rest], headers
+
+        body = self.synthesize(rest, platform, query, now)
+        if body is None:
+            return 404, {'status': {'status_code': 404}}, headers
+        return 200, body, headers
+
+    @staticmethod
+    def endpoint_name(path: str) -> str:
+        segments = path.strip('/').split('/')
+        return '/'.join(segments[:4])
+
+    def synthesize(self, path: str, platform: str, query: dict, now: float):
+        world = self.world
+        match = re.fullmatch(r'/riot/account/v1/accounts/by-riot-id/Player(\d+)/BENCH', path)
+        if match:
+            index = int(match.group(1))
+            if index >= world.players:
+                return None
+            return {'puuid': fake_puuid(index), 'gameName': f"Player{index}", 'tagLine': 'BENCH'}
+
+        match = re.fullmatch(r'/lol/summoner/v4/summoners/by-puuid/([^/]+)', path)
+        if match:
+            index = fake_index(match.group(1))
+            if index is None or index >= world.players:
+                return None
+            return {'id': f"summoner-{index}", 'puuid': match.group(1), 'name': f"Player{index}",
+                    'summonerLevel': 30 + index % 500}
+
+        match = re.fullmatch(r'/lol/spectator/v\d/active-games/by-summoner/([^/]+)', path)
+        if match:
+            return world.active_game(match.group(1), platform, now)
+
+        if re.fullmatch(r'/lol/spectator/v\d/featured-games', path):
+            return {'gameList': world.featured_games(platform, now, self.featured_count),
+                    'clientRefreshInterval': self.featured_refresh}
+
+        match = re.fullmatch(r'/lol/match/v5/matches/by-puuid/([^/]+)/ids', path)
+        if match:
+            start = int(query.get('start', ['0'])[0])
+            count = int(query.get('count', ['20'])[0])
+            start_time = query.get('startTime', [None])[0]
+            platform_of = {'ASIA': 'KR', 'AMERICAS': 'NA1', 'EUROPE': 'EUW1'}.get(platform, platform)
+            return world.finished_match_ids(match.group(1), platform_of, start, count,
+                                            int(start_time) if start_time else None)
+
+        match = re.fullmatch(r'/lol/match/v5/matches/([^/]+)', path)
+        if match:
+            return world.match(match.group(1))
+        return None
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'calls': dict(self.calls), 'statuses': dict(self.statuses),
+                    'total_calls': sum(self.calls.values())}
+
+
+def make_handler(api: FakeRiotAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive（ツール側の接続プールを再利用させる）
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path == '/_stats':
+                status, body, headers = 200, api.get_stats(), {}
+            else:
+                status, body, headers = api.handle(parsed.path, parse_qs(parsed.query))
+                with api.lock:
+                    api.statuses[status] += 1
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json;charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int, api: FakeRiotAPI) -> ThreadingHTTPServer:
+    """別スレッドでサーバーを起動して返す"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の疑似 Riot API サーバー")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--lobby-size', type=int, default=1, help="同じゲームに入る監視対象の人数")
+    parser.add_argument('--game-seconds', type=float, default=60)
+    parser.add_argument('--idle-seconds', type=float, default=120)
+    parser.add_argument('--latency', type=float, default=0.0, help="応答遅延 (秒)")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--not-found-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limited-rate', type=float, default=0.0)
+    parser.add_argument('--app-rate-limit', default=None, help='例: "20:1,100:120"')
+    parser.add_argument('--featured-games', type=int, default=5, help="featured-games が返すゲーム数")
+    parser.add_argument('--featured-refresh', type=int, default=300, help="featured-games の clientRefreshInterval (秒)")
+    parser.add_argument('--replay', default=None, help="パス → 応答 JSON の辞書を記録したファイル")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay:
+        with open(args.replay, encoding='utf-8') as f:
+            replay = json.load(f)
+
+    world = FakeWorld(args.players, args.lobby_size, args.game_seconds, args.idle_seconds, args.seed)
+    api = FakeRiotAPI(world, args.latency, args.jitter, args.not_found_rate,
+                      args.rate_limited_rate, args.app_rate_limit, replay,
+                      args.featured_games, args.featured_refresh)
+    server = serve(args.port, api)
+    print(f"疑似 Riot API: http://127.0.0.1:{args.port} ({args.players} プレイヤー)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""監視ループの負荷ベンチマーク（疑似 Riot API サーバーに対して実行）
+
+プレイヤー数ごとに別プロセスで RiotAPISpectatorTool を起動し、疑似サーバー
+（benchmarks/fake_riot_api.py、これも別プロセス）に向けて一定時間監視させて
+スイープ時間・ゲーム開始の検知遅延・検知1件あたりの API 呼び出し数・CPU・メモリを計測する。
+
+使い方: python benchmarks/monitor_benchmark.py [--players 10,100,1000,10000] [--duration 60]
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FAKE_SERVER = os.path.join(ROOT, 'benchmarks', 'fake_riot_api.py')
+REGIONS = ['kr', 'jp1', 'na1', 'euw1']
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def start_fake_server(args, players: int):
+    """疑似サーバーを別プロセスで起動し (プロセス, ベースURL) を返す"""
+    port = free_port()
+    command = [
+        sys.executable, FAKE_SERVER, '--port', str(port), '--players', str(players),
+        '--lobby-size', str(args.lobby_size), '--game-seconds', str(args.game_seconds),
+        '--idle-seconds', str(args.idle_seconds), '--latency', str(args.latency),
+        '--jitter', str(args.jitter), '--not-found-rate', str(args.not_found_rate),
+        '--rate-limited-rate', str(args.rate_limited_rate)
+    ]
+    if args.app_rate_limit:
+        command += ['--app-rate-limit', args.app_rate_limit]
+    command += ['--featured-games', str(args.featured_games), '--featured-refresh', str(args.featured_refresh)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            fetch_json(f"{base_url}/_stats")
+            return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("疑似サーバーが起動しませんでした")
+
+
+def run_single(args, players: int) -> dict:
+    """このプロセス内でツールを起動して監視し、計測結果を返す"""
+    server, base_url = start_fake_server(args, players)
+    data_dir = tempfile.mkdtemp(prefix='spectator_bench_')
+    try:
+        import riot_api_tool
+        from player_registry import PlayerRecord
+
+        # 設定を疑似サーバー・一時ディレクトリ向けに差し替え
+        riot_api_tool.API_BASE_URL_OVERRIDE = base_url
+        riot_api_tool.DATA_DIR = data_dir
+        riot_api_tool.DATABASE_PATH = os.path.join(data_dir, 'bench.db')
+        riot_api_tool.MATCH_STORE_DIR = os.path.join(data_dir, 'matches')
+        riot_api_tool.RESTORE_ON_STARTUP = False
+        riot_api_tool.MONITOR_INTERVAL = args.interval
+        riot_api_tool.POLL_MAX_INTERVAL = args.interval * 10
+        riot_api_tool.MONITOR_WORKERS = args.workers
+        riot_api_tool.ADAPTIVE_POLLING = not args.fixed
+        riot_api_tool.FEATURED_GAMES_DISCOVERY = args.featured
+        riot_api_tool.FEATURED_GAMES_INTERVAL = args.featured_refresh
+        if not args.app_rate_limit:
+            riot_api_tool.RATE_LIMIT_CALLS = 10 ** 9
+
+        tool = riot_api_tool.RiotAPISpectatorTool('bench-key')
+        tool.match_ingest.stop()  # 試合後の取り込みは計測対象外
+
+        for i in range(players):
+            region = REGIONS[i % len(REGIONS)]
+            tool.monitored_players.add(PlayerRecord(
+                f"fake-{i:06d}", f"Player{i}", "BENCH", region, tool.region_to_cluster[region]
+            ))
+
+        latencies = []
+        monitor_start = time.time()
+
+        def on_game_start(player, game):
+            # 監視開始後に始まったゲームだけを検知遅延の対象にする
+            started = game.get('gameStartTime', 0) / 1000
+            if started >= monitor_start:
+                latencies.append(time.time() - started)
+
+        tool.on_game_start = on_game_start
+        calls_before = fetch_json(f"{base_url}/_stats")['total_calls']
+        cpu_before = time.process_time()
+
+        tool.start_monitoring()
+        time.sleep(args.duration)
+        tool.monitoring = False
+        tool.monitor_thread.join(timeout=30)
+
+        cpu = time.process_time() - cpu_before
+        server_stats = fetch_json(f"{base_url}/_stats")
+        sweep_stats = tool.get_sweep_stats()
+        tool.storage.flush()
+
+        api_calls = server_stats['total_calls'] - calls_before
+        latencies.sort()
+        return {
+            'players': players,
+            'duration': args.duration,
+            'sweeps': sweep_stats['sweeps'],
+            'avg_sweep': sweep_stats['avg_duration'],
+            'p95_sweep': sweep_stats['p95_duration'],
+            'api_calls': api_calls,
+            'detected_games': len(latencies),
+            'calls_per_detection': round(api_calls / len(latencies), 1) if latencies else None,
+            'avg_detection_latency': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p95_detection_latency': round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+            'cpu_seconds': round(cpu, 2),
+            'cpu_percent': round(cpu / args.duration * 100, 1),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'shared_saved_calls': tool.shared_games.get_stats()['saved_calls'],
+            'featured_share': tool.featured_games.get_stats()['detection_share']['featured']
+        }
+    finally:
+        server.kill()
+        server.wait()
+
+
+def format_row(result: dict) -> str:
+    def fmt(value, spec=''):
+        return '-' if value is None else format(value, spec)
+
+    return (f"{result['players']:>6} {result['sweeps']:>6} {fmt(result['avg_sweep'], '.3f'):>8} "
+            f"{fmt(result['p95_sweep'], '.3f'):>8} {result['api_calls']:>8} {result['detected_games']:>6} "
+            f"{fmt(result['calls_per_detection']):>8} {fmt(result['avg_detection_latency']):>8} "
+            f"{fmt(result['p95_detection_latency']):>8} {result['cpu_percent']:>6} {result['max_rss_mb']:>8} "
+            f"{result['featured_share']:>9}")
+
+
+def child_args(args) -> list:
+    """子プロセスに渡す計測条件"""
+    options = ['duration', 'interval', 'workers', 'lobby_size', 'game_seconds', 'idle_seconds',
+               'latency', 'jitter', 'not_found_rate', 'rate_limited_rate', 'featured_games', 'featured_refresh']
+    command = []
+    for option in options:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    if args.fixed:
+        command.append('--fixed')
+    if args.featured:
+        command.append('--featured')
+    if args.app_rate_limit:
+        command += ['--app-rate-limit', args.app_rate_limit]
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="監視ループの負荷ベンチマーク")
+    parser.add_argument('--players', default='10,100,1000,10000', help="カンマ区切りのプレイヤー数")
+    parser.add_argument('--duration', type=float, default=60, help="各計測の監視時間 (秒)")
+    parser.add_argument('--interval', type=float, default=2, help="MONITOR_INTERVAL (秒)")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--fixed', action='store_true', help="アダプティブではなく固定間隔で監視")
+    parser.add_argument('--lobby-size', type=int, default=1)
+    parser.add_argument('--game-seconds', type=float, default=30)
+    parser.add_argument('--idle-seconds', type=float, default=30)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--not-found-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limited-rate', type=float, default=0.0)
+    parser.add_argument('--app-rate-limit', default=None)
+    parser.add_argument('--featured', action='store_true', help="featured-games によるまとめて検出を有効化")
+    parser.add_argument('--featured-games', type=int, default=5, help="疑似サーバーの featured-games のゲーム数")
+    parser.add_argument('--featured-refresh', type=int, default=10, help="featured-games の更新間隔 (秒)")
+    parser.add_argument('--single', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        # 子プロセス: 1件分を計測して JSON を出力
+        print(json.dumps(run_single(args, args.single)))
+        return
+
+    print(f"{'人数':>6} {'sweeps':>6} {'avg_s':>8} {'p95_s':>8} {'calls':>8} {'検知':>6} "
+          f"{'calls/検知':>8} {'遅延avg':>8} {'遅延p95':>8} {'CPU%':>6} {'RSS_MB':>8} {'featured%':>9}")
+    for players in [int(n) for n in args.players.split(',')]:
+        # メモリ・CPU を人数ごとに分けて測るため1件ずつ別プロセスで実行
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--single', str(players)] + child_args(args),
+            capture_output=True, text=True
+        )
+        lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            print(f"{players:>6} 失敗: {completed.stderr.strip()[-500:]}")
+            continue
+        print(format_row(json.loads(lines[-1])), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""ゲームイベント書き込みのベンチマーク（接続毎回作成 vs GameStorage の一括書き込み）
+
+使い方: python benchmarks/storage_benchmark.py [イベント数]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import GameStorage
+
+INSERT_SQL = '''
+    INSERT INTO game_data 
+    (puuid, game_name, tag_line, game_id, game_start_time, participants)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+UPDATE_SQL = '''
+    UPDATE game_data 
+    SET game_end_time = ?, game_duration = ?
+    WHERE game_id = ? AND puuid = ?
+'''
+
+
+def make_events(count: int) -> list:
+    """開始/終了イベントを交互に生成"""
+    participants = json.dumps([{'puuid': f'p{i}', 'championId': i} for i in range(10)])
+    events = []
+    for i in range(count // 2):
+        puuid = f'player{i % 500}'
+        events.append((INSERT_SQL, (puuid, 'name', 'TAG', str(i), 1000 * i, participants)))
+        events.append((UPDATE_SQL, (1000 * i + 1800000, 1800000, str(i), puuid)))
+    return events
+
+
+def bench_connect_per_event(path: str, events: list) -> float:
+    """変更前: イベントごとに connect / commit / close（ロールバックジャーナル）"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+    start = time.perf_counter()
+    for sql, params in events:
+        conn = sqlite3.connect(path)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_game_storage(path: str, events: list) -> float:
+    """変更後: GameStorage のキューに積んで一括書き込み"""
+    storage = GameStorage(path)
+    start = time.perf_counter()
+    for sql, params in events:
+        storage.enqueue(sql, params)
+    storage.flush()
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    events = make_events(count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, bench in (("connect_per_event", bench_connect_per_event),
+                            ("game_storage", bench_game_storage)):
+            path = os.path.join(tmp, f"{name}.db")
+            setup = GameStorage(path)
+            setup.init_schema()
+            setup.close()
+            results[name] = bench(path, events)
+
+    print(f"イベント数: {len(events)}")
+    for name, elapsed in results.items():
+        print(f"{name:>18}: {elapsed:.3f}秒 ({len(events) / elapsed:,.0f} events/s)")
+    print(f"高速化: {results['connect_per_event'] / results['game_storage']:.1f}倍")
+
+
+if __name__ == "__main__":
+    main()
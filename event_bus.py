@@ -0,0 +1,173 @@
+"""監視デーモンと Web プロセスをつなぐイベントログ / コマンドキュー
+
+監視デーモン（monitor_daemon.py）はゲーム開始/終了や監視対象の変更を
+monitor_events に追記し、Web プロセスは EventSubscriber で末尾を追いかけて
+自分の表示用の状態と WebSocket に反映する。Web からの変更要求
+（プレイヤー追加など）は monitor_commands に積み、デーモンが処理する。
+どちらも同じ SQLite（WAL）上のテーブルなので追加のサーバーは不要。
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+CREATE_EVENT_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS monitor_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        type TEXT NOT NULL,
+        puuid TEXT,
+        payload TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_monitor_events_created_at ON monitor_events (created_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS monitor_commands (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        command TEXT NOT NULL,
+        payload TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        result TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_monitor_commands_pending ON monitor_commands (id) WHERE status = 'pending'",
+    '''
+    CREATE TABLE IF NOT EXISTS monitor_daemon_status (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        pid INTEGER,
+        heartbeat_at REAL,
+        monitoring INTEGER,
+        players INTEGER
+    )
+    ''',
+)
+
+# この時間を過ぎたハートビートのデーモンは停止しているとみなす（秒）
+DAEMON_STALE_SECONDS = 30
+
+
+class EventLog:
+    """追記専用のイベントログとコマンドキュー"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def publish(self, event_type: str, puuid: str = None, payload: dict = None):
+        """イベントを追記（即時書き込み: 購読側の遅延を書き込みキューの間隔に依存させない）"""
+        self.storage.execute(
+            'INSERT INTO monitor_events (created_at, type, puuid, payload) VALUES (?, ?, ?, ?)',
+            (time.time(), event_type, puuid, json.dumps(payload) if payload is not None else None)
+        )
+
+    def last_id(self) -> int:
+        rows = self.storage.query('SELECT COALESCE(MAX(id), 0) FROM monitor_events')
+        return rows[0][0]
+
+    def id_before(self, timestamp: float) -> int:
+        """指定時刻より前に書かれた最後のイベント ID"""
+        rows = self.storage.query('SELECT COALESCE(MAX(id), 0) FROM monitor_events WHERE created_at < ?',
+                                  (timestamp,))
+        return rows[0][0]
+
+    def read_since(self, last_id: int, limit: int = 500) -> List[dict]:
+        """指定 ID より後のイベントを古い順に取得"""
+        rows = self.storage.query('''
+            SELECT id, created_at, type, puuid, payload FROM monitor_events
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, limit))
+        return [
+            {'id': row[0], 'created_at': row[1], 'type': row[2], 'puuid': row[3],
+             'payload': json.loads(row[4]) if row[4] else None}
+            for row in rows
+        ]
+
+    def prune(self, max_age: float):
+        """古いイベントを削除"""
+        self.storage.enqueue('DELETE FROM monitor_events WHERE created_at < ?', (time.time() - max_age,))
+
+    def submit_command(self, command: str, payload: dict = None) -> int:
+        """デーモンへの変更要求を登録してコマンド ID を返す"""
+        with self.storage.write_lock:
+            cursor = self.storage.writer.execute(
+                'INSERT INTO monitor_commands (created_at, command, payload) VALUES (?, ?, ?)',
+                (time.time(), command, json.dumps(payload) if payload is not None else None)
+            )
+            self.storage.writer.commit()
+            return cursor.lastrowid
+
+    def pending_commands(self) -> List[dict]:
+        rows = self.storage.query(
+            "SELECT id, command, payload FROM monitor_commands WHERE status = 'pending' ORDER BY id"
+        )
+        return [{'id': row[0], 'command': row[1], 'payload': json.loads(row[2]) if row[2] else {}}
+                for row in rows]
+
+    def complete_command(self, command_id: int, success: bool, result: dict = None):
+        self.storage.execute(
+            'UPDATE monitor_commands SET status = ?, result = ? WHERE id = ?',
+            ('done' if success else 'failed', json.dumps(result) if result is not None else None, command_id)
+        )
+
+    def heartbeat(self, monitoring: bool, players: int):
+        """デーモンの生存と状態を記録"""
+        self.storage.enqueue('''
+            INSERT OR REPLACE INTO monitor_daemon_status (id, pid, heartbeat_at, monitoring, players)
+            VALUES (1, ?, ?, ?, ?)
+        ''', (os.getpid(), time.time(), int(monitoring), players))
+
+    def daemon_status(self) -> Optional[dict]:
+        rows = self.storage.query('SELECT pid, heartbeat_at, monitoring, players FROM monitor_daemon_status')
+        if not rows:
+            return None
+        pid, heartbeat_at, monitoring, players = rows[0]
+        return {
+            'pid': pid,
+            'alive': time.time() - heartbeat_at < DAEMON_STALE_SECONDS,
+            'heartbeat_age': round(time.time() - heartbeat_at, 1),
+            'monitoring': bool(monitoring),
+            'players': players
+        }
+
+
+class EventSubscriber:
+    """イベントログの末尾を追いかけてハンドラーに渡す（Web プロセス側）"""
+
+    def __init__(self, event_log: EventLog, handler: Callable[[dict], None],
+                 poll_interval: float = 0.25, start_after: int = None):
+        self.event_log = event_log
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.last_id = event_log.last_id() if start_after is None else start_after
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        while self.running:
+            try:
+                events = self.event_log.read_since(self.last_id)
+            except Exception as e:
+                print(f"イベント読み込みエラー: {e}")
+                events = []
+
+            for event in events:
+                try:
+                    self.handler(event)
+                except Exception as e:
+                    print(f"イベント処理エラー ({event['type']}): {e}")
+                self.last_id = event['id']
+
+            if not events:
+                time.sleep(self.poll_interval)
@@ -0,0 +1,126 @@
+"""featured-games による進行中ゲームのまとめて検出
+
+spectator-v4 の featured-games はリージョンごとに注目ゲームを数件まとめて返す。
+一定間隔でリージョン単位に取得し、参加者を監視対象の puuid と照合して
+見つかったプレイヤーはそのサイクルの個別ポーリングを省略する。
+
+一覧は clientRefreshInterval ごとにしか更新されないため、ゲーム開始の検出にだけ使い、
+終了の検出は従来どおり個別ポーリングで行う。終了済みのゲームが古い一覧に
+残っていても再び開始扱いにしないよう、終了したゲームの ID を覚えておく。
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from shared_games import participant_puuids
+
+# 検出元（個別ポーリング / featured-games / 同じゲームの監視対象）
+DETECTION_SOURCES = ('spectator', 'featured', 'shared')
+
+
+class FeaturedGameDiscovery:
+    """リージョンごとの featured-games の取得予定・照合・検出元の集計"""
+
+    def __init__(self, interval: float, enabled: bool = True):
+        self.interval = interval
+        self.enabled = enabled
+        self.next_fetch: Dict[str, float] = {}
+        self.fetched_at: Dict[str, float] = {}
+        # リージョン → {puuid: ゲーム情報}
+        self.by_puuid: Dict[str, Dict[str, dict]] = {}
+        self.ended_game_ids = set()
+        self.lock = threading.Lock()
+
+        # 統計
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.games_seen = 0
+        self.matched_players = 0
+        self.detections = dict.fromkeys(DETECTION_SOURCES, 0)
+
+    def due_regions(self, regions: Iterable[str], now: float = None) -> List[str]:
+        """取得時刻に達したリージョン"""
+        if not self.enabled:
+            return []
+        now = now or time.time()
+        with self.lock:
+            return [region for region in set(regions) if self.next_fetch.get(region, 0) <= now]
+
+    def update(self, region: str, featured: Optional[dict], now: float = None):
+        """取得結果を反映（失敗時は interval 後に再試行）"""
+        now = now or time.time()
+        with self.lock:
+            self.fetches += 1
+            if not featured:
+                self.fetch_errors += 1
+                self.next_fetch[region] = now + self.interval
+                return
+
+            games = featured.get('gameList', [])
+            self.games_seen += len(games)
+            index = {}
+            for game in games:
+                for puuid in participant_puuids(game):
+                    index[puuid] = game
+            self.by_puuid[region] = index
+            self.fetched_at[region] = now
+            # 一覧の更新間隔より頻繁に取得しても内容は変わらない
+            refresh = featured.get('clientRefreshInterval') or 0
+            self.next_fetch[region] = now + max(self.interval, refresh)
+
+            # どの一覧にも残っていないゲームの終了記録は不要
+            listed = {str(game.get('gameId')) for region_index in self.by_puuid.values()
+                      for game in region_index.values()}
+            self.ended_game_ids &= listed
+
+    def find(self, players: Iterable, now: float = None) -> Dict[str, dict]:
+        """featured-games に参加中の監視対象プレイヤー {puuid: ゲーム情報}"""
+        if not self.enabled:
+            return {}
+        now = now or time.time()
+        found = {}
+        with self.lock:
+            for player in players:
+                game = self.by_puuid.get(player['region'], {}).get(player['puuid'])
+                if game is None or str(game.get('gameId')) in self.ended_game_ids:
+                    continue
+                # gameLength は取得時点の値なので経過時間を足しておく
+                elapsed = int(now - self.fetched_at[player['region']])
+                found[player['puuid']] = dict(game, gameLength=(game.get('gameLength') or 0) + elapsed)
+            self.matched_players += len(found)
+        return found
+
+    def mark_ended(self, game_id):
+        """終了したゲームを古い一覧から再検出しないようにする"""
+        if self.enabled and game_id is not None:
+            with self.lock:
+                self.ended_game_ids.add(str(game_id))
+
+    def clear(self):
+        """取得済みの一覧を破棄（監視の停止時）"""
+        with self.lock:
+            self.next_fetch.clear()
+            self.fetched_at.clear()
+            self.by_puuid.clear()
+            self.ended_game_ids.clear()
+
+    def record_detection(self, source: str):
+        with self.lock:
+            self.detections[source] = self.detections.get(source, 0) + 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            total = sum(self.detections.values())
+            return {
+                'enabled': self.enabled,
+                'interval': self.interval,
+                'fetches': self.fetches,
+                'fetch_errors': self.fetch_errors,
+                'games_seen': self.games_seen,
+                'matched_players': self.matched_players,
+                'detections': dict(self.detections),
+                'detection_share': {
+                    source: round(count / total, 3) if total else 0.0
+                    for source, count in self.detections.items()
+                }
+            }
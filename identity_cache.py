@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+CREATE_CACHE_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS account_cache (
+        riot_id TEXT PRIMARY KEY,
+        puuid TEXT NOT NULL,
+        game_name TEXT,
+        tag_line TEXT,
+        cached_at INTEGER NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_account_cache_puuid ON account_cache (puuid)',
+    '''
+    CREATE TABLE IF NOT EXISTS summoner_cache (
+        puuid TEXT NOT NULL,
+        region TEXT NOT NULL,
+        data TEXT NOT NULL,
+        cached_at INTEGER NOT NULL,
+        PRIMARY KEY (puuid, region)
+    )
+    ''',
+)
+
+
+def riot_id_key(game_name: str, tag_line: str) -> str:
+    """Riot ID のキャッシュキー（大文字小文字は区別しない）"""
+    return f"{game_name.strip().lower()}#{tag_line.strip().lower()}"
+
+
+class IdentityCache:
+    """Riot ID → アカウント / PUUID → サモナー情報のキャッシュ
+
+    メモリ上の LRU を SQLite（account_cache / summoner_cache）の前段に置き、
+    どちらも TTL を過ぎたエントリは無効として API で取り直す。
+    """
+
+    def __init__(self, storage, account_ttl: int, summoner_ttl: int, max_entries: int = 5000):
+        self.storage = storage
+        self.account_ttl = account_ttl
+        self.summoner_ttl = summoner_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # 統計
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _memory_get(self, key: tuple, ttl: int) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, cached_at = entry
+            if time.time() - cached_at > ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+            return value
+
+    def _memory_put(self, key: tuple, value: dict, cached_at: float):
+        with self.lock:
+            self.entries[key] = (value, cached_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _memory_discard(self, key: tuple):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def get_account(self, game_name: str, tag_line: str) -> Optional[dict]:
+        """キャッシュからアカウント情報（puuid / gameName / tagLine）を取得"""
+        key = ('account', riot_id_key(game_name, tag_line))
+        account = self._memory_get(key, self.account_ttl)
+        if account is not None:
+            return account
+
+        rows = self.storage.query(
+            'SELECT puuid, game_name, tag_line, cached_at FROM account_cache WHERE riot_id = ? AND cached_at > ?',
+            (key[1], int(time.time() - self.account_ttl))
+        )
+        if not rows:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        puuid, cached_name, cached_tag, cached_at = rows[0]
+        account = {'puuid': puuid, 'gameName': cached_name, 'tagLine': cached_tag}
+        self._memory_put(key, account, cached_at)
+        with self.lock:
+            self.db_hits += 1
+        return account
+
+    def put_account(self, game_name: str, tag_line: str, account: dict):
+        """アカウント情報を保存（同じ puuid の古い Riot ID は無効化）"""
+        riot_id = riot_id_key(game_name, tag_line)
+        puuid = account['puuid']
+        now = int(time.time())
+
+        # Riot ID 変更の検知: 同じ puuid が別の Riot ID で登録されていれば削除
+        stale = self.storage.query(
+            'SELECT riot_id FROM account_cache WHERE puuid = ? AND riot_id != ?', (puuid, riot_id)
+        )
+        for (old_riot_id,) in stale:
+            self._memory_discard(('account', old_riot_id))
+        if stale:
+            self.storage.enqueue('DELETE FROM account_cache WHERE puuid = ? AND riot_id != ?',
+                                 (puuid, riot_id))
+
+        self._memory_put(('account', riot_id), account, now)
+        self.storage.enqueue('''
+            INSERT OR REPLACE INTO account_cache (riot_id, puuid, game_name, tag_line, cached_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (riot_id, puuid, account.get('gameName', game_name), account.get('tagLine', tag_line), now))
+
+    def invalidate_account(self, game_name: str, tag_line: str):
+        """Riot ID のキャッシュを削除"""
+        riot_id = riot_id_key(game_name, tag_line)
+        self._memory_discard(('account', riot_id))
+        self.storage.enqueue('DELETE FROM account_cache WHERE riot_id = ?', (riot_id,))
+
+    def get_summoner(self, puuid: str, region: str) -> Optional[dict]:
+        """キャッシュからサモナー情報を取得"""
+        key = ('summoner', puuid, region)
+        summoner = self._memory_get(key, self.summoner_ttl)
+        if summoner is not None:
+            return summoner
+
+        rows = self.storage.query(
+            'SELECT data, cached_at FROM summoner_cache WHERE puuid = ? AND region = ? AND cached_at > ?',
+            (puuid, region, int(time.time() - self.summoner_ttl))
+        )
+        if not rows:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        summoner = json.loads(rows[0][0])
+        self._memory_put(key, summoner, rows[0][1])
+        with self.lock:
+            self.db_hits += 1
+        return summoner
+
+    def put_summoner(self, puuid: str, region: str, summoner: dict):
+        """サモナー情報を保存"""
+        now = int(time.time())
+        self._memory_put(('summoner', puuid, region), summoner, now)
+        self.storage.enqueue('''
+            INSERT OR REPLACE INTO summoner_cache (puuid, region, data, cached_at)
+            VALUES (?, ?, ?, ?)
+        ''', (puuid, region, json.dumps(summoner), now))
+
+    def get_stats(self) -> dict:
+        """キャッシュのヒット/ミス数取得"""
+        with self.lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0
+            }
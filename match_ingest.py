@@ -0,0 +1,301 @@
+import heapq
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import rollups
+
+CREATE_INGEST_TABLES = (
+    'ALTER TABLE game_data ADD COLUMN match_id TEXT',
+    'ALTER TABLE game_data ADD COLUMN win INTEGER',
+    '''
+    CREATE TABLE IF NOT EXISTS match_results (
+        match_id TEXT PRIMARY KEY,
+        game_id INTEGER,
+        queue_id INTEGER,
+        game_version TEXT,
+        game_start_time INTEGER,
+        game_end_time INTEGER,
+        game_duration INTEGER,
+        winning_team INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS match_participant_stats (
+        match_id TEXT NOT NULL,
+        puuid TEXT NOT NULL,
+        champion_id INTEGER,
+        team_id INTEGER,
+        team_position TEXT,
+        win INTEGER,
+        kills INTEGER,
+        deaths INTEGER,
+        assists INTEGER,
+        total_damage INTEGER,
+        gold_earned INTEGER,
+        cs INTEGER,
+        vision_score INTEGER,
+        PRIMARY KEY (match_id, puuid)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_match_participant_stats_puuid ON match_participant_stats (puuid)',
+    # 再起動をまたいで再試行できるよう未処理のジョブを保持
+    '''
+    CREATE TABLE IF NOT EXISTS match_ingest_jobs (
+        match_id TEXT PRIMARY KEY,
+        cluster TEXT NOT NULL,
+        players TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL
+    )
+    ''',
+)
+
+MATCH_RESULT_SQL = '''
+    INSERT OR REPLACE INTO match_results
+    (match_id, game_id, queue_id, game_version, game_start_time, game_end_time, game_duration, winning_team)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+PARTICIPANT_STATS_SQL = '''
+    INSERT OR REPLACE INTO match_participant_stats
+    (match_id, puuid, champion_id, team_id, team_position, win, kills, deaths, assists,
+     total_damage, gold_earned, cs, vision_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+JOB_UPSERT_SQL = '''
+    INSERT OR REPLACE INTO match_ingest_jobs (match_id, cluster, players, attempts, next_attempt)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# 試合終了からマッチ情報が公開されるまでの待ち時間（秒）と再試行の上限
+FIRST_ATTEMPT_DELAY = 60
+MAX_RETRY_DELAY = 1800
+MAX_ATTEMPTS = 10
+
+
+def match_id_for(game_data: dict, region: str) -> str:
+    """スペクテイターのゲーム情報から match-v5 の matchId（例: KR_1234567890）を作る"""
+    platform = game_data.get('platformId') or region
+    return f"{platform.upper()}_{game_data.get('gameId')}"
+
+
+def match_duration_ms(info: dict) -> int:
+    """match-v5 の試合時間をミリ秒で返す（古いパッチの gameDuration はミリ秒）"""
+    duration = info.get('gameDuration', 0)
+    if 'gameEndTimestamp' not in info:
+        return duration
+    return duration * 1000
+
+
+def match_result_rows(match_id: str, match: dict):
+    """マッチ情報から match_results の1行と参加者成績の行を作る"""
+    info = match.get('info', {})
+    duration = match_duration_ms(info)
+    start = info.get('gameStartTimestamp') or info.get('gameCreation') or 0
+    end = info.get('gameEndTimestamp') or start + duration
+    winning_team = next((team.get('teamId') for team in info.get('teams', []) if team.get('win')), None)
+
+    result = (match_id, info.get('gameId'), info.get('queueId'), info.get('gameVersion'),
+              start, end, duration, winning_team)
+    participants = [
+        (match_id, p.get('puuid'), p.get('championId'), p.get('teamId'), p.get('teamPosition'),
+         int(bool(p.get('win'))), p.get('kills'), p.get('deaths'), p.get('assists'),
+         p.get('totalDamageDealtToChampions'), p.get('goldEarned'),
+         (p.get('totalMinionsKilled') or 0) + (p.get('neutralMinionsKilled') or 0),
+         p.get('visionScore'))
+        for p in info.get('participants', [])
+    ]
+    return result, participants
+
+
+class MatchIngestQueue:
+    """試合終了後のマッチ情報取り込みキュー
+
+    ゲーム終了を検知したら matchId ごとにジョブを1つ登録し（同じ試合の監視対象
+    プレイヤーは1つのジョブにまとめる）、マッチ情報が公開されるまで指数バックオフで
+    再試行する。取得できたら正確な試合時間・勝敗・参加者成績を保存し、
+    終了検知時の推定値で加算したロールアップを補正する。
+    """
+
+    def __init__(self, storage, fetch_match: Callable[[str, str], Optional[dict]]):
+        self.storage = storage
+        self.fetch_match = fetch_match
+        self.jobs: Dict[str, dict] = {}
+        self.heap = []
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # 統計
+        self.ingested = 0
+        self.retries = 0
+        self.deduplicated = 0
+        self.gave_up = 0
+
+    def restore(self) -> int:
+        """前回終了時に残っていたジョブを読み込む"""
+        rows = self.storage.query(
+            'SELECT match_id, cluster, players, attempts, next_attempt FROM match_ingest_jobs'
+        )
+        with self.condition:
+            for match_id, cluster, players, attempts, next_attempt in rows:
+                self.jobs[match_id] = {
+                    'match_id': match_id,
+                    'cluster': cluster,
+                    'players': json.loads(players),
+                    'attempts': attempts,
+                    'next_attempt': next_attempt
+                }
+                heapq.heappush(self.heap, (next_attempt, match_id))
+            self.condition.notify()
+        return len(rows)
+
+    def schedule(self, match_id: str, cluster: str, player: dict, game_id,
+                 estimated_end: int, estimated_duration: int):
+        """終了したゲームの取り込みを登録（同じ matchId のジョブがあればプレイヤーを追加）"""
+        entry = {
+            'puuid': player['puuid'],
+            'game_name': player['game_name'],
+            'tag_line': player['tag_line'],
+            'region': player.get('region'),
+            'game_id': game_id,
+            'estimated_end': estimated_end,
+            'estimated_duration': estimated_duration
+        }
+        with self.condition:
+            job = self.jobs.get(match_id)
+            if job:
+                job['players'][player['puuid']] = entry
+                self.deduplicated += 1
+            else:
+                job = {
+                    'match_id': match_id,
+                    'cluster': cluster,
+                    'players': {player['puuid']: entry},
+                    'attempts': 0,
+                    'next_attempt': time.time() + FIRST_ATTEMPT_DELAY
+                }
+                self.jobs[match_id] = job
+                heapq.heappush(self.heap, (job['next_attempt'], match_id))
+                self.condition.notify()
+            self._persist(job)
+
+    def _persist(self, job: dict):
+        self.storage.enqueue(JOB_UPSERT_SQL, (job['match_id'], job['cluster'], json.dumps(job['players']),
+                                              job['attempts'], job['next_attempt']))
+
+    def start(self):
+        """取り込みスレッドを開始"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """取り込みスレッドを停止（未処理のジョブはテーブルに残り、次回起動時に再開）"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _pop_due(self) -> Optional[dict]:
+        """実行時刻になったジョブを取り出す（なければ次の時刻まで待つ）"""
+        with self.condition:
+            while self.running:
+                if self.heap:
+                    due, match_id = self.heap[0]
+                    job = self.jobs.get(match_id)
+                    if job is None or job['next_attempt'] != due:
+                        heapq.heappop(self.heap)
+                        continue
+                    wait = due - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self.heap)
+                        return job
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+            return None
+
+    def _run(self):
+        while True:
+            job = self._pop_due()
+            if job is None:
+                return
+            try:
+                match = self.fetch_match(job['match_id'], job['cluster'])
+            except Exception as e:
+                print(f"マッチ取り込みエラー ({job['match_id']}): {e}")
+                match = None
+
+            if match:
+                self._ingest(job, match)
+            else:
+                self._retry_later(job)
+
+    def _retry_later(self, job: dict):
+        """まだ公開されていないマッチを指数バックオフで再登録"""
+        with self.condition:
+            job['attempts'] += 1
+            if job['attempts'] >= MAX_ATTEMPTS:
+                del self.jobs[job['match_id']]
+                self.gave_up += 1
+                print(f"マッチ情報を取得できませんでした: {job['match_id']}")
+                self.storage.enqueue('DELETE FROM match_ingest_jobs WHERE match_id = ?', (job['match_id'],))
+                return
+            delay = min(FIRST_ATTEMPT_DELAY * 2 ** job['attempts'], MAX_RETRY_DELAY)
+            job['next_attempt'] = time.time() + delay
+            heapq.heappush(self.heap, (job['next_attempt'], job['match_id']))
+            self.retries += 1
+            self._persist(job)
+
+    def _ingest(self, job: dict, match: dict):
+        """正確な試合結果を保存し、推定値で加算済みのロールアップを補正"""
+        match_id = job['match_id']
+        with self.condition:
+            # 取得中に同じ試合の別プレイヤーが追加されていても取りこぼさない
+            self.jobs.pop(match_id, None)
+            players = list(job['players'].values())
+
+        result, participants = match_result_rows(match_id, match)
+        game_end_time, game_duration = result[5], result[6]
+        wins = {row[1]: row[5] for row in participants}
+
+        self.storage.enqueue(MATCH_RESULT_SQL, result)
+        self.storage.enqueue_many(PARTICIPANT_STATS_SQL, participants)
+        for player in players:
+            self.storage.enqueue('''
+                UPDATE game_data
+                SET game_end_time = ?, game_duration = ?, match_id = ?, win = ?
+                WHERE game_id = ? AND puuid = ?
+            ''', (game_end_time, game_duration, match_id, wins.get(player['puuid']),
+                  player['game_id'], player['puuid']))
+            for sql, params in rollups.game_correction_statements(
+                    player, player['estimated_end'], player['estimated_duration'],
+                    game_end_time, game_duration):
+                self.storage.enqueue(sql, params)
+        self.storage.enqueue('DELETE FROM match_ingest_jobs WHERE match_id = ?', (match_id,))
+
+        with self.condition:
+            self.ingested += 1
+        print(f"📥 マッチ情報を取り込みました: {match_id} ({len(players)}人分)")
+
+    def pending(self) -> List[str]:
+        with self.condition:
+            return list(self.jobs)
+
+    def get_stats(self) -> dict:
+        """取り込みキューの統計取得"""
+        with self.condition:
+            return {
+                'pending': len(self.jobs),
+                'ingested': self.ingested,
+                'retries': self.retries,
+                'deduplicated': self.deduplicated,
+                'gave_up': self.gave_up
+            }
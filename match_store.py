@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+CREATE_MATCH_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS player_match_ids (
+        puuid TEXT NOT NULL,
+        match_id TEXT NOT NULL,
+        match_number INTEGER NOT NULL,
+        PRIMARY KEY (puuid, match_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_player_match_ids_recent ON player_match_ids (puuid, match_number)',
+    '''
+    CREATE TABLE IF NOT EXISTS player_match_sync (
+        puuid TEXT PRIMARY KEY,
+        refreshed_at INTEGER NOT NULL
+    )
+    ''',
+)
+
+
+def match_number(match_id: str) -> int:
+    """"KR_1234567890" の数値部分（同一リージョン内では新しいほど大きい）"""
+    try:
+        return int(match_id.rsplit('_', 1)[-1])
+    except ValueError:
+        return 0
+
+
+class MatchStore:
+    """マッチ情報のローカルストア
+
+    マッチ情報は確定後に変わらないため、matchId をキーに gzip 圧縮した JSON を
+    1ファイルずつ保存する（<root>/<リージョン>/<matchId>.json.gz）。
+    プレイヤーごとの matchId 一覧は SQLite（player_match_ids）に保持する。
+    """
+
+    def __init__(self, root_dir: str, storage):
+        self.root_dir = root_dir
+        self.storage = storage
+        os.makedirs(root_dir, exist_ok=True)
+
+        # 統計
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+
+    def _path(self, match_id: str) -> str:
+        region = match_id.split('_', 1)[0] if '_' in match_id else 'unknown'
+        return os.path.join(self.root_dir, region, f"{match_id}.json.gz")
+
+    def has(self, match_id: str) -> bool:
+        return os.path.exists(self._path(match_id))
+
+    def load(self, match_id: str) -> Optional[dict]:
+        """保存済みのマッチ情報を読み込む（無ければ None）"""
+        try:
+            with gzip.open(self._path(match_id), 'rt', encoding='utf-8') as f:
+                match = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"マッチ情報読み込みエラー ({match_id}): {e}")
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return match
+
+    def save(self, match_id: str, match: dict):
+        """マッチ情報を保存（一時ファイルに書いてから置き換える）"""
+        path = self._path(match_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(match, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.stored += 1
+
+    def missing(self, match_ids: Iterable[str]) -> List[str]:
+        """未保存の matchId だけを返す"""
+        return [match_id for match_id in match_ids if not self.has(match_id)]
+
+    def record_match_ids(self, puuid: str, match_ids: List[str], refreshed: bool = True):
+        """プレイヤーの matchId 一覧を記録"""
+        self.storage.enqueue_many(
+            'INSERT OR IGNORE INTO player_match_ids (puuid, match_id, match_number) VALUES (?, ?, ?)',
+            [(puuid, match_id, match_number(match_id)) for match_id in match_ids]
+        )
+        if refreshed:
+            self.storage.enqueue(
+                'INSERT OR REPLACE INTO player_match_sync (puuid, refreshed_at) VALUES (?, ?)',
+                (puuid, int(time.time()))
+            )
+
+    def recent_match_ids(self, puuid: str, count: int, max_age: int) -> Optional[List[str]]:
+        """max_age 秒以内に取得済みなら保存済みの最新 matchId 一覧を返す（古ければ None）"""
+        rows = self.storage.query(
+            'SELECT refreshed_at FROM player_match_sync WHERE puuid = ?', (puuid,)
+        )
+        if not rows or time.time() - rows[0][0] > max_age:
+            return None
+
+        rows = self.storage.query('''
+            SELECT match_id FROM player_match_ids
+            WHERE puuid = ? ORDER BY match_number DESC LIMIT ?
+        ''', (puuid, count))
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> dict:
+        """マッチストアの統計取得"""
+        with self.lock:
+            return {'hits': self.hits, 'stored': self.stored}
@@ -0,0 +1,183 @@
+"""Prometheus テキスト形式のメトリクス
+
+ホットパスでは observe / inc がロック1回と数値の加算だけで済むようにし、
+バケットの累積やテキスト化は /metrics の取得時にだけ行う。
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DETECTION_BUCKETS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    """単調増加カウンター"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """固定バケットのヒストグラム（バケットごとの件数は累積せずに保持）"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # [バケットごとの件数..., +Inf, 合計]
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                label_text = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """取得時にコールバックで値を読むゲージ（{ラベル値のタプル: 値} か数値を返す）"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception:
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """メトリクスの登録とテキスト形式での出力"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric, replace: bool = False):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None and not replace:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable,
+              labelnames: Iterable[str] = ()) -> Gauge:
+        """コールバックゲージを登録（同名のものは置き換える: ツールの再作成に対応）"""
+        return self._register(Gauge(name, documentation, callback, labelnames), replace=True)
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Riot API クライアント
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    'riot_api_request_seconds', 'Riot API request latency', ('host', 'method'))
+API_RESPONSES = REGISTRY.counter(
+    'riot_api_responses_total', 'Riot API responses by status code', ('host', 'method', 'status'))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.counter(
+    'riot_api_rate_limit_wait_seconds_total', 'Time spent waiting for rate limit slots', ('host',))
+API_COALESCED = REGISTRY.counter(
+    'riot_api_coalesced_requests_total', 'API calls served by an identical in-flight call', ('method',))
+
+# 監視ループ
+SWEEP_SECONDS = REGISTRY.histogram(
+    'spectator_sweep_seconds', 'Duration of one polling sweep')
+DETECTION_SECONDS = REGISTRY.histogram(
+    'spectator_game_detection_seconds', 'Time from game start to detection', buckets=DETECTION_BUCKETS)
+GAME_DETECTIONS = REGISTRY.counter(
+    'spectator_game_detections_total', 'Game starts detected by source', ('source',))
+
+# ストレージ
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'storage_write_batch_seconds', 'Latency of one write-behind batch transaction')
+DB_WRITE_EVENTS = REGISTRY.counter(
+    'storage_written_events_total', 'Events written by the write-behind queue')
+
+# WebSocket
+SOCKETIO_EMITS = REGISTRY.counter(
+    'socketio_emits_total', 'Socket.IO messages emitted', ('event',))
+
+# HTTP API
+RESPONSE_CACHE = REGISTRY.counter(
+    'http_response_cache_total', 'Dashboard API response cache lookups by result', ('result',))
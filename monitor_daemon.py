@@ -0,0 +1,168 @@
+"""監視デーモン（Web サーバーとは別プロセスで監視ループを実行）
+
+ゲーム開始/終了・監視対象の変更をイベントログ（monitor_events）に追記し、
+Web サーバー（config.py の MONITOR_MODE = "daemon"）はそれを購読して表示だけを行う。
+プレイヤー追加などの変更要求は Web サーバーが monitor_commands に積み、ここで処理する。
+
+使い方: python monitor_daemon.py
+"""
+import signal
+import threading
+import time
+
+from active_games import ActiveGame
+from event_bus import EventLog
+from riot_api_tool import RiotAPISpectatorTool
+
+# コマンドを確認する間隔・ハートビート間隔・イベントの保持期間（秒）
+COMMAND_POLL_INTERVAL = 0.25
+HEARTBEAT_INTERVAL = 5
+EVENT_RETENTION = 7 * 24 * 3600
+
+
+class MonitorDaemon:
+    """監視ループとコマンド処理"""
+
+    def __init__(self, tool: RiotAPISpectatorTool):
+        self.tool = tool
+        self.events = EventLog(tool.storage)
+        self.running = False
+        # 監視を開始する指示を受けているか（監視対象 0 人の間も保持、停止の指示は再起動後も引き継ぐ）
+        self.wants_monitoring = tool.monitoring_enabled(default=True)
+        # 一括追加のスレッドが終わった後、監視の開始判定をメインループで行う
+        self.sync_requested = threading.Event()
+
+        tool.set_game_callbacks(
+            # 参加者などの元データは games テーブルにあるので、イベントには要約だけを載せる
+            on_game_start=lambda player, game: self.events.publish(
+                'game_started', player['puuid'], {'game': ActiveGame.from_payload(game).to_dict()}),
+            on_game_end=lambda player: self.events.publish('game_ended', player['puuid'])
+        )
+
+    def run(self):
+        self.running = True
+        self._sync_monitoring()
+        last_heartbeat = 0
+        last_prune = time.time()
+
+        while self.running:
+            for command in self.events.pending_commands():
+                self._handle_command(command)
+            if self.sync_requested.is_set():
+                self.sync_requested.clear()
+                self._sync_monitoring()
+
+            now = time.time()
+            if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                self.events.heartbeat(self.tool.monitoring, len(self.tool.monitored_players))
+                last_heartbeat = now
+            if now - last_prune >= 3600:
+                self.events.prune(EVENT_RETENTION)
+                last_prune = now
+
+            time.sleep(COMMAND_POLL_INTERVAL)
+
+        if self.tool.monitoring:
+            # 次回の起動で監視を再開する
+            self.tool.stop_monitoring(persist=False)
+        self.events.publish('monitoring', payload={'monitoring': False})
+        self.tool.storage.flush()
+
+    def stop(self, *args):
+        self.running = False
+
+    def _sync_monitoring(self):
+        """監視の指示と実際の状態を揃える"""
+        tool = self.tool
+        if self.wants_monitoring and not tool.monitoring and tool.monitored_players:
+            tool.start_monitoring()
+            self.events.publish('monitoring', payload={'monitoring': True})
+        elif not self.wants_monitoring and tool.monitoring:
+            tool.stop_monitoring()
+            self.events.publish('monitoring', payload={'monitoring': False})
+
+    def _handle_command(self, command: dict):
+        handler = getattr(self, f"_command_{command['command']}", None)
+        if handler is None:
+            self.events.complete_command(command['id'], False, {'error': '不明なコマンドです'})
+            return
+        try:
+            success, result = handler(command['payload'])
+        except Exception as e:
+            success, result = False, {'error': str(e)}
+        self.events.complete_command(command['id'], success, result)
+        self.events.publish('command_result', payload={
+            'command_id': command['id'], 'command': command['command'], 'success': success, 'result': result
+        })
+
+    def _publish_added(self, game_name: str, tag_line: str):
+        player = self.tool.monitored_players.find(game_name, tag_line)
+        if player is not None:
+            self.events.publish('player_added', player.puuid, {'player': player.to_dict()})
+
+    def _command_add_player(self, payload: dict):
+        tool = self.tool
+        region = payload['region']
+        cluster = tool.region_to_cluster.get(region, 'asia')
+        if not tool.add_player_to_monitor(payload['game_name'], payload['tag_line'], region, cluster):
+            return False, {'error': 'プレイヤーの追加に失敗しました。名前やタグライン、地域を確認してください。'}
+        self._publish_added(payload['game_name'], payload['tag_line'])
+        self._sync_monitoring()
+        return True, {'message': f"プレイヤー {payload['game_name']}#{payload['tag_line']} を追加しました"}
+
+    def _command_bulk_add_players(self, payload: dict):
+        job_id = payload.get('job_id')
+
+        def on_progress(progress):
+            progress['job_id'] = job_id
+            self.events.publish('bulk_import_progress', payload=progress)
+            if progress['status'] == 'added':
+                self._publish_added(progress['game_name'], progress['tag_line'])
+                # 最初の1人が追加された時点で監視を始める
+                self.sync_requested.set()
+
+        def run():
+            try:
+                summary = self.tool.bulk_add_players(entries, on_progress)
+                self.events.publish('bulk_import_done', payload={'job_id': job_id, 'success': True,
+                                                                 'summary': summary})
+            except Exception as e:
+                self.events.publish('bulk_import_done', payload={'job_id': job_id, 'success': False,
+                                                                 'error': str(e)})
+            self.sync_requested.set()
+
+        # レート制限に従うと数分かかるため、ハートビートと他のコマンドの処理を止めないよう別スレッドで実行
+        entries = [tuple(entry) for entry in payload['entries']]
+        threading.Thread(target=run, daemon=True, name=f"bulk-import-{job_id}").start()
+        return True, {'job_id': job_id, 'total': len(entries)}
+
+    def _command_remove_player(self, payload: dict):
+        player = self.tool.monitored_players.find(payload['game_name'], payload['tag_line'])
+        if player is None or not self.tool.remove_player_from_monitor(payload['game_name'], payload['tag_line']):
+            return False, {'error': 'プレイヤーが見つかりません'}
+        self.events.publish('player_removed', player.puuid)
+        return True, {'puuid': player.puuid}
+
+    def _command_start_monitoring(self, payload: dict):
+        self.wants_monitoring = True
+        self._sync_monitoring()
+        return True, {'monitoring': self.tool.monitoring}
+
+    def _command_stop_monitoring(self, payload: dict):
+        self.wants_monitoring = False
+        self._sync_monitoring()
+        return True, {'monitoring': False}
+
+
+def main():
+    tool = RiotAPISpectatorTool()
+    daemon = MonitorDaemon(tool)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    print(f"監視デーモンを開始しました ({len(tool.monitored_players)} 人)")
+    daemon.run()
+    print("監視デーモンを停止しました")
+
+
+if __name__ == "__main__":
+    main()
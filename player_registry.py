@@ -0,0 +1,113 @@
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+
+def riot_id_index_key(game_name: str, tag_line: str) -> Tuple[str, str]:
+    """Riot ID インデックスのキー（大文字小文字は区別しない）"""
+    return game_name.strip().lower(), tag_line.strip().lower()
+
+
+class PlayerRecord:
+    """監視対象プレイヤー1人分の情報
+
+    既存コードとの互換のため player['puuid'] / player.get('region') の形でも参照できる。
+    """
+
+    __slots__ = ('puuid', 'game_name', 'tag_line', 'region', 'cluster',
+                 'summoner_id', 'summoner_name', 'summoner_level')
+
+    def __init__(self, puuid: str, game_name: str, tag_line: str, region: str, cluster: str,
+                 summoner_id: str = None, summoner_name: str = None, summoner_level: int = None):
+        self.puuid = puuid
+        self.game_name = game_name
+        self.tag_line = tag_line
+        self.region = region
+        self.cluster = cluster
+        self.summoner_id = summoner_id
+        self.summoner_name = summoner_name
+        self.summoner_level = summoner_level
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"PlayerRecord({self.game_name}#{self.tag_line}, {self.region})"
+
+
+class PlayerRegistry:
+    """puuid と Riot ID の両方で O(1) 参照できる監視対象プレイヤー一覧
+
+    反復はスナップショット（タプル）に対して行うため、監視スレッドの
+    for player in registry 中に別スレッドから追加/削除しても競合しない。
+    スナップショットは変更後の最初の反復時にだけ作り直す。
+    """
+
+    def __init__(self):
+        self._by_puuid: Dict[str, PlayerRecord] = {}
+        self._by_riot_id: Dict[Tuple[str, str], PlayerRecord] = {}
+        self._snapshot: Optional[Tuple[PlayerRecord, ...]] = ()
+        self.lock = threading.Lock()
+
+    def add(self, player: PlayerRecord) -> bool:
+        """プレイヤーを追加（同じ puuid が登録済みなら False）"""
+        with self.lock:
+            if player.puuid in self._by_puuid:
+                return False
+            self._by_puuid[player.puuid] = player
+            self._by_riot_id[riot_id_index_key(player.game_name, player.tag_line)] = player
+            self._snapshot = None
+            return True
+
+    def remove(self, puuid: str) -> Optional[PlayerRecord]:
+        """puuid でプレイヤーを削除"""
+        with self.lock:
+            player = self._by_puuid.pop(puuid, None)
+            if player is None:
+                return None
+            key = riot_id_index_key(player.game_name, player.tag_line)
+            if self._by_riot_id.get(key) is player:
+                del self._by_riot_id[key]
+            self._snapshot = None
+            return player
+
+    def remove_by_riot_id(self, game_name: str, tag_line: str) -> Optional[PlayerRecord]:
+        """Riot ID でプレイヤーを削除"""
+        player = self.find(game_name, tag_line)
+        if player is None:
+            return None
+        return self.remove(player.puuid)
+
+    def get(self, puuid: str) -> Optional[PlayerRecord]:
+        return self._by_puuid.get(puuid)
+
+    def find(self, game_name: str, tag_line: str) -> Optional[PlayerRecord]:
+        """Riot ID でプレイヤーを検索"""
+        return self._by_riot_id.get(riot_id_index_key(game_name, tag_line))
+
+    def snapshot(self) -> Tuple[PlayerRecord, ...]:
+        """現時点のプレイヤー一覧（不変タプル）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock:
+                if self._snapshot is None:
+                    self._snapshot = tuple(self._by_puuid.values())
+                snapshot = self._snapshot
+        return snapshot
+
+    def __contains__(self, puuid: str) -> bool:
+        return puuid in self._by_puuid
+
+    def __iter__(self) -> Iterator[PlayerRecord]:
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self._by_puuid)
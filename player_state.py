@@ -0,0 +1,52 @@
+import threading
+from collections import deque
+from typing import List, Optional
+
+
+class PlayerStateLog:
+    """WebSocket 配信用のバージョン付き差分ログ
+
+    プレイヤー1人分の変更（upsert / remove）や監視状態の変更ごとに
+    バージョン番号を1つ進めて差分を記録する。クライアントは受け取った
+    差分のバージョンが連番でなければ、最後に適用したバージョンから再同期する。
+    保持しきれないほど古いバージョンからの再同期は全体スナップショットで行う。
+    """
+
+    def __init__(self, max_deltas: int = 1000):
+        self.version = 0
+        self.deltas = deque(maxlen=max_deltas)
+        self.lock = threading.Lock()
+
+    def _append(self, delta: dict) -> dict:
+        with self.lock:
+            self.version += 1
+            delta['version'] = self.version
+            self.deltas.append(delta)
+            return delta
+
+    def upsert(self, player: dict, event: str = None) -> dict:
+        """プレイヤーの追加・状態変更を記録"""
+        delta = {'op': 'upsert', 'player': player}
+        if event:
+            delta['event'] = event
+        return self._append(delta)
+
+    def remove(self, puuid: str) -> dict:
+        """プレイヤーの削除を記録"""
+        return self._append({'op': 'remove', 'puuid': puuid})
+
+    def monitoring(self, monitoring: bool) -> dict:
+        """監視の開始/停止を記録"""
+        return self._append({'op': 'monitoring', 'monitoring': monitoring})
+
+    def since(self, version: int) -> Optional[List[dict]]:
+        """指定バージョンより後の差分（保持範囲外なら None = 全体の再取得が必要）"""
+        with self.lock:
+            if version > self.version:
+                return None
+            if version == self.version:
+                return []
+            oldest = self.deltas[0]['version'] if self.deltas else self.version + 1
+            if version + 1 < oldest:
+                return None
+            return [delta for delta in self.deltas if delta['version'] > version]
@@ -0,0 +1,194 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# 過去の平均が無い場合の想定ゲーム時間（秒）
+DEFAULT_GAME_DURATION = 30 * 60
+# 活動時間帯の判定に使う履歴の期間（日）
+ACTIVITY_HISTORY_DAYS = 30
+# この時間帯の開始割合がこれ以上なら「よくプレイする時間帯」とみなす
+ACTIVE_HOUR_RATIO = 0.08
+
+
+class PlayerPollState:
+    """1プレイヤー分のポーリング状態"""
+
+    __slots__ = ('puuid', 'next_poll', 'idle_streak', 'in_game', 'predicted_end')
+
+    def __init__(self, puuid: str, next_poll: float):
+        self.puuid = puuid
+        self.next_poll = next_poll
+        self.idle_streak = 0
+        self.in_game = False
+        self.predicted_end = None
+
+
+class PollScheduler:
+    """プレイヤーごとに次回ポーリング時刻を決める優先度キュー型スケジューラ
+
+    - ゲーム中: gameLength から終了時刻を予測し、終了間際から短い間隔でポーリング
+    - よくプレイする時間帯: 短い間隔を維持
+    - 待機中: 指数バックオフで間隔を延ばす（最大 max_interval）
+    """
+
+    def __init__(self, base_interval: float, max_interval: float):
+        self.base_interval = base_interval
+        self.max_interval = max(base_interval, max_interval)
+        self.states: Dict[str, PlayerPollState] = {}
+        self.heap: List[tuple] = []
+        self.lock = threading.Lock()
+
+        # 履歴から作る活動プロファイル
+        self.hour_ratios: Dict[str, List[float]] = {}
+        self.avg_durations: Dict[str, float] = {}
+        self.history_loaded_at = 0.0
+
+        # 統計
+        self.polls = 0
+        self.retries = 0
+
+    def load_history(self, storage):
+        """game_data の履歴から時間帯別の活動割合と平均ゲーム時間を読み込む"""
+        since = int((time.time() - ACTIVITY_HISTORY_DAYS * 86400) * 1000)
+        hour_counts: Dict[str, List[int]] = {}
+        avg_durations = {}
+
+        try:
+            rows = storage.query('SELECT puuid, game_start_time FROM game_data WHERE game_start_time > ?',
+                                 (since,))
+            for puuid, game_start_time in rows:
+                hour = datetime.fromtimestamp(game_start_time / 1000).hour
+                hour_counts.setdefault(puuid, [0] * 24)[hour] += 1
+
+            rows = storage.query('''
+                SELECT puuid, AVG(game_duration) FROM game_data
+                WHERE game_duration IS NOT NULL AND game_duration > 0
+                GROUP BY puuid
+            ''')
+            for puuid, avg_duration in rows:
+                avg_durations[puuid] = avg_duration / 1000
+        except Exception as e:
+            print(f"ポーリング履歴読み込みエラー: {e}")
+            return
+
+        with self.lock:
+            self.hour_ratios = {
+                puuid: [count / sum(counts) for count in counts]
+                for puuid, counts in hour_counts.items()
+            }
+            self.avg_durations = avg_durations
+            self.history_loaded_at = time.time()
+
+    def is_active_hour(self, puuid: str, now: float) -> bool:
+        """現在がそのプレイヤーのよくプレイする時間帯か"""
+        ratios = self.hour_ratios.get(puuid)
+        if not ratios:
+            return False
+        return ratios[datetime.fromtimestamp(now).hour] >= ACTIVE_HOUR_RATIO
+
+    def _push(self, state: PlayerPollState):
+        heapq.heappush(self.heap, (state.next_poll, state.puuid))
+
+    def sync(self, puuids: Iterable[str], now: float = None):
+        """監視対象の増減を反映（新規プレイヤーは即時ポーリング）"""
+        now = now or time.time()
+        puuids = set(puuids)
+        with self.lock:
+            for puuid in list(self.states):
+                if puuid not in puuids:
+                    del self.states[puuid]
+            for puuid in puuids:
+                if puuid not in self.states:
+                    state = self.states[puuid] = PlayerPollState(puuid, now)
+                    self._push(state)
+
+    def pop_due(self, now: float = None) -> List[str]:
+        """ポーリング時刻に達したプレイヤーを取り出す"""
+        now = now or time.time()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                next_poll, puuid = heapq.heappop(self.heap)
+                state = self.states.get(puuid)
+                # 削除済み・再スケジュール済みの古いエントリは捨てる
+                if state is None or state.next_poll != next_poll:
+                    continue
+                due.append(puuid)
+            self.polls += len(due)
+        return due
+
+    def next_due_in(self, now: float = None) -> Optional[float]:
+        """次のポーリングまでの秒数（対象がいなければ None）"""
+        now = now or time.time()
+        with self.lock:
+            while self.heap:
+                next_poll, puuid = self.heap[0]
+                state = self.states.get(puuid)
+                if state is not None and state.next_poll == next_poll:
+                    return max(0.0, next_poll - now)
+                heapq.heappop(self.heap)
+        return None
+
+    def reschedule(self, puuid: str, current_game: Optional[dict], now: float = None):
+        """ポーリング結果から次回ポーリング時刻を決める"""
+        now = now or time.time()
+        with self.lock:
+            state = self.states.get(puuid)
+            if state is None:
+                return
+
+            if current_game:
+                state.idle_streak = 0
+                state.in_game = True
+                expected = self.avg_durations.get(puuid, DEFAULT_GAME_DURATION)
+                game_length = max(0, current_game.get('gameLength', 0) or 0)
+                state.predicted_end = now + max(0, expected - game_length)
+                # 予測終了時刻の少し前までは間隔を空け、その後は base_interval で終了を検知
+                interval = min(self.max_interval,
+                               max(self.base_interval, state.predicted_end - now - self.base_interval))
+            elif state.in_game:
+                # ゲーム終了直後は連戦の可能性が高いので短い間隔を維持
+                state.in_game = False
+                state.predicted_end = None
+                interval = self.base_interval
+            else:
+                state.idle_streak += 1
+                if self.is_active_hour(puuid, now):
+                    interval = self.base_interval
+                else:
+                    interval = min(self.max_interval, self.base_interval * (2 ** min(state.idle_streak, 16)))
+
+            state.next_poll = now + interval
+            self._push(state)
+
+    def retry_later(self, puuid: str, delay: float = None, now: float = None):
+        """ポーリング失敗時に状態を変えず base_interval 後（Retry-After がより長ければその後）に再試行"""
+        now = now or time.time()
+        with self.lock:
+            state = self.states.get(puuid)
+            if state is None:
+                return
+            self.retries += 1
+            state.next_poll = now + max(self.base_interval, delay or 0)
+            self._push(state)
+
+    def get_stats(self) -> dict:
+        """スケジューラの統計取得"""
+        now = time.time()
+        with self.lock:
+            states = list(self.states.values())
+        in_game = sum(1 for state in states if state.in_game)
+        hot = sum(1 for state in states
+                  if state.in_game or self.is_active_hour(state.puuid, now))
+        return {
+            'players': len(states),
+            'in_game': in_game,
+            'hot_players': hot,
+            'polls': self.polls,
+            'retries': self.retries,
+            'avg_seconds_to_next_poll': round(
+                sum(max(0.0, state.next_poll - now) for state in states) / len(states), 1
+            ) if states else 0
+        }
@@ -0,0 +1,213 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Retry-After ヘッダーが無い 429 の場合の待機秒数
+DEFAULT_RETRY_AFTER = 10
+
+
+def parse_rate_limit_header(value: Optional[str]) -> List[Tuple[int, int]]:
+    """"20:1,100:120" 形式のヘッダーを [(回数, 秒数), ...] に変換"""
+    limits = []
+    if not value:
+        return limits
+
+    for part in value.split(','):
+        try:
+            count, seconds = part.strip().split(':')
+            limits.append((int(count), int(seconds)))
+        except ValueError:
+            continue
+    return limits
+
+
+class RateWindow:
+    """1つの制限ウィンドウ（例: 100回/120秒）を deque で管理"""
+
+    __slots__ = ('limit', 'seconds', 'calls')
+
+    def __init__(self, limit: int, seconds: int, calls: deque = None):
+        self.limit = limit
+        self.seconds = seconds
+        self.calls = calls if calls is not None else deque()
+
+    def expire(self, now: float):
+        """ウィンドウ外の記録を先頭から削除（償却 O(1)）"""
+        calls = self.calls
+        while calls and now - calls[0] >= self.seconds:
+            calls.popleft()
+
+    def used(self, now: float) -> int:
+        """現在のウィンドウ内の呼び出し数"""
+        self.expire(now)
+        return len(self.calls)
+
+    def wait_time(self, now: float) -> float:
+        """次の呼び出しまでに必要な待機秒数"""
+        if self.used(now) < self.limit:
+            return 0.0
+        return self.seconds - (now - self.calls[len(self.calls) - self.limit])
+
+    def sync_count(self, count: int, now: float):
+        """サーバー側のカウントがローカルより多ければ記録を補完"""
+        for _ in range(count - self.used(now)):
+            self.calls.append(now)
+
+
+class RateBucket:
+    """1つのバケット（ホスト単位のアプリ制限、またはホスト+メソッド単位の制限）"""
+
+    def __init__(self, limits: List[Tuple[int, int]] = None):
+        self.windows = [RateWindow(limit, seconds) for limit, seconds in (limits or [])]
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        wait = max(0.0, self.blocked_until - now)
+        for window in self.windows:
+            wait = max(wait, window.wait_time(now))
+        return wait
+
+    def record(self, now: float):
+        for window in self.windows:
+            window.calls.append(now)
+
+    def set_limits(self, limits: List[Tuple[int, int]]):
+        """ヘッダーから得た制限でウィンドウを更新（既存の記録は引き継ぐ）"""
+        current = {window.seconds: window for window in self.windows}
+        if sorted((w.limit, w.seconds) for w in self.windows) == sorted(limits):
+            return
+
+        self.windows = [
+            RateWindow(limit, seconds, current[seconds].calls if seconds in current else None)
+            for limit, seconds in limits
+        ]
+
+    def sync_counts(self, counts: List[Tuple[int, int]], now: float):
+        by_seconds = {seconds: count for count, seconds in counts}
+        for window in self.windows:
+            if window.seconds in by_seconds:
+                window.sync_count(by_seconds[window.seconds], now)
+
+
+class RateLimiter:
+    """ルーティングホスト別・メソッド別のマルチバケットレート制限（スレッドセーフ）
+
+    share は同じ API キーを複数プロセスで共有する場合のこのプロセスの取り分（0 < share <= 1）。
+    既定の制限もヘッダーから学習した制限・カウントもこの割合に縮めて扱う。
+    """
+
+    def __init__(self, default_app_limits: List[Tuple[int, int]] = None, share: float = 1.0):
+        self.share = share
+        self.default_app_limits = self._scale(default_app_limits or [])
+        self.app_buckets: Dict[str, RateBucket] = {}
+        self.method_buckets: Dict[Tuple[str, str], RateBucket] = {}
+        self.lock = threading.Lock()
+
+        # 統計
+        self.total_wait = 0.0
+        self.throttled_calls = 0
+        self.rate_limited_responses = 0
+
+    @staticmethod
+    def method_key(url: str) -> str:
+        """URL からメソッドキーを推定（可変部分を除いたパスの先頭4セグメント）"""
+        segments = [segment for segment in urlparse(url).path.split('/') if segment]
+        return '/' + '/'.join(segments[:4])
+
+    def _scale(self, pairs: List[Tuple[int, int]], round_up: bool = False) -> List[Tuple[int, int]]:
+        """(回数, 秒数) の回数を取り分に縮める（カウントは多めに見積もるため切り上げ）"""
+        if self.share >= 1:
+            return pairs
+        if round_up:
+            return [(math.ceil(count * self.share), seconds) for count, seconds in pairs]
+        return [(max(1, int(count * self.share)), seconds) for count, seconds in pairs]
+
+    def _buckets(self, host: str, method: str) -> Tuple[RateBucket, RateBucket]:
+        app_bucket = self.app_buckets.get(host)
+        if app_bucket is None:
+            app_bucket = self.app_buckets[host] = RateBucket(self.default_app_limits)
+
+        method_bucket = self.method_buckets.get((host, method))
+        if method_bucket is None:
+            method_bucket = self.method_buckets[(host, method)] = RateBucket()
+        return app_bucket, method_bucket
+
+    def acquire(self, host: str, method: str) -> float:
+        """呼び出し枠を確保（必要ならロック外で待機）し、待機した秒数を返す"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                app_bucket, method_bucket = self._buckets(host, method)
+                wait = max(app_bucket.wait_time(now), method_bucket.wait_time(now))
+                if wait <= 0:
+                    app_bucket.record(now)
+                    method_bucket.record(now)
+                    if waited:
+                        self.total_wait += waited
+                        self.throttled_calls += 1
+                    return waited
+
+            if not waited:
+                print(f"レート制限に達しました ({host} {method})。{wait:.1f}秒待機...")
+            time.sleep(wait)
+            waited += wait
+
+    def update_from_headers(self, host: str, method: str, headers):
+        """X-App-Rate-Limit / X-Method-Rate-Limit ヘッダーから制限を学習"""
+        app_limits = self._scale(parse_rate_limit_header(headers.get('X-App-Rate-Limit')))
+        method_limits = self._scale(parse_rate_limit_header(headers.get('X-Method-Rate-Limit')))
+        if not app_limits and not method_limits:
+            return
+
+        # ヘッダーの値は API キー全体のものなので、制限と同じく取り分に縮める
+        app_counts = self._scale(parse_rate_limit_header(headers.get('X-App-Rate-Limit-Count')), True)
+        method_counts = self._scale(parse_rate_limit_header(headers.get('X-Method-Rate-Limit-Count')), True)
+
+        with self.lock:
+            now = time.time()
+            app_bucket, method_bucket = self._buckets(host, method)
+            if app_limits:
+                app_bucket.set_limits(app_limits)
+                app_bucket.sync_counts(app_counts, now)
+            if method_limits:
+                method_bucket.set_limits(method_limits)
+                method_bucket.sync_counts(method_counts, now)
+
+    def handle_rate_limited(self, host: str, method: str, headers) -> float:
+        """429 応答時に Retry-After に従って該当バケットをブロックし、待機秒数を返す"""
+        try:
+            retry_after = float(headers.get('Retry-After', DEFAULT_RETRY_AFTER))
+        except (TypeError, ValueError):
+            retry_after = DEFAULT_RETRY_AFTER
+
+        limit_type = headers.get('X-Rate-Limit-Type', 'application')
+
+        with self.lock:
+            self.rate_limited_responses += 1
+            app_bucket, method_bucket = self._buckets(host, method)
+            bucket = app_bucket if limit_type == 'application' else method_bucket
+            bucket.blocked_until = max(bucket.blocked_until, time.time() + retry_after)
+        return retry_after
+
+    def get_stats(self) -> dict:
+        """レート制限の統計取得"""
+        with self.lock:
+            now = time.time()
+            return {
+                'total_wait': round(self.total_wait, 3),
+                'throttled_calls': self.throttled_calls,
+                'rate_limited_responses': self.rate_limited_responses,
+                'share': self.share,
+                'hosts': {
+                    host: [
+                        {'limit': window.limit, 'seconds': window.seconds,
+                         'used': window.used(now)}
+                        for window in bucket.windows
+                    ]
+                    for host, bucket in self.app_buckets.items()
+                }
+            }
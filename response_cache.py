@@ -0,0 +1,121 @@
+"""ダッシュボード用 API のレスポンスキャッシュ（ETag / 条件付き GET / gzip）
+
+監視の状態が変わるたび（ゲーム開始・終了、プレイヤーの追加・削除など）に version を
+進め、各エンドポイントの JSON はシリアライズ済みのバイト列として version ごとに1回だけ作る。
+内容のハッシュを ETag にするので、version が進んでも内容が同じなら If-None-Match で 304 を返す。
+大きな応答は gzip 済みのバイト列も一緒に保持する。
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from flask import Response, request
+
+import metrics
+
+# gzip で返す最小サイズ（これより小さい応答は圧縮の効果が少ない）
+COMPRESS_MIN_BYTES = 1024
+
+
+class CachedResponse:
+    __slots__ = ('version', 'built_at', 'etag', 'body', 'gzipped')
+
+    def __init__(self, version: int, body: bytes, compress_min_bytes: int):
+        self.version = version
+        self.built_at = time.time()
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.body = body
+        self.gzipped = gzip.compress(body, 6) if len(body) >= compress_min_bytes else None
+
+
+class ResponseCache:
+    """状態のバージョンをキーにしたシリアライズ済み JSON のキャッシュ"""
+
+    def __init__(self, max_entries: int = 1024, compress_min_bytes: int = COMPRESS_MIN_BYTES):
+        self.max_entries = max_entries
+        self.compress_min_bytes = compress_min_bytes
+        self.version = 0
+        self.entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        self.lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+
+    def bump(self):
+        """監視の状態が変わった（以降の取得で作り直す）"""
+        with self.lock:
+            self.version += 1
+
+    def _entry(self, key: str, build: Callable[[], dict], ttl: Optional[float]) -> CachedResponse:
+        with self.lock:
+            version = self.version
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version and \
+                    (ttl is None or time.time() - entry.built_at < ttl):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.RESPONSE_CACHE.inc('hit')
+                return entry
+            self.misses += 1
+        metrics.RESPONSE_CACHE.inc('miss')
+
+        # 作成はロックの外で行う（同時に来た場合は両方が作るが結果は同じ）
+        payload = build()
+        entry = CachedResponse(version, json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                               self.compress_min_bytes)
+        # エラー応答は一時的なものなのでキャッシュしない
+        if isinstance(payload, dict) and 'error' in payload:
+            return entry
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def respond(self, key: str, build: Callable[[], dict], ttl: float = None) -> Response:
+        """キャッシュ済みの JSON を返す（If-None-Match が一致すれば 304）
+
+        ttl を指定した場合は version が同じでも ttl 秒経てば作り直す
+        （Riot API の結果など監視の状態とは別に変わるデータ向け）。
+        """
+        entry = self._entry(key, build, ttl)
+        headers = {'ETag': f'"{entry.etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+
+        # プロキシが圧縮し直すと弱い ETag (W/) になるため弱い比較で照合
+        if request.if_none_match.contains_weak(entry.etag):
+            with self.lock:
+                self.not_modified += 1
+            metrics.RESPONSE_CACHE.inc('not_modified')
+            return Response(status=304, headers=headers)
+
+        body = entry.body
+        if entry.gzipped is not None and request.accept_encodings['gzip'] > 0:
+            body = entry.gzipped
+            headers['Content-Encoding'] = 'gzip'
+        with self.lock:
+            self.bytes_sent += len(body)
+            self.bytes_uncompressed += len(entry.body)
+        return Response(body, mimetype='application/json', headers=headers)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            requests_total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests_total, 3) if requests_total else 0.0,
+                'not_modified': self.not_modified,
+                'bytes_sent': self.bytes_sent,
+                'bytes_uncompressed': self.bytes_uncompressed
+            }
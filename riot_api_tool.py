@@ -2,10 +2,29 @@ import requests
 import time
 import json
 import os
-import sqlite3
 from datetime import datetime, timedelta
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Callable
+from urllib.parse import urlparse
+
+from active_games import ActiveGame, ActiveGameTable
+from analytics import AnalyticsEngine
+from featured_games import FeaturedGameDiscovery
+from http_pool import HTTPSessionPool
+from identity_cache import IdentityCache
+from match_ingest import MatchIngestQueue, match_id_for
+from match_store import MatchStore
+import metrics
+from player_registry import PlayerRecord, PlayerRegistry
+from poll_scheduler import PollScheduler
+from rate_limiter import RateLimiter
+from shared_games import SharedGameIndex, participant_puuids
+from sharding import ShardManager
+from single_flight import SingleFlight
+import rollups
+from storage import GameStorage, GAME_INSERT_SQL, PARTICIPANT_INSERT_SQL, participant_rows
 
 try:
     from config import RIOT_API_KEY, MONITOR_INTERVAL, DATA_DIR, DATABASE_PATH, RATE_LIMIT_CALLS, RATE_LIMIT_SECONDS
@@ -17,49 +36,111 @@ except ImportError:
     RATE_LIMIT_CALLS = 100
     RATE_LIMIT_SECONDS = 120
 
-class RiotAPISpectatorTool:
-    def __init__(self, api_key: str = None):
-        """Riot API Spectator Tool初期化"""
-        self.api_key = api_key or RIOT_API_KEY
-        if not self.api_key:
-            raise ValueError("API keyが設定されていません")
-        
-        # API制限管理
-        self.rate_limit_calls = RATE_LIMIT_CALLS
-        self.rate_limit_seconds = RATE_LIMIT_SECONDS
-        self.api_calls = []
-        
-        # 監視関連
-        self.monitored_players = []
-        self.current_games = {}
+try:
+    from config import MONITOR_WORKERS
+except ImportError:
+    MONITOR_WORKERS = 8
+
+try:
+    from config import ADAPTIVE_POLLING, POLL_MAX_INTERVAL
+except ImportError:
+    ADAPTIVE_POLLING = True
+    POLL_MAX_INTERVAL = 300
+
+try:
+    from config import STORAGE_FLUSH_INTERVAL, STORAGE_FLUSH_SIZE
+except ImportError:
+    STORAGE_FLUSH_INTERVAL = 1.0
+    STORAGE_FLUSH_SIZE = 200
+
+try:
+    from config import ACCOUNT_CACHE_TTL, SUMMONER_CACHE_TTL, IDENTITY_CACHE_SIZE
+except ImportError:
+    ACCOUNT_CACHE_TTL = 7 * 24 * 3600
+    SUMMONER_CACHE_TTL = 24 * 3600
+    IDENTITY_CACHE_SIZE = 5000
+
+try:
+    from config import RESTORE_ON_STARTUP
+except ImportError:
+    RESTORE_ON_STARTUP = True
+
+# 同じ API キーを共有するシャードワーカーのレート制限の取り分（sharding.py が設定、1.0 は全体）
+RATE_LIMIT_SHARE = 1.0
+
+# この時間より前に開始して終了が記録されていないゲームは復元しない（ミリ秒）
+STALE_GAME_MS = 3 * 3600 * 1000
+
+# 一括追加でレート制限・API エラーになったプレイヤーの再試行回数と待機秒数（Retry-After がない場合）
+BULK_IMPORT_RETRIES = 3
+BULK_IMPORT_RETRY_DELAY = 10
+
+try:
+    from config import HTTP_POOL_SIZE, HTTP2_ENABLED
+except ImportError:
+    HTTP_POOL_SIZE = 10
+    HTTP2_ENABLED = False
+
+try:
+    from config import MATCH_STORE_DIR, MATCH_IDS_TTL
+except ImportError:
+    MATCH_STORE_DIR = os.path.join(DATA_DIR, "matches")
+    MATCH_IDS_TTL = 120
+
+try:
+    from config import ARCHIVE_DIR, ARCHIVE_SETTLE_SECONDS
+except ImportError:
+    ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+    ARCHIVE_SETTLE_SECONDS = 2 * 24 * 3600
+
+try:
+    from config import SHARD_WORKERS, SHARD_MODE, SHARD_API_KEYS
+except ImportError:
+    SHARD_WORKERS = 0
+    SHARD_MODE = "hash"
+    SHARD_API_KEYS = []
+
+try:
+    from config import API_BASE_URL_OVERRIDE
+except ImportError:
+    API_BASE_URL_OVERRIDE = None
+
+try:
+    from config import FEATURED_GAMES_DISCOVERY, FEATURED_GAMES_INTERVAL
+except ImportError:
+    FEATURED_GAMES_DISCOVERY = False
+    FEATURED_GAMES_INTERVAL = 120
+
+class RiotAPIError(Exception):
+    """200/404 以外の応答または通信エラー（結果が不明なので状態を変えてはいけない）"""
+    
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class MonitorStateView:
+    """データベースに保存された監視の状態を読むだけのビュー（API Key 不要）
+    
+    監視デーモンモードの Web サーバーが表示用に使う。監視ループ・API 呼び出し・試合後の取り込みは行わず、
+    状態の変化はイベントログから反映する。RiotAPISpectatorTool はこれに監視と API 呼び出しを加えたもの。
+    """
+    
+    def __init__(self):
+        self.monitored_players = PlayerRegistry()
+        self.current_games = ActiveGameTable()
         self.monitoring = False
-        self.monitor_thread = None
-        
-        # コールバック関数
-        self.on_game_start = None
-        self.on_game_end = None
         
         # データディレクトリ作成
         os.makedirs(DATA_DIR, exist_ok=True)
         
         # データベース初期化
         self.init_database()
+        self.current_games.storage = self.storage
+        self.match_store = MatchStore(MATCH_STORE_DIR, self.storage)
+        self.analytics = None  # 初回の分析 API 呼び出し時に作成（numpy が必要）
         
         # 地域とクラスターのマッピング
-        self.regional_urls = {
-            "br1": "br1.api.riotgames.com",
-            "eun1": "eun1.api.riotgames.com", 
-            "euw1": "euw1.api.riotgames.com",
-            "jp1": "jp1.api.riotgames.com",
-            "kr": "kr.api.riotgames.com",
-            "la1": "la1.api.riotgames.com",
-            "la2": "la2.api.riotgames.com",
-            "na1": "na1.api.riotgames.com",
-            "oc1": "oc1.api.riotgames.com",
-            "tr1": "tr1.api.riotgames.com",
-            "ru": "ru.api.riotgames.com"
-        }
-        
         self.region_to_cluster = {
             "br1": "americas",
             "eun1": "europe",
@@ -100,196 +181,512 @@ class RiotAPISpectatorTool:
             ]
         }
         
+        self.register_metrics()
+    
+    def register_metrics(self):
+        """/metrics で取得時に読むゲージを登録"""
+        registry = metrics.REGISTRY
+        registry.gauge('spectator_monitored_players', 'Monitored players', lambda: len(self.monitored_players))
+        registry.gauge('spectator_active_games', 'Players currently in game', lambda: len(self.current_games))
+        registry.gauge('spectator_active_game_records', 'Distinct games held in memory',
+                       self.current_games.game_count)
+        registry.gauge('storage_queue_depth', 'Pending write-behind events', self.storage.pending)
+    
     def init_database(self):
         """データベース初期化"""
+        self.storage = GameStorage(DATABASE_PATH, STORAGE_FLUSH_INTERVAL, STORAGE_FLUSH_SIZE)
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
-            # ゲームデータテーブル
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS game_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    puuid TEXT,
-                    game_name TEXT,
-                    tag_line TEXT,
-                    game_id TEXT,
-                    game_start_time INTEGER,
-                    game_end_time INTEGER,
-                    game_duration INTEGER,
-                    participants TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+            self.storage.init_schema()
+        except Exception as e:
+            print(f"データベース初期化エラー: {e}")
+    
+    def restore_monitored_players(self) -> int:
+        """監視対象プレイヤーと進行中のゲームを API を呼ばずにデータベースから復元"""
+        start = time.time()
+        try:
+            rows = self.storage.query('''
+                SELECT mp.puuid, mp.game_name, mp.tag_line, mp.region, mp.cluster,
+                       mp.summoner_id, mp.summoner_name, mp.summoner_level, sc.data
+                FROM monitored_players AS mp
+                LEFT JOIN summoner_cache AS sc ON sc.puuid = mp.puuid AND sc.region = mp.region
+                ORDER BY mp.added_at
             ''')
             
-            # 監視プレイヤーテーブル
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS monitored_players (
-                    puuid TEXT PRIMARY KEY,
-                    game_name TEXT,
-                    tag_line TEXT,
-                    region TEXT,
-                    cluster TEXT,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            # 終了が記録されていない最新のゲーム（古すぎるものは除外）
+            open_games = self.storage.query('''
+                SELECT gd.puuid, gd.game_id, gd.game_start_time, gd.participants, g.payload
+                FROM game_data AS gd
+                JOIN monitored_players AS mp ON mp.puuid = gd.puuid
+                LEFT JOIN games AS g ON g.game_id = gd.game_id
+                WHERE gd.game_end_time IS NULL AND gd.game_start_time > ?
+                ORDER BY gd.game_start_time
+            ''', (int(time.time() * 1000) - STALE_GAME_MS,))
+        except Exception as e:
+            print(f"監視対象の復元エラー: {e}")
+            return 0
+        
+        for puuid, game_name, tag_line, region, cluster, summoner_id, summoner_name, \
+                summoner_level, cached_summoner in rows:
+            if puuid in self.monitored_players:
+                continue
+            # v5 より前に追加されたプレイヤーはサモナー情報キャッシュから補完
+            if summoner_id is None and cached_summoner:
+                summoner = json.loads(cached_summoner)
+                summoner_id = summoner.get('id')
+                summoner_name = summoner.get('name')
+                summoner_level = summoner.get('summonerLevel')
             
-            conn.commit()
-            conn.close()
+            self.monitored_players.add(PlayerRecord(
+                puuid, game_name, tag_line, region,
+                cluster or self.region_to_cluster.get(region, "asia"),
+                summoner_id, summoner_name, summoner_level
+            ))
+        
+        for puuid, game_id, game_start_time, participants, payload in open_games:
+            if payload:
+                game = ActiveGame.from_payload(json.loads(payload))
+            else:
+                # v8 より前の行: game_id は TEXT で保存されているので数値に戻す
+                game = ActiveGame(int(game_id) if game_id and game_id.isdigit() else game_id, game_start_time,
+                                  participant_count=len(json.loads(participants)) if participants else 0)
+            # 保存時の gameLength は古いので開始時刻から経過時間を求め直す
+            if game.game_start_time:
+                game.observed_length = max(0, int(time.time() - game.game_start_time / 1000))
+            self.current_games[puuid] = game
+        
+        if rows:
+            print(f"{len(self.monitored_players)} 人の監視対象と {len(open_games)} 件の進行中ゲームを"
+                  f"復元しました ({time.time() - start:.3f}秒)")
+        return len(rows)
+    
+    def get_recent_match_history(self, puuid: str, cluster: str, count: int = 10) -> list:
+        """保存済みの最近のマッチ履歴（API は呼ばない）"""
+        match_ids = self.match_store.recent_match_ids(puuid, count, float('inf')) or []
+        matches = []
+        for match_id in match_ids[:5]:
+            match_data = self.match_store.load(match_id)
+            if match_data:
+                matches.append(match_data)
+        return matches
+    
+    def get_analytics_data(self) -> dict:
+        """分析データ取得（集計済みロールアップから読み込み）"""
+        try:
+            with self.storage.reader() as conn:
+                return rollups.read_analytics(conn.cursor())
         except Exception as e:
-            print(f"データベース初期化エラー: {e}")
+            return {'error': str(e)}
+    
+    def get_analytics_engine(self) -> AnalyticsEngine:
+        """履歴の配列キャッシュ（初回の呼び出しで全件を読み込み、以降は差分のみ）"""
+        if self.analytics is None:
+            self.analytics = AnalyticsEngine(self.storage, ARCHIVE_DIR)
+        return self.analytics
+    
+    def rebuild_rollups(self):
+        """分析用ロールアップを履歴から再構築"""
+        rollups.rebuild_rollups(self.storage)
+    
+    def get_champion_frequency(self, puuid: str = None, limit: int = 20) -> list:
+        """チャンピオン使用頻度取得（puuid 指定時はそのプレイヤーのみ）"""
+        if puuid:
+            rows = self.storage.query('''
+                SELECT champion_id, COUNT(*) AS games FROM game_participants
+                WHERE puuid = ?
+                GROUP BY champion_id ORDER BY games DESC LIMIT ?
+            ''', (puuid, limit))
+        else:
+            rows = self.storage.query('''
+                SELECT champion_id, COUNT(*) AS games FROM game_participants
+                GROUP BY champion_id ORDER BY games DESC LIMIT ?
+            ''', (limit,))
+        return [{'champion_id': row[0], 'games': row[1]} for row in rows]
+    
+    def get_coplayers(self, puuid: str, limit: int = 20) -> list:
+        """指定プレイヤーと同じゲームに参加したプレイヤー（同チーム/敵チーム別の回数）"""
+        rows = self.storage.query('''
+            SELECT other.puuid,
+                   SUM(other.team_id = me.team_id) AS same_team,
+                   SUM(other.team_id != me.team_id) AS opposing_team,
+                   COUNT(*) AS games
+            FROM game_participants AS me
+            JOIN game_participants AS other
+              ON other.game_id = me.game_id AND other.puuid != me.puuid
+            WHERE me.puuid = ?
+            GROUP BY other.puuid ORDER BY games DESC LIMIT ?
+        ''', (puuid, limit))
+        return [
+            {'puuid': row[0], 'same_team': row[1], 'opposing_team': row[2], 'games': row[3]}
+            for row in rows
+        ]
+
+class RiotAPISpectatorTool(MonitorStateView):
+    def __init__(self, api_key: str = None):
+        """Riot API Spectator Tool初期化"""
+        self.api_key = api_key or RIOT_API_KEY
+        if not self.api_key:
+            raise ValueError("API keyが設定されていません")
+        super().__init__()
+        
+        # API制限管理
+        self.rate_limit_calls = RATE_LIMIT_CALLS
+        self.rate_limit_seconds = RATE_LIMIT_SECONDS
+        self.rate_limiter = RateLimiter([(RATE_LIMIT_CALLS, RATE_LIMIT_SECONDS)], RATE_LIMIT_SHARE)
+        # 同じ URL・パラメータの同時呼び出しは1回にまとめる
+        self.single_flight = SingleFlight()
+        
+        # 監視関連
+        self.monitor_thread = None
+        self.monitor_workers = max(1, MONITOR_WORKERS)
+        self.sweep_history = deque(maxlen=100)
+        self.adaptive_polling = ADAPTIVE_POLLING
+        self.poll_scheduler = PollScheduler(MONITOR_INTERVAL, POLL_MAX_INTERVAL)
+        self.shared_games = SharedGameIndex()
+        # 監視中に「ゲーム中でない」ことを確認済みのプレイヤー（検知遅延はこの後に始まったゲームだけ計測）
+        self.seen_idle = set()
+        self.featured_games = FeaturedGameDiscovery(FEATURED_GAMES_INTERVAL, FEATURED_GAMES_DISCOVERY)
+        self.shard_manager = None
+        
+        # API_BASE_URL_OVERRIDE 設定時は全リクエストをローカルの疑似サーバーへ送る
+        self.api_base_url = API_BASE_URL_OVERRIDE.rstrip('/') if API_BASE_URL_OVERRIDE else None
+        
+        # HTTP接続プール（監視ループ・プレイヤー追加・マッチ履歴取得で共有）
+        self.http_pool = HTTPSessionPool(
+            pool_size=max(HTTP_POOL_SIZE, self.monitor_workers),
+            http2=HTTP2_ENABLED
+        )
+        
+        # コールバック関数
+        self.on_game_start = None
+        self.on_game_end = None
+        
+        self.identity_cache = IdentityCache(self.storage, ACCOUNT_CACHE_TTL,
+                                            SUMMONER_CACHE_TTL, IDENTITY_CACHE_SIZE)
+        
+        # 試合終了後のマッチ情報取り込み（前回の未処理分も再開）
+        self.match_ingest = MatchIngestQueue(self.storage, self.fetch_match)
+        self.match_ingest.restore()
+        self.match_ingest.start()
+        
+        # 地域・クラスターの API ホスト
+        self.regional_urls = {
+            "br1": "br1.api.riotgames.com",
+            "eun1": "eun1.api.riotgames.com", 
+            "euw1": "euw1.api.riotgames.com",
+            "jp1": "jp1.api.riotgames.com",
+            "kr": "kr.api.riotgames.com",
+            "la1": "la1.api.riotgames.com",
+            "la2": "la2.api.riotgames.com",
+            "na1": "na1.api.riotgames.com",
+            "oc1": "oc1.api.riotgames.com",
+            "tr1": "tr1.api.riotgames.com",
+            "ru": "ru.api.riotgames.com"
+        }
+        
+        self.cluster_urls = {
+            "americas": "americas.api.riotgames.com",
+            "asia": "asia.api.riotgames.com",
+            "europe": "europe.api.riotgames.com"
+        }
+        
+        # 前回の監視対象と進行中のゲームを復元
+        if RESTORE_ON_STARTUP:
+            self.restore_monitored_players()
+        
+    def register_metrics(self):
+        """/metrics のゲージ（試合後の取り込み待ちを追加）"""
+        super().register_metrics()
+        metrics.REGISTRY.gauge('match_ingest_pending', 'Matches waiting to be ingested',
+                               lambda: len(self.match_ingest.pending()))
     
-    def check_rate_limit(self):
-        """レート制限チェック"""
-        now = time.time()
-        # 古いAPIコール記録を削除
-        self.api_calls = [call_time for call_time in self.api_calls 
-                         if now - call_time < self.rate_limit_seconds]
+    def restore_monitored_players(self) -> int:
+        """監視対象と進行中のゲームを復元し、同じゲームのプレイヤーをまとめる"""
+        restored = super().restore_monitored_players()
         
-        if len(self.api_calls) >= self.rate_limit_calls:
-            sleep_time = self.rate_limit_seconds - (now - self.api_calls[0])
-            if sleep_time > 0:
-                print(f"レート制限に達しました。{sleep_time:.1f}秒待機...")
-                time.sleep(sleep_time)
+        # 同じゲームに参加中の監視対象プレイヤーは1人だけポーリングする
+        by_game = {}
+        for puuid, game in self.current_games.items():
+            by_game.setdefault(str(game.game_id), []).append(puuid)
+        for game_id, puuids in by_game.items():
+            if len(puuids) > 1:
+                self.shared_games.join(game_id, puuids[0], puuids)
         
-        self.api_calls.append(now)
+        return restored
     
-    def make_api_request(self, url: str, params: dict = None) -> dict:
-        """API リクエスト実行"""
-        self.check_rate_limit()
+    def check_rate_limit(self, host: str, method: str) -> float:
+        """レート制限チェック（ホスト・メソッド別のバケットで枠を確保）"""
+        return self.rate_limiter.acquire(host, method)
+    
+    def build_url(self, host: str, path: str) -> str:
+        """API の URL を組み立てる（疑似サーバー使用時は {base}/{host}{path}）"""
+        if self.api_base_url:
+            return f"{self.api_base_url}/{host}{path}"
+        return f"https://{host}{path}"
+    
+    def _request_host(self, url: str) -> str:
+        """レート制限の単位になるホスト（疑似サーバー使用時はパス先頭のホスト名）"""
+        if self.api_base_url and url.startswith(self.api_base_url + '/'):
+            return url[len(self.api_base_url) + 1:].split('/', 1)[0]
+        return urlparse(url).netloc
+    
+    def make_api_request(self, url: str, params: dict = None, method: str = None,
+                         raise_errors: bool = False) -> dict:
+        """API リクエスト実行（同じリクエストが実行中ならその結果を共有）
+        
+        404 は None を返す。それ以外のエラーは raise_errors=True なら RiotAPIError を送出し、
+        False なら None を返す（「存在しない」と区別する必要がない呼び出し向け）。
+        """
+        method = method or RateLimiter.method_key(url)
+        key = (url, tuple(sorted(params.items())) if params else ())
+        try:
+            return self.single_flight.do(key, lambda: self._send_api_request(url, params, method), method)
+        except RiotAPIError:
+            if raise_errors:
+                raise
+            return None
+    
+    def _send_api_request(self, url: str, params: dict, method: str) -> dict:
+        host = self._request_host(url)
+        waited = self.check_rate_limit(host, method)
+        if waited:
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(host, amount=waited)
         
         headers = {"X-Riot-Token": self.api_key}
         
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            start = time.perf_counter()
+            response = self.http_pool.get(url, headers=headers, params=params, timeout=10)
+            metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - start, host, method)
+            metrics.API_RESPONSES.inc(host, method, str(response.status_code))
+            self.rate_limiter.update_from_headers(host, method, response.headers)
             
             if response.status_code == 200:
                 return response.json()
             elif response.status_code == 404:
                 return None
             elif response.status_code == 429:
-                print("レート制限エラー")
-                time.sleep(10)
-                return None
+                # 待機は次回の check_rate_limit で行う（Retry-After を尊重）
+                retry_after = self.rate_limiter.handle_rate_limited(host, method, response.headers)
+                print(f"レート制限エラー ({host}): {retry_after:.0f}秒後に再開します")
+                raise RiotAPIError(f"レート制限 ({host})", 429, retry_after)
             else:
                 print(f"API エラー: {response.status_code}")
-                return None
+                raise RiotAPIError(f"API エラー: {response.status_code}", response.status_code)
                 
         except requests.exceptions.RequestException as e:
+            metrics.API_RESPONSES.inc(host, method, "error")
             print(f"リクエストエラー: {e}")
-            return None
+            raise RiotAPIError(f"リクエストエラー: {e}") from e
     
     def test_api_connection(self) -> bool:
         """API接続テスト"""
-        test_url = "https://kr.api.riotgames.com/lol/summoner/v4/summoners/by-name/test"
+        test_url = self.build_url(self.regional_urls["kr"], "/lol/summoner/v4/summoners/by-name/test")
         try:
             headers = {"X-Riot-Token": self.api_key}
-            response = requests.get(test_url, headers=headers, timeout=5)
+            response = self.http_pool.get(test_url, headers=headers, timeout=5)
             # 401以外なら API key は有効（404は正常、プレイヤーが存在しないだけ）
             return response.status_code != 401
         except:
             return False
     
     def get_account_by_riot_id(self, game_name: str, tag_line: str, cluster: str) -> dict:
-        """Riot IDでアカウント情報取得"""
-        cluster_urls = {
-            "americas": "americas.api.riotgames.com",
-            "asia": "asia.api.riotgames.com", 
-            "europe": "europe.api.riotgames.com"
-        }
+        """Riot IDでアカウント情報取得（キャッシュ優先、None は存在しない、取得失敗は RiotAPIError）"""
+        cached = self.identity_cache.get_account(game_name, tag_line)
+        if cached:
+            return cached
         
-        base_url = cluster_urls.get(cluster, "asia.api.riotgames.com")
-        url = f"https://{base_url}/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
+        base_url = self.cluster_urls.get(cluster, "asia.api.riotgames.com")
+        url = self.build_url(base_url, f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}")
         
-        return self.make_api_request(url)
+        account = self.make_api_request(url, method="account-v1.getByRiotId", raise_errors=True)
+        if account:
+            self.identity_cache.put_account(game_name, tag_line, account)
+        return account
     
     def get_summoner_by_puuid(self, puuid: str, region: str) -> dict:
-        """PUUIDでサモナー情報取得"""
+        """PUUIDでサモナー情報取得（キャッシュ優先、None は存在しない、取得失敗は RiotAPIError）"""
+        cached = self.identity_cache.get_summoner(puuid, region)
+        if cached:
+            return cached
+        
         base_url = self.regional_urls.get(region, "kr.api.riotgames.com")
-        url = f"https://{base_url}/lol/summoner/v4/summoners/by-puuid/{puuid}"
+        url = self.build_url(base_url, f"/lol/summoner/v4/summoners/by-puuid/{puuid}")
         
-        return self.make_api_request(url)
+        summoner = self.make_api_request(url, method="summoner-v4.getByPUUID", raise_errors=True)
+        if summoner:
+            self.identity_cache.put_summoner(puuid, region, summoner)
+        return summoner
     
     def get_current_game(self, puuid: str, region: str) -> dict:
-        """現在のゲーム情報取得"""
+        """現在のゲーム情報取得（None はゲーム中でない、取得失敗は RiotAPIError）"""
         base_url = self.regional_urls.get(region, "kr.api.riotgames.com")
-        url = f"https://{base_url}/lol/spectator/v4/active-games/by-summoner/{puuid}"
+        url = self.build_url(base_url, f"/lol/spectator/v4/active-games/by-summoner/{puuid}")
         
-        return self.make_api_request(url)
+        # 失敗を「ゲーム中でない」と扱うと進行中のゲームが終了扱いになるため送出する
+        return self.make_api_request(url, method="spectator-v4.getCurrentGameInfoByPuuid", raise_errors=True)
+    
+    def get_featured_games(self, region: str) -> dict:
+        """注目ゲーム一覧取得（1回の呼び出しで複数の進行中ゲーム）"""
+        base_url = self.regional_urls.get(region, "kr.api.riotgames.com")
+        url = self.build_url(base_url, "/lol/spectator/v4/featured-games")
+        
+        return self.make_api_request(url, method="spectator-v4.getFeaturedGames")
+    
+    def _fetch_missing_matches(self, base_url: str, match_ids: List[str]) -> int:
+        """未保存のマッチ情報だけを並列取得してマッチストアに保存"""
+        missing = self.match_store.missing(match_ids)
+        if not missing:
+            return 0
+        
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=min(self.monitor_workers, len(missing))) as executor:
+            futures = [executor.submit(self._download_match, base_url, match_id) for match_id in missing]
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        fetched += 1
+                except Exception as e:
+                    print(f"マッチ情報取得エラー: {e}")
+        return fetched
+    
+    def _download_match(self, base_url: str, match_id: str) -> Optional[dict]:
+        """マッチ情報を API で取得してマッチストアに保存"""
+        match_url = self.build_url(base_url, f"/lol/match/v5/matches/{match_id}")
+        match_data = self.make_api_request(match_url, method="match-v5.getMatch")
+        if match_data:
+            self.match_store.save(match_id, match_data)
+        return match_data
+    
+    def fetch_match(self, match_id: str, cluster: str) -> Optional[dict]:
+        """マッチ情報取得（保存済みなら API を呼ばない、未公開なら None）"""
+        match_data = self.match_store.load(match_id)
+        if match_data:
+            return match_data
+        return self._download_match(self.cluster_urls.get(cluster, "asia.api.riotgames.com"), match_id)
     
     def get_recent_match_history(self, puuid: str, cluster: str, count: int = 10) -> list:
-        """最近のマッチ履歴取得"""
-        cluster_urls = {
-            "americas": "americas.api.riotgames.com",
-            "asia": "asia.api.riotgames.com",
-            "europe": "europe.api.riotgames.com"
-        }
+        """最近のマッチ履歴取得（保存済みのマッチは API を呼ばずに返す）"""
+        base_url = self.cluster_urls.get(cluster, "asia.api.riotgames.com")
         
-        base_url = cluster_urls.get(cluster, "asia.api.riotgames.com")
-        url = f"https://{base_url}/lol/match/v5/matches/by-puuid/{puuid}/ids"
+        # matchId 一覧は MATCH_IDS_TTL 秒以内に取得していれば再利用
+        match_ids = self.match_store.recent_match_ids(puuid, count, MATCH_IDS_TTL)
+        if match_ids is None:
+            url = self.build_url(base_url, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+            match_ids = self.make_api_request(url, {"count": count}, method="match-v5.getMatchIdsByPUUID")
+            if not match_ids:
+                return []
+            self.match_store.record_match_ids(puuid, match_ids)
         
-        match_ids = self.make_api_request(url, {"count": count})
-        if not match_ids:
-            return []
+        match_ids = match_ids[:5]  # 最新5試合のみ詳細取得
+        self._fetch_missing_matches(base_url, match_ids)
         
         matches = []
-        for match_id in match_ids[:5]:  # 最新5試合のみ詳細取得
-            match_url = f"https://{base_url}/lol/match/v5/matches/{match_id}"
-            match_data = self.make_api_request(match_url)
+        for match_id in match_ids:
+            match_data = self.match_store.load(match_id)
             if match_data:
                 matches.append(match_data)
         
         return matches
     
-    def add_player_to_monitor(self, game_name: str, tag_line: str, region: str, cluster: str) -> bool:
-        """プレイヤーを監視対象に追加"""
+    def backfill_match_history(self, puuid: str, cluster: str, start_time: int = None) -> dict:
+        """start_time（UNIX秒）以降の全マッチ履歴をページングして取得・保存"""
+        base_url = self.cluster_urls.get(cluster, "asia.api.riotgames.com")
+        url = self.build_url(base_url, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+        page_size = 100
+        
+        summary = {'match_ids': 0, 'fetched': 0, 'already_stored': 0}
+        start = 0
+        while True:
+            params = {"start": start, "count": page_size}
+            if start_time:
+                params["startTime"] = int(start_time)
+            match_ids = self.make_api_request(url, params, method="match-v5.getMatchIdsByPUUID")
+            if not match_ids:
+                break
+            
+            self.match_store.record_match_ids(puuid, match_ids, refreshed=(start == 0))
+            fetched = self._fetch_missing_matches(base_url, match_ids)
+            summary['match_ids'] += len(match_ids)
+            summary['fetched'] += fetched
+            summary['already_stored'] += len(match_ids) - fetched
+            
+            if len(match_ids) < page_size:
+                break
+            start += page_size
+        
+        print(f"マッチ履歴バックフィル完了: {summary['match_ids']}件 (新規取得 {summary['fetched']}件)")
+        return summary
+    
+    def _resolve_player(self, game_name: str, tag_line: str, region: str, cluster: str):
+        """Riot ID からプレイヤー情報を解決し (ステータス, プレイヤー情報) を返す
+        
+        レート制限・サーバーエラー・通信エラーは ("retry", 再試行までの秒数 or None) を返す
+        （存在しないとは限らないのでキャッシュは消さない）。
+        """
         try:
             # アカウント情報取得
             account = self.get_account_by_riot_id(game_name, tag_line, cluster)
             if not account:
-                print(f"プレイヤー {game_name}#{tag_line} が見つかりません")
-                return False
+                return "not_found", None
             
             puuid = account['puuid']
             
-            # 既に追加済みかチェック
-            for player in self.monitored_players:
-                if player['puuid'] == puuid:
-                    print(f"プレイヤー {game_name}#{tag_line} は既に監視対象です")
-                    return False
+            # 既に追加済みかチェック（サモナー情報の API 呼び出しを省く）
+            if puuid in self.monitored_players:
+                return "duplicate", None
             
             # サモナー情報取得
             summoner = self.get_summoner_by_puuid(puuid, region)
-            if not summoner:
+        except RiotAPIError as e:
+            return "retry", e.retry_after
+        
+        if not summoner:
+            # キャッシュ済みの Riot ID が古い可能性があるので無効化しておく
+            self.identity_cache.invalidate_account(game_name, tag_line)
+            return "summoner_not_found", None
+        
+        return "resolved", PlayerRecord(
+            puuid, game_name, tag_line, region, cluster,
+            summoner['id'], summoner['name'], summoner['summonerLevel']
+        )
+    
+    def _register_player(self, player: PlayerRecord) -> bool:
+        """解決済みプレイヤーを監視対象に登録（puuid インデックスで重複排除）"""
+        if not self.monitored_players.add(player):
+            return False
+        
+        # データベースに保存
+        try:
+            self.storage.execute('''
+                INSERT OR REPLACE INTO monitored_players 
+                (puuid, game_name, tag_line, region, cluster,
+                 summoner_id, summoner_name, summoner_level)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (player.puuid, player.game_name, player.tag_line, player.region, player.cluster,
+                  player.summoner_id, player.summoner_name, player.summoner_level))
+        except Exception as e:
+            print(f"データベース保存エラー: {e}")
+        if self.shard_manager:
+            self.shard_manager.add_player(player)
+        return True
+    
+    def add_player_to_monitor(self, game_name: str, tag_line: str, region: str, cluster: str) -> bool:
+        """プレイヤーを監視対象に追加"""
+        try:
+            status, player = self._resolve_player(game_name, tag_line, region, cluster)
+            
+            if status == "not_found":
+                print(f"プレイヤー {game_name}#{tag_line} が見つかりません")
+                return False
+            if status == "summoner_not_found":
                 print(f"サモナー情報の取得に失敗しました")
                 return False
-            
-            player_data = {
-                'puuid': puuid,
-                'game_name': game_name,
-                'tag_line': tag_line,
-                'region': region,
-                'cluster': cluster,
-                'summoner_id': summoner['id'],
-                'summoner_name': summoner['name'],
-                'summoner_level': summoner['summonerLevel']
-            }
-            
-            self.monitored_players.append(player_data)
-            
-            # データベースに保存
-            try:
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO monitored_players 
-                    (puuid, game_name, tag_line, region, cluster)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (puuid, game_name, tag_line, region, cluster))
-                conn.commit()
-                conn.close()
-            except Exception as e:
-                print(f"データベース保存エラー: {e}")
+            if status == "retry":
+                print(f"Riot API エラーのため {game_name}#{tag_line} を追加できませんでした（しばらくして再試行してください）")
+                return False
+            if status == "duplicate" or not self._register_player(player):
+                print(f"プレイヤー {game_name}#{tag_line} は既に監視対象です")
+                return False
             
             print(f"プレイヤー {game_name}#{tag_line} を監視対象に追加しました")
             return True
@@ -298,28 +695,121 @@ class RiotAPISpectatorTool:
             print(f"プレイヤー追加エラー: {e}")
             return False
     
+    def bulk_add_players(self, entries: List[tuple], progress_callback: Callable = None) -> dict:
+        """プレイヤーを並列に一括追加し、結果の集計を返す
+        
+        entries は (game_name, tag_line, region) のリスト。アカウント解決は
+        MONITOR_WORKERS 本のワーカーで並列に行い、レート制限は共有のリミッターに従う。
+        progress_callback にはプレイヤーごとの結果 dict が渡される。
+        レート制限などで解決できなかったプレイヤーは Retry-After の経過後に
+        BULK_IMPORT_RETRIES 回まで再試行し、それでも失敗したものは "error" とする。
+        """
+        # 入力内の重複（大文字小文字違いを含む）を除外
+        unique_entries = []
+        seen = set()
+        for game_name, tag_line, region in entries:
+            game_name, tag_line, region = game_name.strip(), tag_line.strip(), region.strip()
+            key = (game_name.lower(), tag_line.lower())
+            if not game_name or not tag_line or key in seen:
+                continue
+            seen.add(key)
+            unique_entries.append((game_name, tag_line, region))
+        
+        summary = {'total': len(unique_entries), 'added': 0, 'duplicate': 0, 'failed': 0,
+                   'retried': 0, 'skipped': len(entries) - len(unique_entries)}
+        
+        def resolve(entry):
+            game_name, tag_line, region = entry
+            cluster = self.region_to_cluster.get(region, "asia")
+            return self._resolve_player(game_name, tag_line, region, cluster)
+        
+        done = 0
+        queue = unique_entries
+        with ThreadPoolExecutor(max_workers=self.monitor_workers,
+                                thread_name_prefix="bulk-import") as executor:
+            for attempt in range(BULK_IMPORT_RETRIES + 1):
+                retry, retry_after = [], 0
+                futures = {executor.submit(resolve, entry): entry for entry in queue}
+                for future in as_completed(futures):
+                    game_name, tag_line, region = futures[future]
+                    try:
+                        status, player = future.result()
+                    except Exception as e:
+                        print(f"プレイヤー追加エラー ({game_name}#{tag_line}): {e}")
+                        status, player = "error", None
+                    
+                    if status == "retry":
+                        if attempt < BULK_IMPORT_RETRIES:
+                            # "retry" の場合 2 番目の値は Retry-After の秒数
+                            retry.append(futures[future])
+                            retry_after = max(retry_after, player or BULK_IMPORT_RETRY_DELAY)
+                            continue
+                        status = "error"
+                    
+                    done += 1
+                    self._record_bulk_result(summary, progress_callback, game_name, tag_line, region,
+                                             status, player, done)
+                
+                if not retry:
+                    break
+                summary['retried'] += len(retry)
+                print(f"一括追加: {len(retry)} 人を {retry_after:.0f}秒後に再試行します")
+                time.sleep(retry_after)
+                queue = retry
+        
+        print(f"一括追加: {summary['added']} 人追加 / {summary['duplicate']} 人は追加済み / "
+              f"{summary['failed']} 人失敗")
+        return summary
+    
+    def _record_bulk_result(self, summary: dict, progress_callback: Optional[Callable], game_name: str,
+                            tag_line: str, region: str, status: str, player: Optional[PlayerRecord], done: int):
+        """一括追加の1人分の結果を登録・集計して進捗を通知"""
+        if status == "resolved":
+            status = "added" if self._register_player(player) else "duplicate"
+        
+        if status == "added":
+            summary['added'] += 1
+        elif status == "duplicate":
+            summary['duplicate'] += 1
+        else:
+            summary['failed'] += 1
+        
+        if progress_callback:
+            progress_callback({
+                'game_name': game_name,
+                'tag_line': tag_line,
+                'region': region,
+                'status': status,
+                'done': done,
+                'total': summary['total']
+            })
+    
     def remove_player_from_monitor(self, game_name: str, tag_line: str) -> bool:
         """プレイヤーを監視対象から削除"""
-        for i, player in enumerate(self.monitored_players):
-            if player['game_name'] == game_name and player['tag_line'] == tag_line:
-                removed_player = self.monitored_players.pop(i)
-                
-                # データベースからも削除
-                try:
-                    conn = sqlite3.connect(DATABASE_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute('DELETE FROM monitored_players WHERE puuid = ?', 
-                                 (removed_player['puuid'],))
-                    conn.commit()
-                    conn.close()
-                except Exception as e:
-                    print(f"データベース削除エラー: {e}")
-                
-                print(f"プレイヤー {game_name}#{tag_line} を監視対象から削除しました")
-                return True
+        removed_player = self.monitored_players.remove_by_riot_id(game_name, tag_line)
+        if removed_player is None:
+            print(f"プレイヤー {game_name}#{tag_line} が見つかりません")
+            return False
+        
+        # データベースからも削除
+        try:
+            self.storage.execute('DELETE FROM monitored_players WHERE puuid = ?', 
+                                 (removed_player.puuid,))
+        except Exception as e:
+            print(f"データベース削除エラー: {e}")
+        self.shared_games.leave(removed_player.puuid)
+        self.seen_idle.discard(removed_player.puuid)
+        if self.shard_manager:
+            self.shard_manager.remove_player(removed_player.puuid)
+        
+        # 進行中のゲームは削除時点で終了として記録（終了時刻は試合後の取り込みで補正される）
+        finished_game = self.current_games.pop(removed_player.puuid, None)
+        if finished_game is not None:
+            self.featured_games.mark_ended(finished_game.game_id)
+            self.save_game_data(removed_player, finished_game, "end")
         
-        print(f"プレイヤー {game_name}#{tag_line} が見つかりません")
-        return False
+        print(f"プレイヤー {game_name}#{tag_line} を監視対象から削除しました")
+        return True
     
     def list_monitored_players(self):
         """監視対象プレイヤー一覧表示"""
@@ -332,17 +822,14 @@ class RiotAPISpectatorTool:
             status = "ゲーム中" if player['puuid'] in self.current_games else "待機中"
             print(f"{i}. {player['game_name']}#{player['tag_line']} ({player['region']}) - {status}")
     
-    def add_pro_players_by_region(self, region: str) -> int:
+    def add_pro_players_by_region(self, region: str, progress_callback: Callable = None) -> int:
         """地域別プロプレイヤー一括追加"""
         if region not in self.pro_players:
             print(f"地域 {region} のプロプレイヤーデータがありません")
             return 0
         
-        added_count = 0
-        for game_name, tag_line, server_region in self.pro_players[region]:
-            cluster = self.region_to_cluster.get(server_region, "asia")
-            if self.add_player_to_monitor(game_name, tag_line, server_region, cluster):
-                added_count += 1
+        summary = self.bulk_add_players(self.pro_players[region], progress_callback)
+        added_count = summary['added']
         
         print(f"{region} から {added_count} 人のプロプレイヤーを追加しました")
         return added_count
@@ -352,86 +839,302 @@ class RiotAPISpectatorTool:
         self.on_game_start = on_game_start
         self.on_game_end = on_game_end
     
+    def _interleave_by_region(self, players: List[PlayerRecord]) -> List[PlayerRecord]:
+        """地域ごとに交互に並べ替え（特定地域のリクエストが連続しないようにする）"""
+        by_region = {}
+        for player in players:
+            by_region.setdefault(player['region'], deque()).append(player)
+        
+        ordered = []
+        queues = list(by_region.values())
+        while queues:
+            for queue in queues:
+                ordered.append(queue.popleft())
+            queues = [queue for queue in queues if queue]
+        return ordered
+    
+    def _handle_poll_result(self, player: PlayerRecord, current_game: Optional[dict],
+                            source: str = "spectator"):
+        """1プレイヤー分のポーリング結果を反映（source: ゲーム開始の検出元）"""
+        puuid = player['puuid']
+        
+        if current_game:
+            # ゲーム中
+            if puuid not in self.current_games:
+                # 新しいゲーム開始
+                self.current_games[puuid] = current_game
+                print(f"🎮 {player['game_name']}#{player['tag_line']} がゲームを開始しました")
+                # 監視開始時・追加時に既に進行中だったゲームは検知遅延ではないので除外
+                if puuid in self.seen_idle and current_game.get('gameStartTime'):
+                    metrics.DETECTION_SECONDS.observe(time.time() - current_game['gameStartTime'] / 1000)
+                self.seen_idle.discard(puuid)
+                metrics.GAME_DETECTIONS.inc(source)
+                self.featured_games.record_detection(source)
+                
+                # データベースに保存
+                self.save_game_data(player, current_game, "start")
+                
+                # コールバック呼び出し
+                if self.on_game_start:
+                    self.on_game_start(player, current_game)
+        else:
+            # ゲーム中ではない
+            self.seen_idle.add(puuid)
+            if puuid in self.current_games:
+                # ゲーム終了
+                finished_game = self.current_games.pop(puuid)
+                self.featured_games.mark_ended(finished_game.game_id)
+                print(f"🏁 {player['game_name']}#{player['tag_line']} のゲームが終了しました")
+                
+                # データベースに保存
+                self.save_game_data(player, finished_game, "end")
+                
+                # コールバック呼び出し
+                if self.on_game_end:
+                    self.on_game_end(player)
+    
+    def _join_shared_game(self, player: PlayerRecord, current_game: dict):
+        """参加者に他の監視対象がいれば API を呼ばずにゲーム中として扱う"""
+        co_players = [
+            self.monitored_players.get(puuid) for puuid in participant_puuids(current_game)
+            if puuid != player['puuid'] and puuid in self.monitored_players
+        ]
+        co_players = [co_player for co_player in co_players if co_player is not None]
+        if not co_players:
+            return
+        
+        game_id = current_game.get('gameId')
+        self.shared_games.join(game_id, player['puuid'],
+                               [player['puuid']] + [co_player['puuid'] for co_player in co_players])
+        for co_player in co_players:
+            previous = self.current_games.get(co_player['puuid'])
+            if previous is not None and previous.get('gameId') == game_id:
+                continue
+            if previous is not None:
+                self._handle_poll_result(co_player, None)
+            self._handle_poll_result(co_player, current_game, "shared")
+            self.poll_scheduler.reschedule(co_player['puuid'], current_game)
+    
+    def _end_shared_game(self, player: PlayerRecord, current_game: Optional[dict]):
+        """アンカーのゲームが終わっていれば同じゲームのメンバーも終了させる"""
+        game_id = self.shared_games.anchored_game(player['puuid'])
+        if game_id is None:
+            return
+        if current_game and str(current_game.get('gameId')) == game_id:
+            return
+        
+        for puuid in self.shared_games.finish(game_id):
+            member = self.monitored_players.get(puuid)
+            if member is None or puuid == player['puuid']:
+                continue
+            self._handle_poll_result(member, None)
+            self.poll_scheduler.reschedule(puuid, None)
+    
+    def _discover_featured_games(self, executor: ThreadPoolExecutor, players: List[PlayerRecord]) -> dict:
+        """取得時刻に達したリージョンの featured-games を更新し、新しくゲームを始めた監視対象を探す"""
+        discovery = self.featured_games
+        if not discovery.enabled or not players:
+            return {}
+        
+        futures = {
+            executor.submit(self.get_featured_games, region): region
+            for region in discovery.due_regions(player['region'] for player in players)
+        }
+        for future in as_completed(futures):
+            try:
+                featured = future.result()
+            except Exception as e:
+                print(f"featured-games 取得エラー ({futures[future]}): {e}")
+                featured = None
+            discovery.update(futures[future], featured)
+        
+        # ゲーム中のプレイヤーは終了を検知するため個別ポーリングを続ける
+        return discovery.find(player for player in players if player['puuid'] not in self.current_games)
+    
+    def poll_players(self, executor: ThreadPoolExecutor, players: List[PlayerRecord] = None) -> dict:
+        """プレイヤーを並列ポーリング（1スイープ）し、スイープ統計を返す（省略時は全員）"""
+        if players is None:
+            players = self.monitored_players.snapshot()
+        sweep_start = time.time()
+        errors = 0
+        
+        # 監視対象の別プレイヤーと同じゲーム中のプレイヤーは API を呼ばない
+        shared = {player['puuid'] for player in players if self.shared_games.is_covered(player['puuid'])}
+        if shared:
+            for puuid in shared:
+                self.poll_scheduler.reschedule(puuid, self.current_games.get(puuid))
+            players = [player for player in players if player['puuid'] not in shared]
+        
+        # featured-games に載っているプレイヤーはそのサイクルの個別ポーリングを省略
+        featured = self._discover_featured_games(executor, players)
+        if featured:
+            for player in players:
+                current_game = featured.get(player['puuid'])
+                if current_game is None or not self.monitoring or player['puuid'] not in self.monitored_players:
+                    continue
+                self._handle_poll_result(player, current_game, "featured")
+                self.poll_scheduler.reschedule(player['puuid'], current_game)
+                self._join_shared_game(player, current_game)
+            players = [player for player in players if player['puuid'] not in featured]
+        players = self._interleave_by_region(players)
+        
+        futures = {
+            executor.submit(self.get_current_game, player['puuid'], player['region']): player
+            for player in players
+        }
+        
+        # 結果の反映は監視スレッドで行い、状態更新を直列化する
+        for future in as_completed(futures):
+            player = futures[future]
+            try:
+                current_game = future.result()
+            except Exception as e:
+                # 取得できなかったプレイヤーのゲーム状態は変えない
+                errors += 1
+                print(f"ポーリングエラー ({player['game_name']}#{player['tag_line']}): {e}")
+                self.poll_scheduler.retry_later(player['puuid'], getattr(e, 'retry_after', None))
+                continue
+            
+            # 結果待ちの間に監視が止まった・プレイヤーが削除された場合は反映しない
+            if not self.monitoring or player['puuid'] not in self.monitored_players:
+                continue
+            self._end_shared_game(player, current_game)
+            self._handle_poll_result(player, current_game)
+            self.poll_scheduler.reschedule(player['puuid'], current_game)
+            if current_game:
+                self._join_shared_game(player, current_game)
+        
+        sweep = {
+            'started_at': sweep_start,
+            'duration': time.time() - sweep_start,
+            'players': len(players),
+            'shared': len(shared),
+            'featured': len(featured),
+            'errors': errors
+        }
+        self.sweep_history.append(sweep)
+        metrics.SWEEP_SECONDS.observe(sweep['duration'])
+        return sweep
+    
+    def get_sweep_stats(self) -> dict:
+        """スイープ所要時間の統計取得"""
+        durations = sorted(sweep['duration'] for sweep in self.sweep_history)
+        if not durations:
+            return {
+                'sweeps': 0,
+                'players': len(self.monitored_players),
+                'workers': self.monitor_workers,
+                'last_duration': None,
+                'avg_duration': None,
+                'p95_duration': None,
+                'max_duration': None
+            }
+        
+        last = self.sweep_history[-1]
+        p95_index = min(len(durations) - 1, int(len(durations) * 0.95))
+        return {
+            'sweeps': len(durations),
+            'players': last['players'],
+            'workers': self.monitor_workers,
+            'last_duration': round(last['duration'], 3),
+            'avg_duration': round(sum(durations) / len(durations), 3),
+            'p95_duration': round(durations[p95_index], 3),
+            'max_duration': round(durations[-1], 3)
+        }
+    
+    def _adaptive_poll_cycle(self, executor: ThreadPoolExecutor):
+        """スケジューラで時刻に達したプレイヤーだけをポーリング"""
+        scheduler = self.poll_scheduler
+        scheduler.sync(player['puuid'] for player in self.monitored_players)
+        
+        # 活動時間帯・平均ゲーム時間は1時間ごとに更新
+        if time.time() - scheduler.history_loaded_at > 3600:
+            scheduler.load_history(self.storage)
+        
+        due = set(scheduler.pop_due())
+        if due:
+            players = [self.monitored_players.get(puuid) for puuid in due]
+            players = [player for player in players if player is not None]
+            self.poll_players(executor, players)
+        
+        # 追加されたプレイヤーを拾うため最長でも1秒ごとに確認
+        wait = scheduler.next_due_in()
+        time.sleep(min(1.0, wait if wait is not None else 1.0))
+    
     def monitor_players(self):
         """プレイヤー監視メインループ"""
-        print(f"監視開始: {len(self.monitored_players)} 人のプレイヤーを監視中...")
+        mode = "アダプティブ" if self.adaptive_polling else "固定間隔"
+        print(f"監視開始: {len(self.monitored_players)} 人のプレイヤーを "
+              f"{self.monitor_workers} ワーカーで監視中 ({mode})...")
+        self.poll_scheduler = PollScheduler(MONITOR_INTERVAL, POLL_MAX_INTERVAL)
         
-        while self.monitoring:
-            try:
-                for player in self.monitored_players:
-                    if not self.monitoring:
-                        break
+        with ThreadPoolExecutor(max_workers=self.monitor_workers,
+                                thread_name_prefix="spectator-poll") as executor:
+            while self.monitoring:
+                try:
+                    if self.adaptive_polling:
+                        self._adaptive_poll_cycle(executor)
+                        continue
                     
-                    puuid = player['puuid']
-                    region = player['region']
+                    sweep = self.poll_players(executor)
+                    print(f"スイープ完了: {sweep['players']} 人 / {sweep['duration']:.2f}秒")
                     
-                    # 現在のゲーム状況取得
-                    current_game = self.get_current_game(puuid, region)
+                    # スイープに掛かった時間を差し引いて次の周期まで待機
+                    time.sleep(max(0, MONITOR_INTERVAL - sweep['duration']))
                     
-                    if current_game:
-                        # ゲーム中
-                        if puuid not in self.current_games:
-                            # 新しいゲーム開始
-                            self.current_games[puuid] = current_game
-                            print(f"🎮 {player['game_name']}#{player['tag_line']} がゲームを開始しました")
-                            
-                            # データベースに保存
-                            self.save_game_data(player, current_game, "start")
-                            
-                            # コールバック呼び出し
-                            if self.on_game_start:
-                                self.on_game_start(player, current_game)
-                    else:
-                        # ゲーム中ではない
-                        if puuid in self.current_games:
-                            # ゲーム終了
-                            finished_game = self.current_games.pop(puuid)
-                            print(f"🏁 {player['game_name']}#{player['tag_line']} のゲームが終了しました")
-                            
-                            # データベースに保存
-                            self.save_game_data(player, finished_game, "end")
-                            
-                            # コールバック呼び出し
-                            if self.on_game_end:
-                                self.on_game_end(player)
-                
-                time.sleep(MONITOR_INTERVAL)
-                
-            except Exception as e:
-                print(f"監視エラー: {e}")
-                time.sleep(MONITOR_INTERVAL)
+                except Exception as e:
+                    print(f"監視エラー: {e}")
+                    time.sleep(MONITOR_INTERVAL)
     
     def save_game_data(self, player: dict, game_data: dict, event_type: str):
-        """ゲームデータをデータベースに保存"""
+        """ゲームデータをデータベースに保存（書き込みはキュー経由でまとめて実行）"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
             game_id = game_data.get('gameId')
             game_start_time = game_data.get('gameStartTime', 0)
-            participants = json.dumps(game_data.get('participants', []))
             
             if event_type == "start":
-                cursor.execute('''
+                # ゲーム本体は games に1回だけ保存し、game_data はプレイヤーごとの参照
+                self.storage.enqueue(GAME_INSERT_SQL, (str(game_id), game_start_time, json.dumps(game_data)))
+                self.storage.enqueue('''
                     INSERT INTO game_data 
-                    (puuid, game_name, tag_line, game_id, game_start_time, participants)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (puuid, game_name, tag_line, game_id, game_start_time)
+                    VALUES (?, ?, ?, ?, ?)
                 ''', (player['puuid'], player['game_name'], player['tag_line'], 
-                     game_id, game_start_time, participants))
+                     game_id, game_start_time))
+                self.storage.enqueue_many(
+                    PARTICIPANT_INSERT_SQL,
+                    participant_rows(game_id, game_data.get('participants', []))
+                )
+                for sql, params in rollups.game_start_statements(player):
+                    self.storage.enqueue(sql, params)
             else:  # end
                 game_end_time = int(time.time() * 1000)
                 game_duration = game_end_time - game_start_time
-                cursor.execute('''
+                self.storage.enqueue('''
                     UPDATE game_data 
                     SET game_end_time = ?, game_duration = ?
                     WHERE game_id = ? AND puuid = ?
                 ''', (game_end_time, game_duration, game_id, player['puuid']))
-            
-            conn.commit()
-            conn.close()
+                # 分析用ロールアップを差分更新（推定値、マッチ情報の取り込み後に補正）
+                for sql, params in rollups.game_end_statements(player, game_end_time, game_duration):
+                    self.storage.enqueue(sql, params)
+                self.match_ingest.schedule(
+                    match_id_for(game_data, player['region']), player['cluster'], player,
+                    game_id, game_end_time, game_duration
+                )
         except Exception as e:
             print(f"データ保存エラー: {e}")
     
+    def monitoring_enabled(self, default: bool = False) -> bool:
+        """前回の起動で監視を開始したまま終了したか（再起動時の自動再開用）"""
+        rows = self.storage.query("SELECT value FROM app_state WHERE key = 'monitoring'")
+        return rows[0][0] == '1' if rows else default
+    
+    def _save_monitoring_enabled(self, enabled: bool):
+        self.storage.execute('''
+            INSERT OR REPLACE INTO app_state (key, value, updated_at) VALUES ('monitoring', ?, CURRENT_TIMESTAMP)
+        ''', ('1' if enabled else '0',))
+    
     def start_monitoring(self):
         """監視開始"""
         if self.monitoring:
@@ -443,65 +1146,50 @@ class RiotAPISpectatorTool:
             return
         
         self.monitoring = True
+        self._save_monitoring_enabled(True)
+        if SHARD_WORKERS > 0:
+            # 監視はワーカープロセスに任せ、このプロセスはイベントの保存と配信のみ
+            self.shard_manager = ShardManager(self, SHARD_WORKERS, SHARD_MODE, SHARD_API_KEYS, {
+                'API_BASE_URL_OVERRIDE': self.api_base_url,
+                'DATA_DIR': DATA_DIR,
+                'MATCH_STORE_DIR': MATCH_STORE_DIR,
+                'MONITOR_INTERVAL': MONITOR_INTERVAL,
+                'MONITOR_WORKERS': MONITOR_WORKERS,
+                'ADAPTIVE_POLLING': ADAPTIVE_POLLING,
+                'POLL_MAX_INTERVAL': POLL_MAX_INTERVAL,
+                'FEATURED_GAMES_DISCOVERY': FEATURED_GAMES_DISCOVERY,
+                'FEATURED_GAMES_INTERVAL': FEATURED_GAMES_INTERVAL,
+                'RATE_LIMIT_CALLS': RATE_LIMIT_CALLS,
+                'RATE_LIMIT_SECONDS': RATE_LIMIT_SECONDS
+            })
+            self.shard_manager.start()
+            return
+        
         self.monitor_thread = threading.Thread(target=self.monitor_players, daemon=True)
         self.monitor_thread.start()
     
-    def stop_monitoring(self):
-        """監視停止"""
+    def stop_monitoring(self, persist: bool = True):
+        """監視停止（persist=False はプロセス終了時など、次回の起動で再開する場合）"""
         if not self.monitoring:
             print("監視は開始されていません")
             return
         
         print("監視を停止中...")
         self.monitoring = False
+        if persist:
+            self._save_monitoring_enabled(False)
+        if self.shard_manager:
+            self.shard_manager.stop()
+            self.shard_manager = None
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
         self.current_games.clear()
+        self.shared_games.clear()
+        self.featured_games.clear()
+        self.seen_idle.clear()
+        self.storage.flush()
         print("監視を停止しました")
     
-    def get_analytics_data(self) -> dict:
-        """分析データ取得"""
-        try:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
-            # 基本統計
-            cursor.execute('SELECT COUNT(*) FROM game_data WHERE game_end_time IS NOT NULL')
-            total_games = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT AVG(game_duration/1000) FROM game_data WHERE game_duration IS NOT NULL')
-            avg_duration = cursor.fetchone()[0] or 0
-            
-            cursor.execute('SELECT COUNT(DISTINCT puuid) FROM game_data')
-            unique_players = cursor.fetchone()[0]
-            
-            # プレイヤー別統計
-            cursor.execute('''
-                SELECT game_name, tag_line, COUNT(*) as games_played
-                FROM game_data 
-                WHERE game_end_time IS NOT NULL
-                GROUP BY puuid, game_name, tag_line
-                ORDER BY games_played DESC
-            ''')
-            player_stats = [
-                {'game_name': row[0], 'tag_line': row[1], 'games_played': row[2]}
-                for row in cursor.fetchall()
-            ]
-            
-            conn.close()
-            
-            return {
-                'basic_stats': {
-                    'total_games': total_games,
-                    'avg_duration': round(avg_duration, 1),
-                    'unique_players': unique_players
-                },
-                'player_stats': player_stats
-            }
-            
-        except Exception as e:
-            return {'error': str(e)}
-
 def main():
     """メイン関数（コマンドライン用）"""
     print("🎮 Riot API ソロランク監視ツール v2.0")
@@ -544,7 +1232,7 @@ def main():
         choice = input("選択してください (1-9): ").strip()
         
         if choice == "9":
-            tool.stop_monitoring()
+            tool.stop_monitoring(persist=False)
             print("ツールを終了します")
             break
         
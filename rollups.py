@@ -0,0 +1,220 @@
+"""分析用ロールアップ（集計済みテーブル）
+
+ゲーム終了時に player_rollups / daily_rollups / region_rollups を差分更新し、
+get_analytics_data は全履歴を走査せずに集計済みの値を読むだけにする。
+
+既存の履歴から作り直す場合: python rollups.py
+"""
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+CREATE_ROLLUP_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS player_rollups (
+        puuid TEXT PRIMARY KEY,
+        game_name TEXT,
+        tag_line TEXT,
+        games_played INTEGER NOT NULL DEFAULT 0,
+        total_duration INTEGER NOT NULL DEFAULT 0,
+        last_game_end INTEGER
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_player_rollups_games ON player_rollups (games_played)',
+    '''
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        day TEXT PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        total_duration INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS region_rollups (
+        region TEXT PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        total_duration INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+)
+
+PLAYER_SEEN_SQL = '''
+    INSERT INTO player_rollups (puuid, game_name, tag_line) VALUES (?, ?, ?)
+    ON CONFLICT (puuid) DO UPDATE SET game_name = excluded.game_name, tag_line = excluded.tag_line
+'''
+
+PLAYER_GAME_SQL = '''
+    INSERT INTO player_rollups (puuid, game_name, tag_line, games_played, total_duration, last_game_end)
+    VALUES (?, ?, ?, 1, ?, ?)
+    ON CONFLICT (puuid) DO UPDATE SET
+        game_name = excluded.game_name,
+        tag_line = excluded.tag_line,
+        games_played = games_played + 1,
+        total_duration = total_duration + excluded.total_duration,
+        last_game_end = MAX(COALESCE(last_game_end, 0), excluded.last_game_end)
+'''
+
+DAILY_GAME_SQL = '''
+    INSERT INTO daily_rollups (day, games, total_duration) VALUES (?, 1, ?)
+    ON CONFLICT (day) DO UPDATE SET
+        games = games + 1,
+        total_duration = total_duration + excluded.total_duration
+'''
+
+REGION_GAME_SQL = '''
+    INSERT INTO region_rollups (region, games, total_duration) VALUES (?, 1, ?)
+    ON CONFLICT (region) DO UPDATE SET
+        games = games + 1,
+        total_duration = total_duration + excluded.total_duration
+'''
+
+PLAYER_CORRECTION_SQL = '''
+    UPDATE player_rollups SET
+        total_duration = total_duration + ?,
+        last_game_end = CASE WHEN last_game_end = ? THEN ? ELSE last_game_end END
+    WHERE puuid = ?
+'''
+
+DAILY_CORRECTION_SQL = '''
+    UPDATE daily_rollups SET games = games + ?, total_duration = total_duration + ? WHERE day = ?
+'''
+
+REGION_CORRECTION_SQL = '''
+    UPDATE region_rollups SET total_duration = total_duration + ? WHERE region = ?
+'''
+
+# 履歴全体から作り直す SQL（リージョンは monitored_players から補完）
+REBUILD_SQL = (
+    'DELETE FROM player_rollups',
+    'DELETE FROM daily_rollups',
+    'DELETE FROM region_rollups',
+    '''
+    INSERT INTO player_rollups (puuid, game_name, tag_line, games_played, total_duration, last_game_end)
+    SELECT puuid, MAX(game_name), MAX(tag_line),
+           COUNT(game_end_time), COALESCE(SUM(CASE WHEN game_end_time IS NOT NULL THEN game_duration END), 0),
+           MAX(game_end_time)
+    FROM game_data GROUP BY puuid
+    ''',
+    '''
+    INSERT INTO daily_rollups (day, games, total_duration)
+    SELECT date(game_end_time / 1000, 'unixepoch'), COUNT(*), COALESCE(SUM(game_duration), 0)
+    FROM game_data WHERE game_end_time IS NOT NULL
+    GROUP BY date(game_end_time / 1000, 'unixepoch')
+    ''',
+    '''
+    INSERT INTO region_rollups (region, games, total_duration)
+    SELECT COALESCE(mp.region, 'unknown'), COUNT(*), COALESCE(SUM(gd.game_duration), 0)
+    FROM game_data AS gd LEFT JOIN monitored_players AS mp ON mp.puuid = gd.puuid
+    WHERE gd.game_end_time IS NOT NULL
+    GROUP BY COALESCE(mp.region, 'unknown')
+    ''',
+)
+
+
+def day_of(timestamp_ms: int) -> str:
+    """ミリ秒タイムスタンプを UTC の日付文字列に変換（ダッシュボードの日付と揃える）"""
+    return datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).strftime('%Y-%m-%d')
+
+
+def game_start_statements(player: dict) -> List[Tuple[str, tuple]]:
+    """ゲーム開始時の更新（ユニークプレイヤー数に反映）"""
+    return [(PLAYER_SEEN_SQL, (player['puuid'], player['game_name'], player['tag_line']))]
+
+
+def game_end_statements(player: dict, game_end_time: int, game_duration: int) -> List[Tuple[str, tuple]]:
+    """ゲーム終了時に各ロールアップへ加算する SQL"""
+    return [
+        (PLAYER_GAME_SQL, (player['puuid'], player['game_name'], player['tag_line'],
+                           game_duration, game_end_time)),
+        (DAILY_GAME_SQL, (day_of(game_end_time), game_duration)),
+        (REGION_GAME_SQL, (player.get('region') or 'unknown', game_duration)),
+    ]
+
+
+def game_correction_statements(player: dict, estimated_end: int, estimated_duration: int,
+                               game_end_time: int, game_duration: int) -> List[Tuple[str, tuple]]:
+    """推定値で加算済みのロールアップを match-v5 の正確な値に補正する SQL"""
+    delta = game_duration - estimated_duration
+    statements = [
+        (PLAYER_CORRECTION_SQL, (delta, estimated_end, game_end_time, player['puuid'])),
+        (REGION_CORRECTION_SQL, (delta, player.get('region') or 'unknown')),
+    ]
+    estimated_day, actual_day = day_of(estimated_end), day_of(game_end_time)
+    if estimated_day == actual_day:
+        statements.append((DAILY_CORRECTION_SQL, (0, delta, actual_day)))
+    else:
+        # 日付をまたいだ場合は推定日から取り除いて実際の日に加算
+        statements.append((DAILY_CORRECTION_SQL, (-1, -estimated_duration, estimated_day)))
+        statements.append((DAILY_GAME_SQL, (actual_day, game_duration)))
+    return statements
+
+
+def create_and_rebuild(cursor):
+    """ロールアップテーブルを作成し履歴から集計（マイグレーション用）"""
+    for sql in CREATE_ROLLUP_TABLES:
+        cursor.execute(sql)
+    for sql in REBUILD_SQL:
+        cursor.execute(sql)
+
+
+def rebuild_rollups(storage):
+    """ロールアップを履歴から作り直す（キューを書き切ってから1トランザクションで実行）"""
+    storage.flush()
+    with storage.write_lock:
+        cursor = storage.writer.cursor()
+        try:
+            cursor.execute('BEGIN')
+            for sql in REBUILD_SQL:
+                cursor.execute(sql)
+            storage.writer.commit()
+        except Exception:
+            storage.writer.rollback()
+            raise
+
+
+def read_analytics(cursor, days: int = 30) -> dict:
+    """集計済みテーブルから分析データを組み立てる"""
+    cursor.execute('SELECT COALESCE(SUM(games), 0), COALESCE(SUM(total_duration), 0) FROM region_rollups')
+    total_games, total_duration = cursor.fetchone()
+
+    cursor.execute('SELECT COUNT(*) FROM player_rollups')
+    unique_players = cursor.fetchone()[0]
+
+    cursor.execute('''
+        SELECT game_name, tag_line, games_played, total_duration
+        FROM player_rollups
+        WHERE games_played > 0
+        ORDER BY games_played DESC
+    ''')
+    player_stats = [
+        {'game_name': row[0], 'tag_line': row[1], 'games_played': row[2],
+         'avg_duration': round(row[3] / row[2] / 1000, 1)}
+        for row in cursor.fetchall()
+    ]
+
+    cursor.execute('SELECT day, games FROM daily_rollups ORDER BY day DESC LIMIT ?', (days,))
+    daily_games = [{'date': row[0], 'games': row[1]} for row in reversed(cursor.fetchall())]
+
+    cursor.execute('SELECT region, games FROM region_rollups ORDER BY games DESC')
+    region_stats = [{'region': row[0], 'games': row[1]} for row in cursor.fetchall()]
+
+    return {
+        'basic_stats': {
+            'total_games': total_games,
+            'avg_duration': round(total_duration / total_games / 1000, 1) if total_games else 0,
+            'unique_players': unique_players
+        },
+        'player_stats': player_stats,
+        'daily_games': daily_games,
+        'region_stats': region_stats
+    }
+
+
+if __name__ == "__main__":
+    from riot_api_tool import DATABASE_PATH
+    from storage import GameStorage
+
+    storage = GameStorage(DATABASE_PATH)
+    storage.init_schema()
+    start = datetime.now()
+    rebuild_rollups(storage)
+    print(f"ロールアップを再構築しました ({(datetime.now() - start).total_seconds():.2f}秒)")
+    storage.close()
@@ -0,0 +1,354 @@
+"""監視対象の複数ワーカープロセスへの分散（シャーディング）
+
+Web プロセスの ShardManager が監視対象をコンシステントハッシュ（puuid または
+リージョン単位）でワーカーに割り当て、各ワーカープロセスは自分の担当分だけを
+監視してゲームの開始/終了をイベントキューで Web プロセスに返す。
+データベースへの保存・試合後の取り込み・WebSocket 配信は Web プロセス側で行う。
+
+ワーカーが落ちた場合はその担当分を残りのワーカーに移し、再起動後に戻す。
+"""
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+# ワーカーあたりの仮想ノード数（割り当ての偏りを抑える）
+VIRTUAL_NODES = 64
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT = 30
+# 起動からこの秒数以内に ready を送らないワーカーは失敗として再起動する
+STARTUP_TIMEOUT = 60
+MAX_RESTART_DELAY = 60
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """コンシステントハッシュ（ワーカーの増減で移動するのは一部のキーだけ）"""
+
+    def __init__(self, workers=()):
+        self.points: List[int] = []
+        self.owners: List[int] = []
+        self.workers = set()
+        for worker_id in workers:
+            self.add(worker_id)
+
+    def add(self, worker_id: int):
+        if worker_id in self.workers:
+            return
+        self.workers.add(worker_id)
+        for i in range(VIRTUAL_NODES):
+            point = _hash(f"worker-{worker_id}#{i}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, worker_id)
+
+    def remove(self, worker_id: int):
+        if worker_id not in self.workers:
+            return
+        self.workers.discard(worker_id)
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != worker_id]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> Optional[int]:
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+def worker_main(worker_id: int, api_key: str, commands, events, settings: dict):
+    """ワーカープロセスのエントリポイント"""
+    import riot_api_tool
+    from player_registry import PlayerRecord
+
+    for name, value in settings.items():
+        setattr(riot_api_tool, name, value)
+    # ワーカーごとの DB（アカウント/サモナーのキャッシュ用）。ゲーム履歴は Web プロセスが保存する
+    riot_api_tool.DATABASE_PATH = os.path.join(riot_api_tool.DATA_DIR, f"shard-{worker_id}.db")
+    riot_api_tool.RESTORE_ON_STARTUP = False
+
+    class ShardWorkerTool(riot_api_tool.RiotAPISpectatorTool):
+        def save_game_data(self, player, game_data, event_type):
+            """保存は Web プロセスで行うのでイベントを送るだけ"""
+
+    tool = ShardWorkerTool(api_key)
+    tool.match_ingest.stop()
+    tool.on_game_start = lambda player, game: events.put(('start', worker_id, player['puuid'], game))
+    tool.on_game_end = lambda player: events.put(('end', worker_id, player['puuid'], None))
+
+    tool.monitoring = True
+    tool.monitor_thread = threading.Thread(target=tool.monitor_players, daemon=True)
+    tool.monitor_thread.start()
+    events.put(('ready', worker_id, None, None))
+
+    last_heartbeat = 0
+    while True:
+        if time.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+            events.put(('heartbeat', worker_id, None, {'players': len(tool.monitored_players),
+                                                       'games': len(tool.current_games)}))
+            last_heartbeat = time.time()
+        try:
+            command, payload = commands.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+
+        if command == 'add':
+            player, current_game = payload
+            tool.monitored_players.add(PlayerRecord(**player))
+            if current_game:
+                # 移動してきたプレイヤーの進行中ゲームを引き継ぐ（終了を検知できるように）
+                tool.current_games[player['puuid']] = current_game
+        elif command == 'remove':
+            tool.monitored_players.remove(payload)
+            tool.current_games.pop(payload, None)
+            tool.shared_games.leave(payload)
+        elif command == 'stop':
+            tool.monitoring = False
+            tool.monitor_thread.join(timeout=5)
+            return
+
+
+class WorkerHandle:
+    """Web プロセス側から見たワーカー1つ分の状態"""
+
+    def __init__(self, worker_id: int, api_key: str):
+        self.worker_id = worker_id
+        self.api_key = api_key
+        self.process = None
+        self.commands = None
+        self.ready = False
+        self.started_at = 0.0
+        self.last_heartbeat = 0.0
+        self.restarts = 0
+        self.restart_at = 0.0
+        self.reported = {}
+
+
+class ShardManager:
+    """ワーカープロセスの起動・監視対象の割り当て・イベントの受け取り"""
+
+    def __init__(self, tool, workers: int, mode: str = "hash", api_keys: List[str] = None,
+                 settings: dict = None):
+        self.tool = tool
+        self.mode = mode
+        self.settings = settings or {}
+        api_keys = [key for key in (api_keys or []) if key] or [tool.api_key]
+        self.workers: Dict[int, WorkerHandle] = {
+            worker_id: WorkerHandle(worker_id, api_keys[worker_id % len(api_keys)])
+            for worker_id in range(workers)
+        }
+        self.ring = HashRing()
+        self.assignment: Dict[str, int] = {}
+        self.lock = threading.RLock()
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.running = False
+        self.threads = []
+
+        # 統計
+        self.moved_players = 0
+        self.worker_failures = 0
+
+    def _key(self, player) -> str:
+        return player['region'] if self.mode == "region" else player['puuid']
+
+    def start(self):
+        """ワーカーを起動し、全監視対象を割り当てる"""
+        self.running = True
+        for handle in self.workers.values():
+            self._spawn(handle)
+        for target in (self._receive_events, self._supervise):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        print(f"{len(self.workers)} ワーカープロセスで監視を開始します (割り当て: {self.mode})")
+
+    def stop(self):
+        """全ワーカーを停止"""
+        self.running = False
+        with self.lock:
+            for handle in self.workers.values():
+                if handle.process and handle.process.is_alive():
+                    handle.commands.put(('stop', None))
+            for handle in self.workers.values():
+                if handle.process:
+                    handle.process.join(timeout=10)
+                    if handle.process.is_alive():
+                        handle.process.terminate()
+            self.assignment.clear()
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def _worker_settings(self, handle: WorkerHandle) -> dict:
+        """同じ API キーを共有するワーカー同士でレート制限の枠を分け合う
+
+        ヘッダーから学習する制限（X-App-Rate-Limit など）は API キー全体の値なので、
+        設定値を割るのではなくワーカーのリミッターに取り分を渡して学習後の制限も縮める。
+        """
+        settings = dict(self.settings)
+        sharing = sum(1 for other in self.workers.values() if other.api_key == handle.api_key)
+        settings['RATE_LIMIT_SHARE'] = 1.0 / sharing
+        return settings
+
+    def _spawn(self, handle: WorkerHandle):
+        handle.commands = self.context.Queue()
+        handle.ready = False
+        handle.started_at = handle.last_heartbeat = time.time()
+        handle.process = self.context.Process(
+            target=worker_main,
+            args=(handle.worker_id, handle.api_key, handle.commands, self.events,
+                  self._worker_settings(handle)),
+            name=f"spectator-shard-{handle.worker_id}",
+            daemon=True
+        )
+        handle.process.start()
+
+    def add_player(self, player):
+        """監視対象の追加を担当ワーカーに反映"""
+        with self.lock:
+            self._assign(player)
+
+    def remove_player(self, puuid: str):
+        """監視対象の削除を担当ワーカーに反映"""
+        with self.lock:
+            worker_id = self.assignment.pop(puuid, None)
+            if worker_id is not None:
+                self.workers[worker_id].commands.put(('remove', puuid))
+
+    def _assign(self, player):
+        worker_id = self.ring.owner(self._key(player))
+        current = self.assignment.get(player['puuid'])
+        if worker_id == current:
+            return
+        if current is not None:
+            handle = self.workers[current]
+            if handle.ready:
+                handle.commands.put(('remove', player['puuid']))
+            self.moved_players += 1
+        if worker_id is None:
+            self.assignment.pop(player['puuid'], None)
+            return
+        self.assignment[player['puuid']] = worker_id
+        current_game = self.tool.current_games.get(player['puuid'])
+        self.workers[worker_id].commands.put(
+            ('add', (player.to_dict(), current_game.to_dict() if current_game else None))
+        )
+
+    def rebalance(self):
+        """リングの変更後、担当が変わったプレイヤーだけを移動"""
+        with self.lock:
+            for player in self.tool.monitored_players:
+                self._assign(player)
+
+    def _receive_events(self):
+        """ワーカーからのイベントを受け取り、Web プロセス側の状態に反映"""
+        while self.running:
+            try:
+                kind, worker_id, puuid, payload = self.events.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+
+            handle = self.workers.get(worker_id)
+            if kind == 'heartbeat':
+                handle.last_heartbeat = time.time()
+                handle.reported = payload
+            elif kind == 'ready':
+                with self.lock:
+                    if handle.process is None or not handle.process.is_alive():
+                        continue  # 起動の遅れで再起動対象になったワーカーの ready
+                    handle.ready = True
+                    handle.last_heartbeat = time.time()
+                    # 既に割り当て済みのプレイヤーは送り直し、リングに戻して再配分
+                    for assigned_puuid, assigned_worker in list(self.assignment.items()):
+                        if assigned_worker == worker_id:
+                            del self.assignment[assigned_puuid]
+                    self.ring.add(worker_id)
+                    self.rebalance()
+            else:
+                # 担当の移動（_supervise / rebalance）と同じロックで確認し、移動前のワーカーのイベントは捨てる
+                with self.lock:
+                    if self.assignment.get(puuid) == worker_id:
+                        self._apply_game_event(kind, puuid, payload)
+
+    def _apply_game_event(self, kind: str, puuid: str, game: Optional[dict]):
+        tool = self.tool
+        player = tool.monitored_players.get(puuid)
+        if player is None:
+            return
+        if kind == 'start':
+            previous = tool.current_games.get(puuid)
+            if previous is not None:
+                if previous.get('gameId') == game.get('gameId'):
+                    return  # 移動先のワーカーが同じゲームを再検知した
+                tool._handle_poll_result(player, None)
+            tool._handle_poll_result(player, game)
+        elif kind == 'end':
+            tool._handle_poll_result(player, None)
+
+    def _supervise(self):
+        """落ちた/応答のないワーカーの担当を移し、バックオフして再起動"""
+        while self.running:
+            time.sleep(1)
+            now = time.time()
+            with self.lock:
+                if not self.running:
+                    return
+                for handle in self.workers.values():
+                    alive = handle.process is not None and handle.process.is_alive()
+                    if handle.ready:
+                        stalled = now - handle.last_heartbeat > HEARTBEAT_TIMEOUT
+                    else:
+                        # 起動中（import や SQLite のオープン）に固まったワーカー
+                        stalled = handle.started_at and now - handle.started_at > STARTUP_TIMEOUT
+                    if (alive and not stalled) or (handle.restart_at and now < handle.restart_at):
+                        continue
+
+                    if handle.restart_at:
+                        # バックオフ後の再起動（ready で再びリングに入る）
+                        handle.restart_at = 0.0
+                        self._spawn(handle)
+                        continue
+
+                    self.worker_failures += 1
+                    handle.restarts += 1
+                    print(f"ワーカー {handle.worker_id} が停止しました。担当を他のワーカーに移します")
+                    if alive:
+                        handle.process.terminate()
+                    handle.ready = False
+                    self.ring.remove(handle.worker_id)
+                    self.rebalance()
+                    handle.restart_at = now + min(MAX_RESTART_DELAY, 2 ** handle.restarts)
+
+    def get_stats(self) -> dict:
+        """ワーカーごとの状態取得"""
+        with self.lock:
+            counts = {}
+            for worker_id in self.assignment.values():
+                counts[worker_id] = counts.get(worker_id, 0) + 1
+            return {
+                'mode': self.mode,
+                'workers': [
+                    {
+                        'worker_id': handle.worker_id,
+                        'alive': bool(handle.process and handle.process.is_alive()),
+                        'ready': handle.ready,
+                        'assigned_players': counts.get(handle.worker_id, 0),
+                        'reported': handle.reported,
+                        'restarts': handle.restarts,
+                        'heartbeat_age': round(time.time() - handle.last_heartbeat, 1)
+                    }
+                    for handle in self.workers.values()
+                ],
+                'moved_players': self.moved_players,
+                'worker_failures': self.worker_failures
+            }
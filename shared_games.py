@@ -0,0 +1,98 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def participant_puuids(game_data: dict) -> List[str]:
+    """ゲーム情報の参加者 puuid 一覧"""
+    return [p['puuid'] for p in game_data.get('participants', []) if p.get('puuid')]
+
+
+class SharedGameIndex:
+    """複数の監視対象プレイヤーが参加している進行中ゲームの索引
+
+    ゲームごとに1人（アンカー）だけをスペクテイター API でポーリングし、
+    同じゲームの他のメンバーはアンカーの結果で開始/終了を判定する。
+    """
+
+    def __init__(self):
+        self.anchors: Dict[str, str] = {}
+        self.members: Dict[str, Set[str]] = {}
+        self.game_of: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+        # 統計
+        self.saved_calls = 0
+
+    def join(self, game_id, anchor: str, puuids: Iterable[str]):
+        """ゲームにメンバーを登録（アンカーが既にいればそのまま）"""
+        game_id = str(game_id)
+        with self.lock:
+            self.anchors.setdefault(game_id, anchor)
+            members = self.members.setdefault(game_id, set())
+            for puuid in puuids:
+                previous = self.game_of.get(puuid)
+                if previous is not None and previous != game_id:
+                    self._leave(puuid)
+                members.add(puuid)
+                self.game_of[puuid] = game_id
+
+    def is_covered(self, puuid: str) -> bool:
+        """アンカー以外のメンバー（ポーリング不要）なら True"""
+        with self.lock:
+            game_id = self.game_of.get(puuid)
+            if game_id is None or self.anchors.get(game_id) == puuid:
+                return False
+            self.saved_calls += 1
+            return True
+
+    def anchored_game(self, puuid: str) -> Optional[str]:
+        """このプレイヤーがアンカーを務めているゲームの ID"""
+        with self.lock:
+            game_id = self.game_of.get(puuid)
+            if game_id is not None and self.anchors.get(game_id) == puuid:
+                return game_id
+            return None
+
+    def finish(self, game_id) -> Set[str]:
+        """ゲーム終了: 索引から外してメンバー一覧を返す"""
+        game_id = str(game_id)
+        with self.lock:
+            self.anchors.pop(game_id, None)
+            members = self.members.pop(game_id, set())
+            for puuid in members:
+                if self.game_of.get(puuid) == game_id:
+                    del self.game_of[puuid]
+            return members
+
+    def leave(self, puuid: str):
+        """プレイヤーを索引から外す（アンカーなら別のメンバーに引き継ぐ）"""
+        with self.lock:
+            self._leave(puuid)
+
+    def _leave(self, puuid: str):
+        game_id = self.game_of.pop(puuid, None)
+        if game_id is None:
+            return
+        members = self.members.get(game_id, set())
+        members.discard(puuid)
+        if not members:
+            self.anchors.pop(game_id, None)
+            self.members.pop(game_id, None)
+        elif self.anchors.get(game_id) == puuid:
+            self.anchors[game_id] = next(iter(members))
+
+    def clear(self):
+        with self.lock:
+            self.anchors.clear()
+            self.members.clear()
+            self.game_of.clear()
+
+    def get_stats(self) -> dict:
+        """共有ゲームの統計取得"""
+        with self.lock:
+            shared = [members for members in self.members.values() if len(members) > 1]
+            return {
+                'shared_games': len(shared),
+                'covered_players': sum(len(members) - 1 for members in shared),
+                'saved_calls': self.saved_calls
+            }
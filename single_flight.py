@@ -0,0 +1,81 @@
+"""同じ API 呼び出しの同時実行をまとめる（single-flight）
+
+同じ URL・パラメータの呼び出しが実行中なら、後から来たスレッドは新しく呼び出さずに
+実行中の呼び出しの完了を待ってその結果を受け取る。完了後の結果は保持しない
+（キャッシュではないので、次の呼び出しは常に API に問い合わせる）。
+"""
+import copy
+import threading
+from typing import Callable, Dict, Hashable
+
+import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """キーごとに実行中の呼び出しを1つに制限し、待っているスレッドと結果を共有する"""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, _Call] = {}
+        self.lock = threading.Lock()
+
+        # 統計
+        self.executed = 0
+        self.saved: Dict[str, int] = {}
+
+    def do(self, key: Hashable, function: Callable, label: str = None):
+        """function() を実行（同じ key が実行中ならその結果を待って返す）"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                call.waiters += 1
+                self.saved[label] = self.saved.get(label, 0) + 1
+
+        if not leader:
+            metrics.API_COALESCED.inc(label)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # 呼び出し側が結果を書き換えても互いに影響しないよう複製を返す
+            return copy.deepcopy(call.result)
+
+        result = None
+        try:
+            result = function()
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                waiters = call.waiters
+            # 待っているスレッドには実行したスレッドが書き換える前の状態を渡す
+            if waiters and call.error is None:
+                call.result = copy.deepcopy(result)
+            call.done.set()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            saved = sum(self.saved.values())
+            return {
+                'executed': self.executed,
+                'saved': saved,
+                'saved_ratio': round(saved / (self.executed + saved), 3) if self.executed + saved else 0.0,
+                'saved_by_method': dict(self.saved),
+                'in_flight': len(self.calls)
+            }
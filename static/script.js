@@ -4,6 +4,13 @@ let monitoredPlayers = [];
 let monitoring = false;
 let updateInterval = null;
 
+// サーバー状態のバージョン（WebSocket の差分がこの次の番号から適用される）
+let stateVersion = 0;
+const playersByPuuid = new Map();
+
+// WebSocket接続（socket.io クライアントが読み込まれている場合のみ）
+const socket = (typeof io !== 'undefined') ? io() : null;
+
 // ログ出力
 function addLog(message, type = 'info') {
     const timestamp = new Date().toLocaleTimeString();
@@ -87,8 +94,8 @@ async function addPlayer() {
         const data = await response.json();
         
         if (data.success) {
-            monitoredPlayers = data.players;
-            updatePlayerList();
+            // 監視デーモン使用時は受付のみ（追加結果は WebSocket の差分で届く）
+            if (data.player) upsertPlayer(data.player);
             addLog(data.message, 'success');
             
             // フォームクリア
@@ -129,9 +136,8 @@ async function addProPlayers() {
         const data = await response.json();
         
         if (data.success) {
-            monitoredPlayers = data.players;
-            updatePlayerList();
-            addLog(data.message, 'success');
+            // 追加はバックグラウンドで進み、進捗は WebSocket で届く
+            addLog(data.message, 'info');
         } else {
             addLog(`プロプレイヤー追加エラー: ${data.error}`, 'error');
         }
@@ -188,8 +194,7 @@ async function removePlayer(gameName, tagLine) {
         const data = await response.json();
         
         if (data.success) {
-            monitoredPlayers = data.players;
-            updatePlayerList();
+            if (data.puuid) removePlayerFromState(data.puuid);
             addLog(data.message, 'info');
         } else {
             addLog(`プレイヤー削除エラー: ${data.error}`, 'error');
@@ -233,13 +238,8 @@ async function startMonitoring() {
         const data = await response.json();
         
         if (data.success) {
-            monitoring = true;
-            document.getElementById('monitoringStatus').className = 'monitoring-status status-active';
-            document.getElementById('monitoringStatus').textContent = '監視中';
+            setMonitoringStatus(true);
             addLog(data.message, 'success');
-            
-            // 定期的にプレイヤーリストを更新
-            startPlayerStatusUpdates();
         } else {
             addLog(`監視開始エラー: ${data.error}`, 'error');
         }
@@ -258,13 +258,8 @@ async function stopMonitoring() {
         const data = await response.json();
         
         if (data.success) {
-            monitoring = false;
-            document.getElementById('monitoringStatus').className = 'monitoring-status status-inactive';
-            document.getElementById('monitoringStatus').textContent = '監視停止中';
+            setMonitoringStatus(false);
             addLog(data.message, 'info');
-            
-            // 定期更新を停止
-            stopPlayerStatusUpdates();
         } else {
             addLog(`監視停止エラー: ${data.error}`, 'error');
         }
@@ -273,88 +268,127 @@ async function stopMonitoring() {
     }
 }
 
-// プレイヤーステータス更新開始
-function startPlayerStatusUpdates() {
-    if (updateInterval) {
-        clearInterval(updateInterval);
+// 監視状態の表示更新
+function setMonitoringStatus(isMonitoring) {
+    monitoring = isMonitoring;
+    const statusElement = document.getElementById('monitoringStatus');
+    if (monitoring) {
+        statusElement.className = 'monitoring-status status-active';
+        statusElement.textContent = '監視中';
+    } else {
+        statusElement.className = 'monitoring-status status-inactive';
+        statusElement.textContent = '監視停止中';
+    }
+}
+
+// プレイヤー1人分の状態を反映
+function upsertPlayer(player) {
+    playersByPuuid.set(player.puuid, player);
+    monitoredPlayers = Array.from(playersByPuuid.values());
+    updatePlayerList();
+}
+
+function removePlayerFromState(puuid) {
+    playersByPuuid.delete(puuid);
+    monitoredPlayers = Array.from(playersByPuuid.values());
+    updatePlayerList();
+}
+
+// 全体の状態を反映（接続時・再同期時）
+function applyFullState(data) {
+    stateVersion = data.version;
+    playersByPuuid.clear();
+    data.players.forEach(player => playersByPuuid.set(player.puuid, player));
+    monitoredPlayers = Array.from(playersByPuuid.values());
+    setMonitoringStatus(data.monitoring);
+    updatePlayerList();
+}
+
+// 差分を反映（バージョンが連番でなければ再同期を要求）
+function applyDelta(delta) {
+    if (delta.version <= stateVersion) return;
+    if (delta.version !== stateVersion + 1) {
+        socket.emit('resync', { version: stateVersion });
+        return;
     }
+    stateVersion = delta.version;
     
-    // 5秒ごとにプレイヤーリストを更新
-    updateInterval = setInterval(async () => {
-        if (!monitoring) return;
-        
-        try {
-            const response = await fetch('/api/get_players');
-            const data = await response.json();
-            
-            if (data.players) {
-                const oldPlayers = [...monitoredPlayers];
-                monitoredPlayers = data.players;
-                
-                // ステータス変更をチェック
-                checkStatusChanges(oldPlayers, monitoredPlayers);
-                
-                updatePlayerList();
-            }
-        } catch (error) {
-            console.error('Player status update error:', error);
+    if (delta.op === 'upsert') {
+        upsertPlayer(delta.player);
+        const name = `${delta.player.game_name}#${delta.player.tag_line}`;
+        if (delta.event === 'game_started') {
+            addLog(`🎮 ${name} がソロランクを開始しました！`, 'success');
+        } else if (delta.event === 'game_ended') {
+            addLog(`🏁 ${name} のゲームが終了しました`, 'info');
         }
-    }, 5000);
+    } else if (delta.op === 'remove') {
+        removePlayerFromState(delta.puuid);
+    } else if (delta.op === 'monitoring') {
+        setMonitoringStatus(delta.monitoring);
+    }
 }
 
-// プレイヤーステータス更新停止
-function stopPlayerStatusUpdates() {
-    if (updateInterval) {
-        clearInterval(updateInterval);
-        updateInterval = null;
+// WebSocket が使えない場合のみ HTTP で状態を取得
+async function loadPlayers() {
+    try {
+        const response = await fetch('/api/get_players');
+        applyFullState(await response.json());
+    } catch (error) {
+        console.error('Player list load error:', error);
     }
 }
 
-// ステータス変更チェック
-function checkStatusChanges(oldPlayers, newPlayers) {
-    newPlayers.forEach(newPlayer => {
-        const oldPlayer = oldPlayers.find(p => p.puuid === newPlayer.puuid);
-        
-        if (oldPlayer && oldPlayer.status !== newPlayer.status) {
-            if (newPlayer.status === 'playing') {
-                addLog(`🎮 ${newPlayer.game_name}#${newPlayer.tag_line} がソロランクを開始しました！`, 'success');
-            } else if (newPlayer.status === 'waiting') {
-                addLog(`🏁 ${newPlayer.game_name}#${newPlayer.tag_line} のゲームが終了しました`, 'info');
-            }
+// WebSocket イベント（状態の差分と一括追加の進捗）
+function setupSocketEvents() {
+    if (!socket) return;
+    
+    socket.on('players_state', applyFullState);
+    socket.on('player_delta', applyDelta);
+    
+    const statusLabels = {
+        added: ['追加しました', 'success'],
+        duplicate: ['は既に監視対象です', 'warning'],
+        not_found: ['が見つかりません', 'error'],
+        summoner_not_found: ['のサモナー情報を取得できません', 'error'],
+        error: ['の追加でエラーが発生しました', 'error']
+    };
+    
+    socket.on('bulk_import_progress', data => {
+        const [label, type] = statusLabels[data.status] || [data.status, 'info'];
+        const text = data.status === 'added'
+            ? `${data.game_name}#${data.tag_line} を${label}`
+            : `${data.game_name}#${data.tag_line} ${label}`;
+        addLog(`[${data.done}/${data.total}] ${text}`, type);
+    });
+    
+    socket.on('command_result', data => {
+        if (!data.success) {
+            addLog(`監視デーモンでのエラー (${data.command}): ${data.result.error}`, 'error');
+        } else if (data.result && data.result.message) {
+            addLog(data.result.message, 'success');
+        }
+    });
+    
+    socket.on('bulk_import_done', data => {
+        if (data.success) {
+            const s = data.summary;
+            addLog(`一括追加完了: ${s.added} 人追加 / ${s.duplicate} 人は追加済み / ${s.failed} 人失敗`, 'success');
+        } else {
+            addLog(`一括追加エラー: ${data.error}`, 'error');
         }
     });
 }
 
 // 初期化
 document.addEventListener('DOMContentLoaded', function() {
+    setupSocketEvents();
     updatePlayerList();
     addLog('ツールが起動しました', 'info');
     
-    // 定期的にプレイヤーリストを取得
-    setInterval(async () => {
-        if (!apiKeySet) return;
-        
-        try {
-            const response = await fetch('/api/get_players');
-            const data = await response.json();
-            
-            if (data.players) {
-                monitoredPlayers = data.players;
-                monitoring = data.monitoring;
-                
-                // 監視状態の更新
-                if (monitoring) {
-                    document.getElementById('monitoringStatus').className = 'monitoring-status status-active';
-                    document.getElementById('monitoringStatus').textContent = '監視中';
-                } else {
-                    document.getElementById('monitoringStatus').className = 'monitoring-status status-inactive';
-                    document.getElementById('monitoringStatus').textContent = '監視停止中';
-                }
-                
-                updatePlayerList();
-            }
-        } catch (error) {
-            console.error('Periodic update error:', error);
-        }
-    }, 10000); // 10秒ごと
-});
\ No newline at end of file
+    // socket.io が無い環境向けのフォールバック（通常は WebSocket の差分で更新）
+    if (!socket) {
+        updateInterval = setInterval(() => {
+            if (apiKeySet) loadPlayers();
+        }, 10000); // 10秒ごと
+    }
+});
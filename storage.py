@@ -0,0 +1,448 @@
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+import event_bus
+import identity_cache
+import match_ingest
+import match_store
+import metrics
+import rollups
+
+# ライトビハインドキューの制御用マーカー
+_FLUSH = object()
+_STOP = object()
+
+# バッチ書き込みがロック待ちなどで失敗した場合の再試行回数と間隔（秒、回数に比例して延ばす）
+BATCH_RETRIES = 3
+BATCH_RETRY_DELAY = 0.5
+
+# 接続ごとに適用する PRAGMA
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # 書き込み中も読み込みをブロックしない
+    "PRAGMA synchronous=NORMAL",    # WAL では NORMAL でもクラッシュ時の整合性は保たれる
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",     # 約16MB
+    "PRAGMA busy_timeout=5000",
+)
+
+PARTICIPANT_INSERT_SQL = '''
+    INSERT OR IGNORE INTO game_participants
+    (game_id, puuid, champion_id, team_id, spell1_id, spell2_id, perks)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 進行中ゲームの本体（同じゲームの監視対象プレイヤーが複数いても1行）
+GAME_INSERT_SQL = '''
+    INSERT OR IGNORE INTO games (game_id, game_start_time, payload) VALUES (?, ?, ?)
+'''
+
+
+def participant_rows(game_id, participants: Iterable[dict]) -> List[tuple]:
+    """スペクテイター/マッチの参加者リストを game_participants の行に変換"""
+    rows = []
+    for participant in participants:
+        puuid = participant.get('puuid')
+        if not puuid:
+            continue
+        perks = participant.get('perks')
+        rows.append((
+            str(game_id),
+            puuid,
+            participant.get('championId'),
+            participant.get('teamId'),
+            participant.get('spell1Id'),
+            participant.get('spell2Id'),
+            json.dumps(perks) if perks else None
+        ))
+    return rows
+
+
+def _migration_base_tables(cursor):
+    """v1: 初期テーブル"""
+    # ゲームデータテーブル
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS game_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            puuid TEXT,
+            game_name TEXT,
+            tag_line TEXT,
+            game_id TEXT,
+            game_start_time INTEGER,
+            game_end_time INTEGER,
+            game_duration INTEGER,
+            participants TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 監視プレイヤーテーブル
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monitored_players (
+            puuid TEXT PRIMARY KEY,
+            game_name TEXT,
+            tag_line TEXT,
+            region TEXT,
+            cluster TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migration_indexes_and_participants(cursor):
+    """v2: game_data のインデックスと正規化した参加者テーブル"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_data_game_id_puuid ON game_data (game_id, puuid)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_data_puuid ON game_data (puuid)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_data_game_end_time ON game_data (game_end_time)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS game_participants (
+            game_id TEXT NOT NULL,
+            puuid TEXT NOT NULL,
+            champion_id INTEGER,
+            team_id INTEGER,
+            spell1_id INTEGER,
+            spell2_id INTEGER,
+            perks TEXT,
+            PRIMARY KEY (game_id, puuid)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_participants_puuid ON game_participants (puuid)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_participants_champion ON game_participants (champion_id)')
+
+    # 既存の JSON から参加者を移行
+    rows = cursor.execute('''
+        SELECT game_id, participants FROM game_data
+        WHERE participants IS NOT NULL AND participants != '[]'
+    ''').fetchall()
+    for game_id, participants in rows:
+        try:
+            cursor.executemany(PARTICIPANT_INSERT_SQL, participant_rows(game_id, json.loads(participants)))
+        except (TypeError, ValueError):
+            continue
+
+
+def _migration_rollups(cursor):
+    """v3: 分析用ロールアップテーブル（既存履歴から集計）"""
+    rollups.create_and_rebuild(cursor)
+
+
+def _migration_identity_cache(cursor):
+    """v4: アカウント/サモナー情報のキャッシュテーブル"""
+    for sql in identity_cache.CREATE_CACHE_TABLES:
+        cursor.execute(sql)
+
+
+def _migration_player_summoner_fields(cursor):
+    """v5: 再起動時に API を呼ばずに復元できるようサモナー情報を monitored_players に保持"""
+    cursor.execute('ALTER TABLE monitored_players ADD COLUMN summoner_id TEXT')
+    cursor.execute('ALTER TABLE monitored_players ADD COLUMN summoner_name TEXT')
+    cursor.execute('ALTER TABLE monitored_players ADD COLUMN summoner_level INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_data_open ON game_data (puuid) WHERE game_end_time IS NULL')
+
+
+def _migration_match_ids(cursor):
+    """v6: プレイヤーごとの matchId 一覧（マッチ本体は MatchStore のファイル）"""
+    for sql in match_store.CREATE_MATCH_TABLES:
+        cursor.execute(sql)
+
+
+def _migration_match_ingest(cursor):
+    """v7: 試合終了後に取り込む match-v5 の結果（正確な試合時間・勝敗・参加者成績）"""
+    for sql in match_ingest.CREATE_INGEST_TABLES:
+        cursor.execute(sql)
+
+
+
+def _migration_shared_games(cursor):
+    """v8: ゲーム本体を games に1回だけ保存し、game_data の参加者 JSON の重複を解消"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            game_start_time INTEGER,
+            payload TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        SELECT game_id, MIN(game_start_time), MAX(participants) FROM game_data
+        WHERE participants IS NOT NULL GROUP BY game_id
+    ''')
+    rows = cursor.fetchall()
+    for game_id, game_start_time, participants in rows:
+        try:
+            participants = json.loads(participants)
+        except ValueError:
+            continue
+        payload = {
+            'gameId': int(game_id) if game_id and game_id.isdigit() else game_id,
+            'gameStartTime': game_start_time,
+            'participants': participants
+        }
+        cursor.execute(GAME_INSERT_SQL, (game_id, game_start_time, json.dumps(payload)))
+    cursor.execute('UPDATE game_data SET participants = NULL WHERE game_id IN (SELECT game_id FROM games)')
+
+
+
+def _migration_event_bus(cursor):
+    """v9: 監視デーモンと Web プロセス間のイベントログ/コマンドキュー"""
+    for sql in event_bus.CREATE_EVENT_TABLES:
+        cursor.execute(sql)
+
+
+def _migration_app_state(cursor):
+    """v10: 再起動後も引き継ぐ設定（監視を開始していたかどうかなど）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# スキーママイグレーション（順番に適用され、適用済みの位置は PRAGMA user_version に記録）
+MIGRATIONS = [
+    _migration_base_tables,
+    _migration_indexes_and_participants,
+    _migration_rollups,
+    _migration_identity_cache,
+    _migration_player_summoner_fields,
+    _migration_match_ids,
+    _migration_match_ingest,
+    _migration_shared_games,
+    _migration_event_bus,
+    _migration_app_state,
+]
+
+
+def _is_transient(error: Exception) -> bool:
+    """再試行すれば成功しうるエラー（別プロセスの書き込みによるロック待ちのタイムアウト）"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class GameStorage:
+    """SQLite ストレージ層（長寿命接続 + WAL + ライトビハインドキュー）
+
+    ゲーム開始/終了イベントはキューに積まれ、flush_interval 秒ごと、
+    または flush_size 件たまった時点で1トランザクションにまとめて書き込まれる。
+    """
+
+    def __init__(self, database_path: str, flush_interval: float = 1.0,
+                 flush_size: int = 200, max_readers: int = 8):
+        self.database_path = database_path
+        self.flush_interval = flush_interval
+        self.flush_size = max(1, flush_size)
+        self.max_readers = max_readers
+
+        # 書き込みは1本の接続に集約（execute と書き込みスレッドで共有）
+        self.writer = self._connect()
+        self.write_lock = threading.Lock()
+        self.readers = queue.LifoQueue()
+
+        # 統計
+        self.batches_written = 0
+        self.events_written = 0
+        self.write_errors = 0
+        self.dropped_events = 0
+
+        self.queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True,
+                                              name="storage-writer")
+        self.writer_thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """PRAGMA 適用済みの接続を作成"""
+        conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def init_schema(self):
+        """スキーママイグレーション実行（PRAGMA user_version でバージョン管理）"""
+        with self.write_lock:
+            cursor = self.writer.cursor()
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+
+            for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                try:
+                    cursor.execute('BEGIN')
+                    migration(cursor)
+                    cursor.execute(f'PRAGMA user_version = {target}')
+                    self.writer.commit()
+                    print(f"データベースをスキーマ v{target} に更新しました")
+                except Exception:
+                    self.writer.rollback()
+                    raise
+
+    @contextmanager
+    def reader(self):
+        """読み込み用接続を借りる（使用後はプールに戻す）"""
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+        finally:
+            if self.readers.qsize() < self.max_readers:
+                self.readers.put(conn)
+            else:
+                conn.close()
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        """読み込みクエリを実行して全行を返す"""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: tuple = ()):
+        """即時に書き込む（プレイヤー追加/削除など低頻度の操作用）"""
+        with self.write_lock:
+            try:
+                self.writer.execute(sql, params)
+                self.writer.commit()
+            except Exception:
+                self.writer.rollback()
+                raise
+
+    def enqueue(self, sql: str, params: tuple = ()):
+        """書き込みをキューに積む（まとめて非同期に書き込まれる）"""
+        self.queue.put((sql, params, False))
+
+    def enqueue_many(self, sql: str, rows: List[tuple]):
+        """同じ SQL の複数行書き込みをキューに積む（executemany で実行）"""
+        if rows:
+            self.queue.put((sql, rows, True))
+
+    def flush(self):
+        """キュー内の書き込みがすべて完了するまで待つ"""
+        if not self.writer_thread.is_alive():
+            return
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def pending(self) -> int:
+        """未書き込みのイベント数（概算）"""
+        return self.queue.qsize()
+
+    def _writer_loop(self):
+        """書き込みスレッド: イベントをバッチにまとめて1トランザクションで書き込む"""
+        while True:
+            item = self.queue.get()
+            taken = 1
+            batch = []
+            deadline = time.time() + self.flush_interval
+
+            # 時間または件数の閾値に達するまで集める（FLUSH/STOP で即時書き込み）
+            while item is not _FLUSH and item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.flush_size:
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                taken += 1
+
+            self._write_batch(batch)
+            for _ in range(taken):
+                self.queue.task_done()
+
+            if item is _STOP:
+                return
+
+    def _write_batch(self, batch: List[Tuple[str, tuple, bool]]):
+        """バッチを1トランザクションで書き込む
+
+        ロック待ちなど一時的なエラーは間隔を空けて再試行し、それでも失敗した場合は
+        1件ずつ書き込んで失敗した文だけを破棄する（他の書き込みを巻き添えにしない）。
+        """
+        if not batch:
+            return
+
+        for attempt in range(BATCH_RETRIES + 1):
+            error = self._try_write(batch)
+            if error is None:
+                return
+            if not _is_transient(error) or attempt == BATCH_RETRIES:
+                break
+            time.sleep(BATCH_RETRY_DELAY * (attempt + 1))
+
+        if len(batch) == 1 and not _is_transient(error):
+            self._drop(batch[0], error)
+            return
+        for item in batch:
+            error = self._try_write([item])
+            if _is_transient(error):
+                time.sleep(BATCH_RETRY_DELAY)
+                error = self._try_write([item])
+            if error is not None:
+                self._drop(item, error)
+
+    def _try_write(self, batch: List[Tuple[str, tuple, bool]]) -> Optional[Exception]:
+        """1トランザクションで書き込み、失敗時はロールバックして例外を返す"""
+        with self.write_lock:
+            try:
+                start = time.perf_counter()
+                for sql, params, many in batch:
+                    if many:
+                        self.writer.executemany(sql, params)
+                    else:
+                        self.writer.execute(sql, params)
+                self.writer.commit()
+            except Exception as e:
+                self.writer.rollback()
+                self.write_errors += 1
+                print(f"データ一括保存エラー ({len(batch)} 件): {e}")
+                return e
+            metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+            metrics.DB_WRITE_EVENTS.inc(amount=len(batch))
+            self.batches_written += 1
+            self.events_written += len(batch)
+            return None
+
+    def _drop(self, item: Tuple[str, tuple, bool], error: Exception):
+        self.dropped_events += 1
+        sql, params, many = item
+        print(f"書き込みを破棄しました ({error}): {' '.join(sql.split())[:80]} {str(params)[:200]}")
+
+    def get_stats(self) -> dict:
+        """ストレージの統計取得"""
+        return {
+            'pending': self.pending(),
+            'batches_written': self.batches_written,
+            'events_written': self.events_written,
+            'write_errors': self.write_errors,
+            'dropped_events': self.dropped_events,
+            'avg_batch_size': round(self.events_written / self.batches_written, 1)
+            if self.batches_written else 0
+        }
+
+    def close(self):
+        """キューを書き切って接続を閉じる"""
+        if self.writer_thread.is_alive():
+            self.queue.put(_STOP)
+            self.writer_thread.join(timeout=10)
+
+        with self.write_lock:
+            try:
+                self.writer.close()
+            except sqlite3.Error:
+                pass
+
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break